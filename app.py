@@ -17,13 +17,11 @@ if __name__ == '__main__':
     host = os.environ.get('FLASK_HOST', '127.0.0.1')
     port = int(os.environ.get('FLASK_PORT', "5000"))
     
+    app.logger.info('Servidor iniciado em http://%s:%s - use seu email Gmail para login, CTRL+C para parar', host, port)
+
     # Executar aplicação
     app.run(
         debug=debug_mode,
         host="0.0.0.0",
         port=port
-    )
-    
-    print(f"\n🚀 Servidor iniciado em http://{host}:{port}")
-    print("👤 Use seu email Gmail para login")
-    print("📝 Pressione CTRL+C para parar o servidor\n")
\ No newline at end of file
+    )
\ No newline at end of file
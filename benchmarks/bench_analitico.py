@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""Benchmark: relatórios históricos pelo snapshot colunar (NumPy) vs consultas no banco.
+
+Uso:
+    python benchmarks/bench_analitico.py [--caixas 10] [--anos 3] [--vendas-por-dia 300]
+                                         [--repeticoes 5] [--banco /tmp/bench_analitico.db]
+
+Gera um histórico de vendas (com itens), pagamentos e despesas em um SQLite
+em arquivo, exporta o snapshot (flask caixa snapshot) e mede, para o
+comparativo ano a ano de todo o período:
+  - totais por mês agregando as vendas/pagamentos/despesas no banco;
+  - os mesmos totais pelos resumos mensais (totais_resumo_mensais);
+  - pelo snapshot (totais_por_mes);
+  - os produtos mais vendidos com GROUP BY no banco e com bincount no snapshot.
+Os resultados do snapshot são comparados com os do banco.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from caixa import create_app
+from caixa.analitico import exportar_snapshot, produtos_mais_vendidos, totais_por_mes
+from caixa.config import Config
+from caixa.consolidacao import (calcular_resumos_periodo, inicio_mes, reconstruir_resumos, somar_totais,
+                                totais_resumo_mensais)
+from caixa.extensoes import db
+from caixa.models import Caixa, CategoriaDespesa, Cliente, Despesa, ItemVenda, Pagamento, Produto, Venda, agora_brasil
+from caixa.periodos import filtro_periodo
+
+
+class BenchConfig(Config):
+    WTF_CSRF_ENABLED = False
+    LOG_NIVEL = 'WARNING'
+    RELATORIOS_CACHE_ATIVO = False
+
+
+def popular(args, aleatorio, inicio, fim):
+    db.session.execute(db.insert(Caixa), [{'id': i, 'nome': f'Caixa {i}'} for i in range(1, args.caixas + 1)])
+    db.session.execute(db.insert(Cliente), [{'nome': f'Cliente {i}', 'saldo_devedor': 0} for i in range(1000)])
+    db.session.execute(db.insert(Produto), [{'tipo': 'outro', 'descricao': f'Produto {i}', 'preco': 10}
+                                            for i in range(500)])
+    db.session.add(CategoriaDespesa(nome='Geral'))
+    db.session.commit()
+
+    dia = inicio
+    while dia <= fim:
+        abertura = datetime.combine(dia, datetime.min.time())
+        vendas, itens_por_venda = [], []
+        for _ in range(args.vendas_por_dia):
+            itens = []
+            for _ in range(aleatorio.randint(1, 4)):
+                quantidade = aleatorio.randint(1, 3)
+                preco = round(aleatorio.uniform(5, 100), 2)
+                itens.append({'produto_id': aleatorio.randint(1, 500), 'quantidade': quantidade,
+                              'preco_unitario': preco, 'subtotal': round(quantidade * preco, 2)})
+            total = round(sum(item['subtotal'] for item in itens), 2)
+            tipo = 'vista' if aleatorio.random() < 0.7 else 'prazo'
+            vendas.append({
+                'data_venda': abertura + timedelta(seconds=aleatorio.randrange(8 * 3600, 20 * 3600)),
+                'valor_total': total, 'valor_pago': total if tipo == 'vista' else 0,
+                'status': 'pago' if tipo == 'vista' else 'pendente', 'tipo_pagamento': tipo,
+                'cliente_id': aleatorio.randint(1, 1000), 'caixa_id': aleatorio.randint(1, args.caixas)
+            })
+            itens_por_venda.append(itens)
+        ids = db.session.execute(
+            db.insert(Venda.__table__).returning(Venda.id, sort_by_parameter_order=True), vendas
+        ).scalars().all()
+        db.session.execute(db.insert(ItemVenda.__table__), [
+            dict(item, venda_id=id_venda) for id_venda, itens in zip(ids, itens_por_venda) for item in itens
+        ])
+        db.session.execute(db.insert(Pagamento.__table__), [
+            {'venda_id': id_venda, 'valor': venda['valor_total'], 'data_pagamento': venda['data_venda'],
+             'forma_pagamento': 'dinheiro'}
+            for id_venda, venda in zip(ids, vendas) if venda['tipo_pagamento'] == 'vista'
+        ])
+        db.session.execute(db.insert(Despesa.__table__), [
+            {'descricao': 'Despesa', 'valor': round(aleatorio.uniform(10, 500), 2), 'data_despesa': dia,
+             'categoria_id': 1, 'caixa_id': aleatorio.randint(1, args.caixas)}
+            for _ in range(aleatorio.randint(1, 3))
+        ])
+        db.session.commit()
+        dia += timedelta(days=1)
+
+
+def mensais_no_banco(inicio, fim):
+    """Caminho sem snapshot nem resumos: agrega as tabelas de movimento e soma por mês"""
+    totais = {}
+    for (_, dia), valores in calcular_resumos_periodo(inicio, fim).items():
+        somar_totais(totais, {inicio_mes(dia): valores})
+    return totais
+
+
+def produtos_no_banco(inicio, fim, limite=10):
+    consulta = db.select(
+        ItemVenda.produto_id, db.func.sum(ItemVenda.quantidade), db.func.sum(ItemVenda.subtotal)
+    ).join(Venda, ItemVenda.venda_id == Venda.id).where(
+        filtro_periodo(Venda.data_venda, inicio, fim)
+    ).group_by(ItemVenda.produto_id).order_by(db.func.sum(ItemVenda.subtotal).desc(), ItemVenda.produto_id)
+    return [{'produto_id': produto_id, 'quantidade': quantidade, 'total': total}
+            for produto_id, quantidade, total in db.session.execute(consulta.limit(limite))]
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos) * 1000, resultado
+
+
+def tamanho(pasta):
+    return sum(os.path.getsize(os.path.join(raiz, nome)) for raiz, _, nomes in os.walk(pasta) for nome in nomes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--caixas', type=int, default=10)
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--vendas-por-dia', type=int, default=300)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--banco', default=os.path.join(tempfile.gettempdir(), 'bench_analitico.db'))
+    args = parser.parse_args()
+
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(args.banco + sufixo):
+            os.remove(args.banco + sufixo)
+    pasta = args.banco + '.analitico'
+    shutil.rmtree(pasta, ignore_errors=True)
+    BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{args.banco}'
+    BenchConfig.ANALITICO_DIRETORIO = pasta
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        # Só dias fechados: o período inteiro cai no snapshot
+        fim = agora_brasil().date() - timedelta(days=1)
+        inicio = fim.replace(year=fim.year - args.anos + 1, month=1, day=1)
+        carga = time.perf_counter()
+        popular(args, random.Random(42), inicio, fim)
+        reconstruir_resumos(inicio, fim)
+        print(f'{db.session.query(Venda).count()} vendas, {db.session.query(ItemVenda).count()} itens, '
+              f'{inicio} a {fim} ({time.perf_counter() - carga:.1f}s)')
+
+        exportacao = time.perf_counter()
+        resultado = exportar_snapshot()
+        print(f"Snapshot: {resultado['meses']} meses, {resultado['registros']} registros em "
+              f"{time.perf_counter() - exportacao:.1f}s, {tamanho(pasta) / 2 ** 20:.1f} MB "
+              f"(banco: {os.path.getsize(args.banco) / 2 ** 20:.1f} MB)")
+
+        db_ms, no_banco = medir(lambda: mensais_no_banco(inicio, fim), args.repeticoes)
+        resumo_ms, nos_resumos = medir(lambda: totais_resumo_mensais(inicio, fim), args.repeticoes)
+        snapshot_ms, no_snapshot = medir(lambda: totais_por_mes(inicio, fim), args.repeticoes)
+        print(f"\n{'totais por mês':<34}{'ms':>10}  resultado")
+        print(f"{'agregando as tabelas no banco':<34}{db_ms:>10.1f}")
+        print(f"{'resumos mensais no banco':<34}{resumo_ms:>10.1f}  {'igual' if nos_resumos == no_banco else 'DIFERENTE'}")
+        print(f"{'snapshot (NumPy)':<34}{snapshot_ms:>10.1f}  {'igual' if no_snapshot == no_banco else 'DIFERENTE'}")
+
+        db_ms, no_banco = medir(lambda: produtos_no_banco(inicio, fim), args.repeticoes)
+        snapshot_ms, no_snapshot = medir(lambda: produtos_mais_vendidos(inicio, fim), args.repeticoes)
+        print(f"\n{'produtos mais vendidos':<34}{'ms':>10}  resultado")
+        print(f"{'GROUP BY no banco':<34}{db_ms:>10.1f}")
+        print(f"{'snapshot (bincount)':<34}{snapshot_ms:>10.1f}  {'igual' if no_snapshot == no_banco else 'DIFERENTE'}")
+
+
+if __name__ == '__main__':
+    main()
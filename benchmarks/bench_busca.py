@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Micro-benchmark: busca para autocompletar (índice em memória) vs LIKE '%termo%'.
+
+Uso:
+    python benchmarks/bench_busca.py [--linhas 100000] [--repeticoes 50]
+
+Gera clientes com nomes sintéticos (com acentos), mede a construção do
+índice e o tempo por "tecla" de buscar_clientes para prefixos de 1 a 6
+letras, comparando com o filtro antigo Cliente.nome.contains(termo).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from caixa import create_app
+from caixa.config import Config
+from caixa.extensoes import catalogo, db
+from caixa.models import Cliente
+from caixa.busca import buscar_clientes
+
+NOMES = ['João', 'José', 'Maria', 'Ana', 'Antônio', 'Francisco', 'Luís', 'Márcia', 'Sebastião', 'Conceição',
+         'Raimundo', 'Fábio', 'Letícia', 'Cláudio', 'Inês', 'Paulo', 'Lúcia', 'Júlio', 'Renata', 'Otávio']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Araújo', 'Gonçalves',
+              'Conceição', 'Ribeiro', 'Gomes', 'Martins', 'Rocha', 'Brandão', 'Falcão', 'Simões', 'Magalhães']
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100000)
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        aleatorio = random.Random(42)
+        db.session.execute(db.insert(Cliente), [{
+            'nome': f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)} {i}',
+            'tipo_pagamento': 'vista',
+            'limite_credito': 0,
+            'saldo_devedor': 0
+        } for i in range(args.linhas)])
+        db.session.commit()
+
+        inicio = time.perf_counter()
+        buscar_clientes('a')
+        print(f'{args.linhas} clientes | construção do índice: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+        print(f'{"termo":<14}{"índice (ms)":>12}{"LIKE (ms)":>12}')
+
+        digitado = 'sebastiao gonc'
+        for tamanho in (1, 2, 3, 6, 9, 11, 14):
+            termo = digitado[:tamanho]
+            indice_ms = medir(lambda: buscar_clientes(termo), args.repeticoes)
+            like_ms = medir(lambda: Cliente.query.filter(Cliente.nome.contains(termo))
+                            .order_by(Cliente.nome).limit(10).all(), max(1, args.repeticoes // 10))
+            print(f'{termo!r:<14}{indice_ms:>12.2f}{like_ms:>12.2f}')
+
+        catalogo.limpar()
+
+
+if __name__ == '__main__':
+    main()
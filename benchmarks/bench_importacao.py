@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Benchmark: importação em lote de vendas históricas (flask caixa importar vendas).
+
+Uso:
+    python benchmarks/bench_importacao.py [--linhas 1000000] [--lote 5000] [--banco /tmp/bench_importacao.db]
+
+Gera um CSV no formato da exportação (uma linha por item, ~3 itens por
+venda, 2% de linhas inválidas), importa em um SQLite em arquivo e mede a
+importação e o recálculo do fluxo de caixa e dos resumos ao final.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from caixa import create_app
+from caixa.config import Config
+from caixa.consolidacao import reconstruir_resumos
+from caixa.extensoes import db
+from caixa.fluxo import recalcular_fluxo_em_lote
+from caixa.importacao import Rejeitados, importar_vendas
+from caixa.models import Caixa, Cliente, Produto
+
+COLUNAS = ['id', 'data_venda', 'caixa_id', 'cliente_id', 'tipo_pagamento', 'valor_pago',
+           'produto_id', 'quantidade', 'preco_unitario']
+
+
+def gerar_csv(caminho, linhas, clientes, produtos):
+    aleatorio = random.Random(42)
+    inicio = datetime(2023, 1, 1, 8)
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(COLUNAS)
+        venda = 0
+        escritas = 0
+        while escritas < linhas:
+            venda += 1
+            data = inicio + timedelta(minutes=aleatorio.randrange(3 * 365 * 24 * 60))
+            tipo = 'vista' if aleatorio.random() < 0.7 else 'prazo'
+            cliente = aleatorio.randint(1, clientes)
+            if aleatorio.random() < 0.02:
+                cliente = clientes + 1  # cliente inexistente: vai para os rejeitados
+            caixa = aleatorio.randint(1, 3)
+            pago = '' if tipo == 'vista' else aleatorio.choice(['', '0', '5'])
+            for _ in range(min(aleatorio.randint(1, 5), linhas - escritas)):
+                escritor.writerow([venda, data.isoformat(' '), caixa, cliente, tipo, pago,
+                                   aleatorio.randint(1, produtos), aleatorio.randint(1, 4),
+                                   f'{aleatorio.uniform(5, 200):.2f}'])
+                escritas += 1
+    return venda
+
+
+class BenchConfig(Config):
+    WTF_CSRF_ENABLED = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--lote', type=int, default=5000)
+    parser.add_argument('--banco', default=os.path.join(tempfile.gettempdir(), 'bench_importacao.db'))
+    args = parser.parse_args()
+
+    if os.path.exists(args.banco):
+        os.remove(args.banco)
+    BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{args.banco}'
+
+    pasta = tempfile.mkdtemp()
+    arquivo = os.path.join(pasta, 'vendas.csv')
+    inicio = time.perf_counter()
+    vendas = gerar_csv(arquivo, args.linhas, clientes=5000, produtos=2000)
+    print(f'CSV gerado: {args.linhas} linhas, {vendas} vendas ({time.perf_counter() - inicio:.1f}s)')
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Caixa), [{'id': i, 'nome': f'Caixa {i}'} for i in range(1, 4)])
+        db.session.execute(db.insert(Cliente), [{'nome': f'Cliente {i}', 'saldo_devedor': 0} for i in range(5000)])
+        db.session.execute(db.insert(Produto), [{'tipo': 'outro', 'descricao': f'Produto {i}', 'preco': 10}
+                                                for i in range(2000)])
+        db.session.commit()
+
+        inicio = time.perf_counter()
+        with Rejeitados(arquivo + '.rejeitados.jsonl') as rejeitados:
+            resultado = importar_vendas(arquivo, rejeitados, tamanho_lote=args.lote)
+        importacao = time.perf_counter() - inicio
+        print(f"Importação: {resultado['importados']} vendas, {resultado['itens']} itens, "
+              f"{resultado['rejeitados']} linhas rejeitadas em {importacao:.1f}s "
+              f"({resultado['itens'] / importacao:,.0f} itens/s)")
+
+        inicio = time.perf_counter()
+        recalcular_fluxo_em_lote(resultado['inicio'], resultado['fim'])
+        reconstruir_resumos(resultado['inicio'], resultado['fim'])
+        print(f'Recálculo do fluxo e dos resumos: {time.perf_counter() - inicio:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Benchmark: relatórios e reconstruções particionados por mês em processos paralelos.
+
+Uso:
+    python benchmarks/bench_paralelo.py [--caixas 30] [--anos 3] [--vendas-por-dia 300]
+                                        [--processos 1,2,4,8] [--repeticoes 3]
+                                        [--banco /tmp/bench_paralelo.db]
+
+Gera um histórico de vendas e pagamentos em um SQLite em arquivo (WAL, para
+os processos lerem juntos) e mede, para cada quantidade de processos
+(RELATORIOS_PROCESSOS), três trabalhos que o worker/CLI fazem com
+mapear_particoes: a agregação das vendas por mês (calcular_resumos_periodo),
+a reconstrução completa dos resumos e o relatório geral de todo o período.
+Os resultados de cada execução são comparados com os da execução em série e
+o ganho é relativo a 1 processo; só aparece em máquina com vários núcleos.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from caixa import create_app
+from caixa.config import Config
+from caixa.consolidacao import calcular_resumos_periodo, reconstruir_resumos
+from caixa.extensoes import db
+from caixa.fluxo import recalcular_fluxo_em_lote
+from caixa.models import Caixa, Cliente, Pagamento, Venda
+from caixa.paralelo import mapear_particoes
+from caixa.periodos import meses_do_periodo
+from caixa.relatorios.routes import _dados_relatorio_geral
+
+
+class BenchConfig(Config):
+    WTF_CSRF_ENABLED = False
+    LOG_NIVEL = 'WARNING'
+
+
+def popular(args, aleatorio):
+    hoje = date.today()
+    inicio = hoje - timedelta(days=args.anos * 365 - 1)
+    db.session.execute(db.insert(Caixa), [{'id': i, 'nome': f'Caixa {i}'} for i in range(1, args.caixas + 1)])
+    db.session.execute(db.insert(Cliente), [{'nome': f'Cliente {i}', 'saldo_devedor': 0} for i in range(1000)])
+    db.session.commit()
+
+    dia = inicio
+    while dia <= hoje:
+        abertura = datetime.combine(dia, datetime.min.time())
+        vendas = []
+        for _ in range(args.vendas_por_dia):
+            tipo = 'vista' if aleatorio.random() < 0.7 else 'prazo'
+            total = round(aleatorio.uniform(5, 500), 2)
+            vendas.append({
+                'data_venda': abertura + timedelta(seconds=aleatorio.randrange(8 * 3600, 20 * 3600)),
+                'valor_total': total, 'valor_pago': total if tipo == 'vista' else 0,
+                'status': 'pago' if tipo == 'vista' else 'pendente', 'tipo_pagamento': tipo,
+                'cliente_id': aleatorio.randint(1, 1000), 'caixa_id': aleatorio.randint(1, args.caixas)
+            })
+        ids = db.session.execute(
+            db.insert(Venda.__table__).returning(Venda.id, sort_by_parameter_order=True), vendas
+        ).scalars().all()
+        db.session.execute(db.insert(Pagamento.__table__), [
+            {'venda_id': id_venda, 'valor': venda['valor_total'], 'data_pagamento': venda['data_venda'],
+             'forma_pagamento': 'dinheiro'}
+            for id_venda, venda in zip(ids, vendas) if venda['tipo_pagamento'] == 'vista'
+        ])
+        db.session.commit()
+        dia += timedelta(days=1)
+    return inicio, hoje
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+        db.session.remove()
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--caixas', type=int, default=30)
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--vendas-por-dia', type=int, default=300)
+    parser.add_argument('--processos', default=f'1,2,4,{os.cpu_count() or 1}')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--banco', default=os.path.join(tempfile.gettempdir(), 'bench_paralelo.db'))
+    args = parser.parse_args()
+    processos = sorted({int(p) for p in args.processos.split(',')})
+
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(args.banco + sufixo):
+            os.remove(args.banco + sufixo)
+    BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{args.banco}'
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        inicio_carga = time.perf_counter()
+        inicio, fim = popular(args, random.Random(42))
+        recalcular_fluxo_em_lote(inicio, fim)
+        vendas = db.session.query(Venda).count()
+        print(f'{vendas} vendas em {args.caixas} caixas, {inicio} a {fim} '
+              f'({time.perf_counter() - inicio_carga:.1f}s); {os.cpu_count()} CPUs')
+
+        meses = meses_do_periodo(inicio, fim)
+        trabalhos = {
+            'agregacao_mensal': lambda: list(mapear_particoes(calcular_resumos_periodo, meses)),
+            'reconstruir_resumos': lambda: reconstruir_resumos(inicio, fim)['registros'],
+            'relatorio_geral': lambda: _dados_relatorio_geral(inicio, fim, particoes=meses),
+        }
+
+        if max(processos) > (os.cpu_count() or 1):
+            print(f'Aviso: mais processos que CPUs ({os.cpu_count()}); o ganho medido aqui não vale '
+                  f'para uma máquina com {max(processos)} núcleos')
+
+        print(f"\n{'trabalho':<22}{'processos':>10}{'tempo (s)':>12}{'ganho':>8}  resultado")
+        for nome, trabalho in trabalhos.items():
+            referencia = None
+            for quantidade in processos:
+                app.config['RELATORIOS_PROCESSOS'] = quantidade
+                tempo, resultado = medir(trabalho, args.repeticoes)
+                if referencia is None:
+                    referencia = (tempo, resultado)
+                igual = 'igual' if resultado == referencia[1] else 'DIFERENTE'
+                print(f'{nome:<22}{quantidade:>10}{tempo:>12.3f}{referencia[0] / tempo:>7.2f}x  {igual}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Micro-benchmark: resumo do dia com ORM + sum() em Python vs agregação no SQL.
+
+Uso:
+    python benchmarks/bench_resumo_dia.py [--tamanhos 100,1000,10000,50000] [--repeticoes 20]
+
+Para cada quantidade de vendas no dia, mede o tempo médio de uma chamada
+ao caminho antigo (carregar todas as vendas e somar em Python) e ao
+resumo_vendas_dia (SUM/COUNT ... GROUP BY tipo_pagamento).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from caixa import create_app
+from caixa.config import Config
+from caixa.extensoes import db
+from caixa.models import Caixa, Cliente, Venda
+from caixa.periodos import filtro_dia
+from caixa.resumos import resumo_vendas_dia
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+
+
+def resumo_antigo(data):
+    """Caminho anterior: carrega os objetos Venda e soma em Python"""
+    vendas = Venda.query.filter(filtro_dia(Venda.data_venda, data)).all()
+    return {
+        'total_vendas': sum(v.valor_total for v in vendas),
+        'total_recebido': sum(v.valor_pago for v in vendas),
+        'quantidade_vendas': len(vendas),
+        'vendas_prazo': len([v for v in vendas if v.tipo_pagamento == 'prazo']),
+        'vendas_vista': len([v for v in vendas if v.tipo_pagamento == 'vista'])
+    }
+
+
+def popular(quantidade, hoje):
+    """Completa o dia até 'quantidade' vendas (e um dia anterior de mesmo tamanho)"""
+    existentes = Venda.query.filter(filtro_dia(Venda.data_venda, hoje)).count()
+    inicio = datetime.combine(hoje, datetime.min.time())
+    linhas = []
+    for i in range(existentes, quantidade):
+        tipo = 'vista' if i % 3 else 'prazo'
+        for dia in (inicio, inicio - timedelta(days=1)):
+            linhas.append({
+                'data_venda': dia + timedelta(seconds=i % 86400),
+                'valor_total': 10.0 + i % 7,
+                'valor_pago': 10.0 + i % 7 if tipo == 'vista' else 0,
+                'status': 'pago' if tipo == 'vista' else 'pendente',
+                'tipo_pagamento': tipo,
+                'cliente_id': 1,
+                'caixa_id': 1 + i % 4
+            })
+    if linhas:
+        db.session.execute(db.insert(Venda), linhas)
+        db.session.commit()
+
+
+def medir(funcao, repeticoes):
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+        db.session.expunge_all()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', default='100,1000,10000,50000')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    hoje = date.today()
+
+    with app.app_context():
+        db.create_all()
+        for i in range(1, 5):
+            db.session.add(Caixa(id=i, nome=f'Caixa {i}'))
+        db.session.add(Cliente(id=1, nome='Cliente'))
+        db.session.commit()
+
+        print(f"{'vendas/dia':>10} {'antigo (ms)':>12} {'agregado (ms)':>14} {'agregado/caixa (ms)':>20}")
+        for tamanho in (int(t) for t in args.tamanhos.split(',')):
+            popular(tamanho, hoje)
+            assert resumo_antigo(hoje)['quantidade_vendas'] == resumo_vendas_dia(hoje)['quantidade_vendas']
+
+            antigo = medir(lambda: resumo_antigo(hoje), args.repeticoes)
+            agregado = medir(lambda: resumo_vendas_dia(hoje), args.repeticoes)
+            por_caixa = medir(lambda: resumo_vendas_dia(hoje, caixa_id=1), args.repeticoes)
+            print(f'{tamanho:>10} {antigo:>12.2f} {agregado:>14.2f} {por_caixa:>20.2f}')
+
+
+if __name__ == '__main__':
+    main()
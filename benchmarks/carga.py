@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+"""Carga sintética e benchmark de ponta a ponta do caixa (venda, pagamento e painéis).
+
+Uso:
+    python benchmarks/carga.py [--caixas 3] [--clientes 2000] [--produtos 300] [--dias 90]
+                               [--vendas-por-dia 200] [--requisicoes 200] [--concorrencia 0]
+                               [--cenarios nova_venda,index,...] [--sem-cache] [--saida resultado.json]
+                               [--perfil desenvolvimento|producao] [--sem-pragmas] [--url postgresql://...]
+    python benchmarks/carga.py --comparar antes.json depois.json
+
+Popula um SQLite em arquivo (caixas, operadores, clientes, produtos e o
+histórico de vendas/pagamentos com fluxo e resumos recalculados) usando
+create_app com uma configuração de teste, e então exercita cada cenário:
+
+    nova_venda            POST /vendas/nova (operador, à vista ou a prazo)
+    registrar_pagamento   POST /vendas/<id>/pagar (venda a prazo em aberto)
+    index                 GET / (dono)
+    fluxo_tempo_real      GET /relatorios/fluxo-tempo-real (operador)
+    relatorio_diario      GET /relatorios/diario (operador)
+    relatorio_geral       GET /relatorios/geral dos últimos 30 dias (dono)
+    detalhe_cliente       GET /clientes/<id> (operador; cliente aleatório)
+    recebiveis            GET /relatorios/recebiveis (dono; primeira página)
+
+Com --concorrencia 0 as requisições passam pelo test client do Flask, uma
+de cada vez; com N > 0 a aplicação sobe em um servidor HTTP local com
+threads e N clientes disparam as requisições ao mesmo tempo.
+
+Para cada cenário são medidos latência (p50/p95/p99/média/máx), vazão,
+erros e comandos SQL por requisição (contados pela instrumentação do
+orçamento de consultas). O resultado é um JSON com chaves ordenadas, para
+comparar entre commits com --comparar ou com diff.
+
+--perfil escolhe o perfil de configuração (caixa.config.PERFIS) usado pela
+app; --sem-pragmas desliga os PRAGMAs do SQLite, para medir o ganho do WAL;
+--url roda contra outro banco (ex.: um Postgres local descartável; as
+tabelas são apagadas e recriadas).
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlalchemy
+from flask import g
+from werkzeug.serving import make_server
+
+from caixa import create_app
+from caixa.config import PERFIS, Config, opcoes_motor
+from caixa.consolidacao import reconstruir_resumos
+from caixa.extensoes import db
+from caixa.extrato import reconstruir_extratos
+from caixa.fluxo import recalcular_fluxo_em_lote
+from caixa.models import Caixa, Cliente, Produto, User, Venda, ItemVenda, Pagamento, CategoriaDespesa
+
+CENARIOS = ('nova_venda', 'registrar_pagamento', 'index', 'fluxo_tempo_real',
+            'relatorio_diario', 'relatorio_geral', 'detalhe_cliente', 'recebiveis')
+
+# Métricas comparadas por --comparar
+METRICAS_COMPARADAS = ('p50_ms', 'p95_ms', 'p99_ms', 'vazao_rps', 'sql_media')
+
+CABECALHO_SQL = 'X-Consultas-SQL'
+
+
+class CargaConfig(Config):
+    WTF_CSRF_ENABLED = False
+    SESSION_COOKIE_SECURE = False
+    # O harness mede; não deve derrubar a requisição que estourar o orçamento
+    SQL_ORCAMENTO_ESTRITO = False
+    # O resultado sai em JSON no stdout; os logs por venda/requisição lenta iriam junto
+    LOG_NIVEL = 'WARNING'
+    REQUISICAO_LENTA_MS = 0
+
+
+# ========== DADOS SINTÉTICOS ==========
+
+def popular(args, aleatorio):
+    """Cadastros e histórico de vendas; devolve os ids úteis para os cenários"""
+    hoje = date.today()
+    db.session.execute(db.insert(Caixa), [{'id': i, 'nome': f'Caixa {i}'} for i in range(1, args.caixas + 1)])
+    # O usuário 1 é o dono; os demais operam um caixa cada (id do usuário = id do caixa)
+    db.session.execute(db.insert(User), [{
+        'id': i, 'email': f'usuario{i}@carga', 'nome': f'Usuário {i}', 'is_owner': i == 1, 'caixa_id': i
+    } for i in range(1, args.caixas + 1)])
+    db.session.execute(db.insert(Cliente), [{
+        'nome': f'Cliente {i}', 'limite_credito': 10 ** 9, 'saldo_devedor': 0, 'tipo_pagamento': 'vista'
+    } for i in range(args.clientes)])
+    db.session.execute(db.insert(Produto), [{
+        'tipo': 'outro', 'descricao': f'Produto {i}', 'preco': round(aleatorio.uniform(5, 300), 2),
+        'estoque': 10 ** 9
+    } for i in range(args.produtos)])
+    db.session.add(CategoriaDespesa(nome='Geral'))
+    db.session.commit()
+
+    precos = dict(db.session.execute(db.select(Produto.id, Produto.preco)).all())
+    ids_produtos = list(precos)
+    inicio = datetime.combine(hoje - timedelta(days=args.dias - 1), datetime.min.time())
+
+    for dia in range(args.dias):
+        vendas, itens_por_venda = [], []
+        for _ in range(args.vendas_por_dia):
+            itens = []
+            for produto_id in aleatorio.sample(ids_produtos, min(aleatorio.randint(1, 4), len(ids_produtos))):
+                quantidade = aleatorio.randint(1, 3)
+                itens.append({'produto_id': produto_id, 'quantidade': quantidade,
+                              'preco_unitario': precos[produto_id],
+                              'subtotal': round(quantidade * precos[produto_id], 2)})
+            total = round(sum(item['subtotal'] for item in itens), 2)
+            tipo = 'vista' if aleatorio.random() < 0.7 else 'prazo'
+            caixa = aleatorio.randint(1, args.caixas)
+            vendas.append({
+                'data_venda': inicio + timedelta(days=dia, seconds=aleatorio.randrange(8 * 3600, 20 * 3600)),
+                'valor_total': total, 'valor_pago': total if tipo == 'vista' else 0,
+                'status': 'pago' if tipo == 'vista' else 'pendente', 'tipo_pagamento': tipo,
+                'cliente_id': aleatorio.randint(1, args.clientes), 'vendedor_id': caixa, 'caixa_id': caixa
+            })
+            itens_por_venda.append(itens)
+
+        ids = db.session.execute(
+            db.insert(Venda.__table__).returning(Venda.id, sort_by_parameter_order=True), vendas
+        ).scalars().all()
+        db.session.execute(db.insert(ItemVenda.__table__), [
+            dict(item, venda_id=id_venda) for id_venda, itens in zip(ids, itens_por_venda) for item in itens
+        ])
+        pagamentos = [{'venda_id': id_venda, 'valor': venda['valor_total'], 'data_pagamento': venda['data_venda'],
+                       'forma_pagamento': 'dinheiro', 'recebedor_id': venda['vendedor_id']}
+                      for id_venda, venda in zip(ids, vendas) if venda['tipo_pagamento'] == 'vista']
+        if pagamentos:
+            db.session.execute(db.insert(Pagamento.__table__), pagamentos)
+        db.session.commit()
+
+    # Extrato, saldo devedor e totais dos clientes coerentes com as vendas
+    reconstruir_extratos()
+
+    recalcular_fluxo_em_lote(inicio.date(), hoje)
+    reconstruir_resumos(inicio.date(), hoje)
+
+    return {
+        'vendas_a_prazo': db.session.execute(
+            db.select(Venda.id, Venda.caixa_id).where(Venda.tipo_pagamento == 'prazo', Venda.status != 'pago')
+        ).all(),
+        'clientes': args.clientes,
+        'produtos': ids_produtos,
+    }
+
+
+# ========== REQUISIÇÕES ==========
+
+def montar_requisicoes(cenario, quantidade, dados, args, aleatorio):
+    """Lista de (usuário, método, caminho, formulário, status esperado) de um cenário"""
+    hoje = date.today()
+    operadores = list(range(2, args.caixas + 1)) or [1]
+    requisicoes = []
+    for _ in range(quantidade):
+        operador = aleatorio.choice(operadores)
+        if cenario == 'nova_venda':
+            formulario = {'cliente_id': aleatorio.randint(1, dados['clientes']),
+                          'tipo_pagamento': aleatorio.choice(['vista', 'vista', 'prazo'])}
+            produtos = aleatorio.sample(dados['produtos'], min(aleatorio.randint(1, 4), len(dados['produtos'])))
+            for i, produto_id in enumerate(produtos):
+                formulario[f'itens-{i}-produto_id'] = produto_id
+                formulario[f'itens-{i}-quantidade'] = aleatorio.randint(1, 3)
+            requisicoes.append((operador, 'POST', '/vendas/nova', formulario, 302))
+        elif cenario == 'registrar_pagamento':
+            venda_id, caixa_id = aleatorio.choice(dados['vendas_a_prazo'])
+            requisicoes.append((caixa_id or 1, 'POST', f'/vendas/{venda_id}/pagar',
+                                {'valor': '0.01', 'forma_pagamento': 'pix'}, 302))
+        elif cenario == 'index':
+            requisicoes.append((1, 'GET', '/', None, 200))
+        elif cenario == 'fluxo_tempo_real':
+            requisicoes.append((operador, 'GET', '/relatorios/fluxo-tempo-real', None, 200))
+        elif cenario == 'relatorio_diario':
+            requisicoes.append((operador, 'GET', f'/relatorios/diario?data={hoje}', None, 200))
+        elif cenario == 'relatorio_geral':
+            inicio = hoje - timedelta(days=30)
+            requisicoes.append((1, 'GET', f'/relatorios/geral?data_inicio={inicio}&data_fim={hoje}', None, 200))
+        elif cenario == 'detalhe_cliente':
+            requisicoes.append((operador, 'GET', f"/clientes/{aleatorio.randint(1, dados['clientes'])}", None, 200))
+        elif cenario == 'recebiveis':
+            requisicoes.append((1, 'GET', '/relatorios/recebiveis', None, 200))
+    return requisicoes
+
+
+class ClienteTeste:
+    """Executa as requisições pelo test client do Flask (sem rede)"""
+
+    def __init__(self, app, usuarios):
+        self.clientes = {}
+        for usuario in usuarios:
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao['_user_id'] = str(usuario)
+                sessao['_fresh'] = True
+            self.clientes[usuario] = cliente
+
+    def executar(self, usuario, metodo, caminho, formulario):
+        resposta = self.clientes[usuario].open(caminho, method=metodo, data=formulario)
+        return resposta.status_code, int(resposta.headers.get(CABECALHO_SQL, 0))
+
+
+class ClienteHttp:
+    """Executa as requisições em um servidor HTTP local (werkzeug, com threads)"""
+
+    def __init__(self, app, usuarios):
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.servidor = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base = f'http://127.0.0.1:{self.servidor.server_port}'
+        self.thread = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self.thread.start()
+
+        serializador = app.session_interface.get_signing_serializer(app)
+        nome_cookie = app.config['SESSION_COOKIE_NAME']
+        self.cookies = {
+            usuario: f"{nome_cookie}={serializador.dumps({'_user_id': str(usuario), '_fresh': True})}"
+            for usuario in usuarios
+        }
+
+        class SemRedirecionar(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args, **kwargs):
+                return None
+
+        self.abridor = urllib.request.build_opener(SemRedirecionar)
+
+    def executar(self, usuario, metodo, caminho, formulario):
+        corpo = urllib.parse.urlencode(formulario).encode() if formulario else None
+        requisicao = urllib.request.Request(self.base + caminho, data=corpo, method=metodo,
+                                            headers={'Cookie': self.cookies[usuario]})
+        try:
+            with self.abridor.open(requisicao, timeout=60) as resposta:
+                resposta.read()
+                return resposta.status, int(resposta.headers.get(CABECALHO_SQL, 0))
+        except urllib.error.HTTPError as erro:
+            return erro.code, int(erro.headers.get(CABECALHO_SQL, 0))
+
+    def fechar(self):
+        self.servidor.shutdown()
+
+
+# ========== MEDIÇÃO ==========
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do posto mais próximo"""
+    if not valores_ordenados:
+        return 0
+    posicao = max(int(round(p / 100 * len(valores_ordenados) + 0.5)) - 1, 0)
+    return valores_ordenados[min(posicao, len(valores_ordenados) - 1)]
+
+
+def medir_cenario(cliente, requisicoes, concorrencia):
+    latencias, consultas, erros = [], [], 0
+    lock = threading.Lock()
+
+    def executar(requisicao):
+        nonlocal erros
+        usuario, metodo, caminho, formulario, esperado = requisicao
+        inicio = time.perf_counter()
+        try:
+            status, sql = cliente.executar(usuario, metodo, caminho, formulario)
+        except Exception:
+            status, sql = None, 0
+        duracao = (time.perf_counter() - inicio) * 1000
+        with lock:
+            latencias.append(duracao)
+            consultas.append(sql)
+            if status != esperado:
+                erros += 1
+
+    inicio = time.perf_counter()
+    if concorrencia:
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            list(executor.map(executar, requisicoes))
+    else:
+        for requisicao in requisicoes:
+            executar(requisicao)
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'requisicoes': len(requisicoes),
+        'erros': erros,
+        'p50_ms': round(percentil(latencias, 50), 2),
+        'p95_ms': round(percentil(latencias, 95), 2),
+        'p99_ms': round(percentil(latencias, 99), 2),
+        'media_ms': round(sum(latencias) / len(latencias), 2) if latencias else 0,
+        'max_ms': round(latencias[-1], 2) if latencias else 0,
+        'vazao_rps': round(len(requisicoes) / total, 1) if total else 0,
+        'sql_media': round(sum(consultas) / len(consultas), 1) if consultas else 0,
+        'sql_max': max(consultas, default=0),
+    }
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args):
+    aleatorio = random.Random(args.semente)
+    for arquivo in (args.banco, args.banco + '-wal', args.banco + '-shm'):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+    url = args.url or f'sqlite:///{args.banco}'
+    configuracao = type('CargaConfig', (CargaConfig, PERFIS[args.perfil]), {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_ENGINE_OPTIONS': opcoes_motor(url, **({'pool_tamanho': 8, 'pool_excedente': 4}
+                                                          if args.perfil == 'producao' else {})),
+        'SQLALCHEMY_BINDS': {},
+        'RELATORIOS_CACHE_ATIVO': not args.sem_cache,
+    })
+    if args.sem_pragmas:
+        configuracao.SQLITE_PRAGMAS = {}
+    app = create_app(configuracao)
+
+    @app.after_request
+    def informar_consultas(resposta):
+        resposta.headers[CABECALHO_SQL] = str(g.get('consultas_sql', 0))
+        return resposta
+
+    with app.app_context():
+        if args.url:
+            db.drop_all()
+        db.create_all()
+        inicio = time.perf_counter()
+        dados = popular(args, aleatorio)
+        print(f'Banco populado em {time.perf_counter() - inicio:.1f}s', file=sys.stderr)
+
+    usuarios = range(1, args.caixas + 1)
+    cliente = ClienteHttp(app, usuarios) if args.concorrencia else ClienteTeste(app, usuarios)
+    resultados = {}
+    try:
+        for cenario in args.cenarios:
+            requisicoes = montar_requisicoes(cenario, args.aquecimento + args.requisicoes, dados, args, aleatorio)
+            medir_cenario(cliente, requisicoes[:args.aquecimento], args.concorrencia)
+            resultados[cenario] = medir_cenario(cliente, requisicoes[args.aquecimento:], args.concorrencia)
+            print(f"{cenario:22} p50={resultados[cenario]['p50_ms']:8.2f}ms "
+                  f"p95={resultados[cenario]['p95_ms']:8.2f}ms p99={resultados[cenario]['p99_ms']:8.2f}ms "
+                  f"{resultados[cenario]['vazao_rps']:8.1f} req/s sql={resultados[cenario]['sql_media']:5.1f} "
+                  f"erros={resultados[cenario]['erros']}", file=sys.stderr)
+    finally:
+        if isinstance(cliente, ClienteHttp):
+            cliente.fechar()
+
+    return {
+        'versao': versao_codigo(),
+        'executado_em': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'banco': sqlalchemy.engine.make_url(url).get_backend_name(),
+        },
+        'parametros': {
+            'caixas': args.caixas, 'clientes': args.clientes, 'produtos': args.produtos, 'dias': args.dias,
+            'vendas_por_dia': args.vendas_por_dia, 'requisicoes': args.requisicoes,
+            'aquecimento': args.aquecimento, 'concorrencia': args.concorrencia, 'semente': args.semente,
+            'cache_relatorios': not args.sem_cache, 'perfil': args.perfil, 'pragmas_sqlite': not args.sem_pragmas,
+        },
+        'cenarios': resultados,
+    }
+
+
+def comparar(caminho_antes, caminho_depois):
+    with open(caminho_antes, encoding='utf-8') as arquivo:
+        antes = json.load(arquivo)
+    with open(caminho_depois, encoding='utf-8') as arquivo:
+        depois = json.load(arquivo)
+
+    print(f"{'cenário':22} {'métrica':10} {antes.get('versao') or 'antes':>10} "
+          f"{depois.get('versao') or 'depois':>10}  variação")
+    for cenario in sorted(set(antes['cenarios']) & set(depois['cenarios'])):
+        for metrica in METRICAS_COMPARADAS:
+            valor_antes = antes['cenarios'][cenario][metrica]
+            valor_depois = depois['cenarios'][cenario][metrica]
+            variacao = f'{(valor_depois - valor_antes) / valor_antes * 100:+.1f}%' if valor_antes else '-'
+            print(f'{cenario:22} {metrica:10} {valor_antes:10} {valor_depois:10}  {variacao}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--caixas', type=int, default=3)
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--produtos', type=int, default=300)
+    parser.add_argument('--dias', type=int, default=90)
+    parser.add_argument('--vendas-por-dia', type=int, default=200)
+    parser.add_argument('--requisicoes', type=int, default=200, help='Requisições medidas por cenário.')
+    parser.add_argument('--aquecimento', type=int, default=10, help='Requisições descartadas por cenário.')
+    parser.add_argument('--concorrencia', type=int, default=0,
+                        help='0 = test client, uma por vez; N = servidor HTTP local com N clientes.')
+    parser.add_argument('--cenarios', default=','.join(CENARIOS))
+    parser.add_argument('--sem-cache', action='store_true',
+                        help='Desliga o cache dos relatórios (mede as consultas a cada requisição).')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--banco', default=os.path.join(tempfile.gettempdir(), 'carga_caixa.db'))
+    parser.add_argument('--url', help='URL de outro banco (as tabelas são recriadas); ignora --banco.')
+    parser.add_argument('--perfil', choices=sorted(PERFIS), default='desenvolvimento')
+    parser.add_argument('--sem-pragmas', action='store_true', help='Não aplica os PRAGMAs do SQLite.')
+    parser.add_argument('--saida', help='Arquivo JSON do resultado (padrão: stdout).')
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'),
+                        help='Compara dois resultados JSON em vez de executar.')
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    args.cenarios = [c.strip() for c in args.cenarios.split(',') if c.strip()]
+    desconhecidos = set(args.cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    resultado = json.dumps(executar(args), indent=2, sort_keys=True, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(resultado + '\n')
+    else:
+        print(resultado)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Verificação de concorrência: vendas paralelas do mesmo produto não vendem além do estoque.
+
+Uso:
+    python benchmarks/concorrencia_estoque.py [--estoque 5] [--vendas 30] [--threads 10]
+
+Cria um banco temporário (ou usa DATABASE_URL, p.ex. um Postgres local de testes,
+que será recriado), dispara vendas simultâneas de 1 unidade do mesmo produto
+pelo cliente de testes do Flask e confere que o número de vendas confirmadas e
+o estoque final batem com o estoque inicial.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from caixa import create_app
+from caixa.config import Config
+from caixa.extensoes import db
+from caixa.models import Caixa, Cliente, ItemVenda, Produto, User
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--estoque', type=int, default=5)
+    parser.add_argument('--vendas', type=int, default=30)
+    parser.add_argument('--threads', type=int, default=10)
+    args = parser.parse_args()
+
+    arquivo = os.path.join(tempfile.mkdtemp(), 'concorrencia.db')
+
+    class ConcorrenciaConfig(Config):
+        SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{arquivo}'
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}} if not os.environ.get('DATABASE_URL') else {}
+        WTF_CSRF_ENABLED = False
+        SQL_ORCAMENTO_CONSULTAS = 0
+        LOG_NIVEL = 'WARNING'
+
+    app = create_app(ConcorrenciaConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Caixa(id=1, nome='Caixa 1'))
+        db.session.add(User(id=1, email='dono@teste', nome='Dono', is_owner=True, caixa_id=1))
+        db.session.add(Cliente(id=1, nome='Cliente'))
+        db.session.add(Produto(id=1, tipo='teste', descricao='Última unidade', preco=10.0, estoque=args.estoque))
+        db.session.commit()
+
+    inicio = threading.Barrier(args.threads)
+
+    def vender(_):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sessao:
+            sessao['_user_id'] = '1'
+        try:
+            inicio.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        resposta = cliente.post('https://localhost/vendas/nova', data={
+            'cliente_id': 1,
+            'tipo_pagamento': 'vista',
+            'itens-0-produto_id': 1,
+            'itens-0-quantidade': 1
+        })
+        return resposta.status_code == 302 and '/vendas/nova' not in resposta.headers.get('Location', '')
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        confirmadas = sum(executor.map(vender, range(args.vendas)))
+
+    with app.app_context():
+        estoque_final = db.session.get(Produto, 1).estoque
+        vendidos = db.session.query(db.func.coalesce(db.func.sum(ItemVenda.quantidade), 0)).scalar()
+
+    print(f'Estoque inicial: {args.estoque}')
+    print(f'Vendas tentadas: {args.vendas} | confirmadas: {confirmadas}')
+    print(f'Itens vendidos: {vendidos} | estoque final: {estoque_final}')
+
+    ok = estoque_final >= 0 and vendidos == confirmadas and vendidos + estoque_final == args.estoque
+    print('OK: nenhuma venda além do estoque' if ok else 'FALHA: estoque inconsistente')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Verificação do roteamento de leituras para a réplica (bind 'leitura').
+
+Uso:
+    python benchmarks/replica_leitura.py
+    DATABASE_URL=postgresql://.../caixa_primario DATABASE_URL_LEITURA=postgresql://.../caixa_replica \\
+        python benchmarks/replica_leitura.py
+
+Sem variáveis de ambiente usa dois arquivos SQLite temporários; com elas,
+dois bancos locais de teste (as tabelas são recriadas). A "replicação" é
+uma cópia das tabelas do primário para a réplica feita uma única vez, de
+modo que a réplica fica atrasada de propósito e dá para ver de onde cada
+tela leu:
+
+    1. relatórios e listagens (GET) leem só da réplica;
+    2. a venda (POST) grava só no primário;
+    3. logo depois, quem vendeu vê a listagem pelo primário (lê o que gravou);
+    4. outro usuário continua na réplica, sem a venda nova;
+    5. passada a janela pós-escrita, quem vendeu volta para a réplica;
+    6. um GET de relatório que grava (relatório geral longo enfileirado no
+       worker) lê a tarefa recém-criada pelo primário, síncrono ou assíncrono.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+
+from caixa import create_app
+from caixa.config import Config, binds_leitura
+from caixa.extensoes import cache_relatorios, db
+from caixa.models import Caixa, Cliente, Produto, User
+
+JANELA = 1
+
+
+def replicar(origem, destino):
+    """Copia todas as tabelas de um engine para o outro (réplica congelada)"""
+    with origem.connect() as leitura, destino.begin() as escrita:
+        for tabela in db.metadata.sorted_tables:
+            linhas = [dict(linha) for linha in leitura.execute(tabela.select()).mappings()]
+            if linhas:
+                escrita.execute(tabela.insert(), linhas)
+
+
+def main():
+    pasta = tempfile.mkdtemp()
+    url_primario = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(pasta, 'primario.db')}"
+    url_leitura = os.environ.get('DATABASE_URL_LEITURA') or f"sqlite:///{os.path.join(pasta, 'replica.db')}"
+
+    class ReplicaConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url_primario
+        SQLALCHEMY_BINDS = binds_leitura(url_leitura)
+        WTF_CSRF_ENABLED = False
+        LOG_NIVEL = 'WARNING'
+        LEITURA_JANELA_POS_ESCRITA = JANELA
+
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        primario, replica = db.engines[None], db.engines['leitura']
+        for engine in (primario, replica):
+            db.metadata.drop_all(engine)
+            db.metadata.create_all(engine)
+        db.session.add_all([Caixa(id=1, nome='Caixa 1'), Caixa(id=2, nome='Caixa 2')])
+        db.session.add(User(id=1, email='dono@teste', nome='Dono', is_owner=True, caixa_id=1))
+        db.session.add(User(id=2, email='operador@teste', nome='Operador', is_owner=False, caixa_id=2))
+        db.session.add(Cliente(id=1, nome='Cliente', limite_credito=1000, saldo_devedor=0))
+        db.session.add(Produto(id=1, tipo='teste', descricao='Produto', preco=10.0, estoque=100))
+        db.session.commit()
+        replicar(primario, replica)
+
+    comandos = {'primario': 0, 'replica': 0}
+    for nome, engine in (('primario', primario), ('replica', replica)):
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args, nome=nome: comandos.__setitem__(nome, comandos[nome] + 1))
+
+    def cliente(usuario):
+        c = app.test_client()
+        with c.session_transaction() as sessao:
+            sessao['_user_id'] = str(usuario)
+        return c
+
+    def medir(c, metodo, caminho, **kwargs):
+        comandos.update(primario=0, replica=0)
+        resposta = c.open('https://localhost' + caminho, method=metodo, **kwargs)
+        return resposta, dict(comandos)
+
+    dono, operador = cliente(1), cliente(2)
+    verificacoes = []
+
+    for caminho in ('/relatorios/geral', '/relatorios/fluxo-tempo-real', '/vendas/todas', '/clientes/'):
+        resposta, contagem = medir(dono, 'GET', caminho)
+        verificacoes.append((f'GET {caminho} lê da réplica', resposta.status_code == 200
+                             and contagem['replica'] > 0 and contagem['primario'] == 0, contagem))
+
+    resposta, contagem = medir(operador, 'POST', '/vendas/nova', data={
+        'cliente_id': 1, 'tipo_pagamento': 'vista', 'itens-0-produto_id': 1, 'itens-0-quantidade': 1,
+    })
+    verificacoes.append(('POST /vendas/nova grava no primário', resposta.status_code == 302
+                         and contagem['primario'] > 0 and contagem['replica'] == 0, contagem))
+
+    resposta, contagem = medir(operador, 'GET', '/vendas/api/listagem')
+    verificacoes.append(('quem vendeu lê a própria venda no primário',
+                         contagem['primario'] > 0 and contagem['replica'] == 0
+                         and len(resposta.get_json()['itens']) == 1, contagem))
+
+    resposta, contagem = medir(dono, 'GET', '/vendas/api/listagem')
+    verificacoes.append(('outro usuário continua na réplica (atrasada)',
+                         contagem['replica'] > 0 and contagem['primario'] == 0
+                         and len(resposta.get_json()['itens']) == 0, contagem))
+
+    time.sleep(JANELA + 0.1)
+    resposta, contagem = medir(operador, 'GET', '/vendas/api/listagem')
+    verificacoes.append(('depois da janela, quem vendeu volta para a réplica',
+                         contagem['replica'] > 0 and contagem['primario'] == 0, contagem))
+
+    # Período acima de TAREFAS_RELATORIO_GERAL_DIAS: o GET enfileira a Tarefa (INSERT no
+    # primário) e relê a linha; com a réplica atrasada isso dava ObjectDeletedError
+    longo = '/relatorios/geral?data_inicio=2024-01-01&data_fim=2024-12-31'
+    for assincrono in (True, False):
+        app.config['TAREFAS_ASSINCRONAS'] = assincrono
+        cache_relatorios.limpar()
+        time.sleep(JANELA + 0.1)
+        resposta, contagem = medir(dono, 'GET', longo)
+        verificacoes.append((f"GET do relatório longo ({'fila' if assincrono else 'na hora'}) "
+                             f"enfileira e relê no primário",
+                             resposta.status_code == (202 if assincrono else 200)
+                             and contagem['primario'] > 0, contagem))
+
+    for descricao, ok, contagem in verificacoes:
+        print(f"{'OK   ' if ok else 'FALHA'} {descricao}  (primário={contagem['primario']}, "
+              f"réplica={contagem['replica']})")
+    sys.exit(0 if all(ok for _, ok, _ in verificacoes) else 1)
+
+
+if __name__ == '__main__':
+    main()
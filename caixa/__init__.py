@@ -1,16 +1,29 @@
 from flask import Flask
-from caixa.config import Config
-from caixa.extensoes import db, migrate, login_manager
+from caixa.config import config_do_ambiente
+from caixa.banco import configurar_motores
+from caixa.dinheiro import ProvedorJson
+from caixa.extensoes import registro, db, migrate, login_manager, roteador_leitura, tempo_real, cache_relatorios, orcamento_consultas, metricas, catalogo
 
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    # Sem classe explícita: perfil de CAIXA_PERFIL (desenvolvimento/producao)
+    app.config.from_object(config_class or config_do_ambiente())
+    # Valores em dinheiro (Decimal) saem como número no JSON
+    app.json = ProvedorJson(app)
 
     # Inicializar extensões
+    registro.init_app(app)
     db.init_app(app)
+    configurar_motores(app)
+    roteador_leitura.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    tempo_real.init_app(app)
+    cache_relatorios.init_app(app)
+    orcamento_consultas.init_app(app)
+    metricas.init_app(app)
+    catalogo.init_app(app)
 
     from .models import User
     
@@ -49,5 +62,9 @@ def create_app(config_class=Config):
 
     from caixa.despesas import bp as despesas_bp
     app.register_blueprint(despesas_bp)
+
+    # Comandos de linha de comando (flask caixa ...)
+    from caixa.comandos import caixa_cli
+    app.cli.add_command(caixa_cli)
     
     return app
\ No newline at end of file
@@ -0,0 +1,361 @@
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import BigInteger, type_coerce
+
+from caixa.consolidacao import inicio_mes, proximo_mes, somar_totais, totais_resumo_mensais
+from caixa.dinheiro import reais
+from caixa.extensoes import db
+from caixa.models import Venda, ItemVenda, Pagamento, Despesa, SEM_CAIXA, agora_brasil
+from caixa.periodos import filtro_periodo, meses_do_periodo
+
+MANIFESTO = 'manifesto.json'
+VERSAO_SNAPSHOT = 1
+
+# tipo_pagamento guardado como código (-1 = outro/sem tipo)
+TIPOS_PAGAMENTO = {'vista': 0, 'prazo': 1}
+
+# Colunas exportadas de cada tabela, um .npy por coluna em <AAAA-MM>/<caixa_id>/.
+# dia = dia do mês; dinheiro em centavos, como no banco
+COLUNAS = {
+    'vendas': {'dia': np.int8, 'tipo': np.int8, 'valor_total': np.int64, 'valor_pago': np.int64,
+               'cliente_id': np.int32},
+    'itens_venda': {'dia': np.int8, 'produto_id': np.int32, 'quantidade': np.int32, 'subtotal': np.int64},
+    'pagamentos': {'dia': np.int8, 'valor': np.int64},
+    'despesas': {'dia': np.int8, 'valor': np.int64, 'categoria_id': np.int32},
+}
+
+# Manifesto e arrays abertos (mapeados em memória) neste processo; recarregados quando o manifesto muda
+_leitura = {'caminho': None, 'marca': None, 'manifesto': None, 'arrays': {}}
+_trava = threading.Lock()
+
+
+def _centavos(coluna):
+    """Dinheiro lido como os centavos guardados no banco, sem passar por Decimal"""
+    return type_coerce(coluna, BigInteger)
+
+
+def _diretorio():
+    return current_app.config.get('ANALITICO_DIRETORIO')
+
+
+# ========== EXPORTAÇÃO ==========
+
+def _consultas_mes(inicio, fim):
+    """(caixa, data, colunas de COLUNAS depois de dia...) de cada tabela no período"""
+    caixa_venda = db.func.coalesce(Venda.caixa_id, SEM_CAIXA)
+    return {
+        'vendas': db.select(
+            caixa_venda, Venda.data_venda, Venda.tipo_pagamento, _centavos(Venda.valor_total),
+            _centavos(db.func.coalesce(Venda.valor_pago, 0)), Venda.cliente_id
+        ).where(filtro_periodo(Venda.data_venda, inicio, fim)),
+        'itens_venda': db.select(
+            caixa_venda, Venda.data_venda, ItemVenda.produto_id, db.func.coalesce(ItemVenda.quantidade, 1),
+            _centavos(ItemVenda.subtotal)
+        ).join(Venda, ItemVenda.venda_id == Venda.id).where(filtro_periodo(Venda.data_venda, inicio, fim)),
+        'pagamentos': db.select(
+            caixa_venda, Pagamento.data_pagamento, _centavos(Pagamento.valor)
+        ).join(Venda, Pagamento.venda_id == Venda.id).where(filtro_periodo(Pagamento.data_pagamento, inicio, fim)),
+        'despesas': db.select(
+            db.func.coalesce(Despesa.caixa_id, SEM_CAIXA), Despesa.data_despesa, _centavos(Despesa.valor),
+            Despesa.categoria_id
+        ).where(Despesa.data_despesa >= inicio, Despesa.data_despesa <= fim),
+    }
+
+
+def _colunas(tabela, linhas):
+    """Linhas da consulta -> (caixa de cada linha, {coluna: array})"""
+    quantidade = len(linhas)
+    caixas = np.fromiter((linha[0] for linha in linhas), np.int32, quantidade)
+    colunas = {'dia': np.fromiter((linha[1].day for linha in linhas), np.int8, quantidade)}
+    for posicao, (coluna, tipo) in enumerate(list(COLUNAS[tabela].items())[1:], start=2):
+        if coluna == 'tipo':
+            valores = (TIPOS_PAGAMENTO.get(linha[posicao], -1) for linha in linhas)
+        else:
+            valores = (linha[posicao] for linha in linhas)
+        colunas[coluna] = np.fromiter(valores, tipo, quantidade)
+    return caixas, colunas
+
+
+def _exportar_mes(destino, inicio, fim):
+    """Grava as partições (uma pasta por caixa) de um mês em destino; devolve o resumo do mês"""
+    resumo = {'ate': fim.isoformat(), 'caixas': set()}
+    for tabela, consulta in _consultas_mes(inicio, fim).items():
+        linhas = db.session.execute(consulta).all()
+        resumo[tabela] = len(linhas)
+        if not linhas:
+            continue
+        caixas, colunas = _colunas(tabela, linhas)
+
+        # Agrupa as linhas por caixa: ordena pelo caixa e corta nos pontos em que ele muda
+        ordem = np.argsort(caixas, kind='stable')
+        caixas = caixas[ordem]
+        colunas = {coluna: valores[ordem] for coluna, valores in colunas.items()}
+        ids, inicios = np.unique(caixas, return_index=True)
+        for caixa_id, de, ate in zip(ids.tolist(), inicios, [*inicios[1:], len(caixas)]):
+            pasta = os.path.join(destino, str(caixa_id))
+            os.makedirs(pasta, exist_ok=True)
+            for coluna, valores in colunas.items():
+                np.save(os.path.join(pasta, f'{tabela}.{coluna}.npy'), valores[de:ate])
+            resumo['caixas'].add(caixa_id)
+
+    resumo['caixas'] = sorted(resumo['caixas'])
+    return resumo
+
+
+def _substituir(pasta, nova):
+    """Troca a pasta do mês pela recém-gravada (quem já tem os arquivos antigos abertos continua lendo)"""
+    antiga = pasta + '.antiga'
+    if os.path.exists(pasta):
+        os.rename(pasta, antiga)
+    os.rename(nova, pasta)
+    shutil.rmtree(antiga, ignore_errors=True)
+
+
+def _gravar_manifesto(diretorio, manifesto):
+    caminho = os.path.join(diretorio, MANIFESTO)
+    with open(caminho + '.novo', 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=1, sort_keys=True)
+    os.replace(caminho + '.novo', caminho)
+
+
+def ler_manifesto(diretorio):
+    caminho = os.path.join(diretorio, MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        manifesto = json.load(arquivo)
+    return manifesto if manifesto.get('versao') == VERSAO_SNAPSHOT else None
+
+
+def _primeiro_dia():
+    """Data do registro mais antigo entre vendas, pagamentos e despesas"""
+    datas = db.session.execute(db.select(
+        db.select(db.func.min(Venda.data_venda)).scalar_subquery(),
+        db.select(db.func.min(Pagamento.data_pagamento)).scalar_subquery(),
+        db.select(db.func.min(Despesa.data_despesa)).scalar_subquery(),
+    )).one()
+    dias = [valor.date() if isinstance(valor, datetime) else valor for valor in datas if valor is not None]
+    return min(dias) if dias else None
+
+
+def exportar_snapshot(desde=None, progresso=None):
+    """
+    Exporta os dias fechados (até ontem) de vendas, itens, pagamentos e
+    despesas para o snapshot colunar em ANALITICO_DIRETORIO.
+
+    Cada mês vira uma pasta com uma subpasta por caixa e um .npy por coluna,
+    gravada ao lado e trocada inteira, então leitores nunca veem um mês pela
+    metade. Sem desde (ou sem snapshot anterior), exporta todo o histórico;
+    com desde, refaz só os meses a partir dele, nunca deixando buraco depois
+    do último dia já exportado.
+    progresso(meses_exportados, total_meses) é chamado após cada mês.
+    """
+    diretorio = _diretorio()
+    os.makedirs(diretorio, exist_ok=True)
+    ontem = agora_brasil().date() - timedelta(days=1)
+    anterior = ler_manifesto(diretorio)
+
+    primeiro = _primeiro_dia()
+    if primeiro is None or primeiro > ontem:
+        return {'meses': 0, 'registros': 0, 'inicio': None, 'ate': None}
+
+    incremental = bool(anterior and desde)
+    inicio = primeiro
+    if incremental:
+        inicio = max(min(desde, date.fromisoformat(anterior['ate']) + timedelta(days=1)), primeiro)
+    meses = meses_do_periodo(inicio_mes(inicio), ontem)
+
+    manifesto = {
+        'versao': VERSAO_SNAPSHOT,
+        'inicio': inicio_mes(inicio).isoformat(),
+        'ate': ontem.isoformat(),
+        'gerado_em': agora_brasil().isoformat(timespec='seconds'),
+        'meses': {},
+    }
+    if incremental:
+        manifesto['inicio'] = min(manifesto['inicio'], anterior['inicio'])
+        manifesto['meses'] = dict(anterior['meses'])
+
+    registros = 0
+    for exportados, (mes_inicio, mes_fim) in enumerate(meses, start=1):
+        chave = mes_inicio.strftime('%Y-%m')
+        pasta = os.path.join(diretorio, chave)
+        # Restos de uma exportação interrompida
+        shutil.rmtree(pasta + '.novo', ignore_errors=True)
+        shutil.rmtree(pasta + '.antiga', ignore_errors=True)
+
+        resumo = _exportar_mes(pasta + '.novo', mes_inicio, mes_fim)
+        os.makedirs(pasta + '.novo', exist_ok=True)
+        _substituir(pasta, pasta + '.novo')
+        manifesto['meses'][chave] = resumo
+        registros += sum(resumo[tabela] for tabela in COLUNAS)
+        db.session.remove()
+        if progresso:
+            progresso(exportados, len(meses))
+
+    _gravar_manifesto(diretorio, manifesto)
+    return {'meses': len(meses), 'registros': registros, 'inicio': manifesto['inicio'], 'ate': manifesto['ate']}
+
+
+# ========== LEITURA ==========
+
+def _manifesto():
+    diretorio = _diretorio()
+    if not diretorio:
+        return None
+    caminho = os.path.join(diretorio, MANIFESTO)
+    try:
+        marca = os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _trava:
+        if (_leitura['caminho'], _leitura['marca']) != (caminho, marca):
+            _leitura.update(caminho=caminho, marca=marca, manifesto=ler_manifesto(diretorio), arrays={})
+        return _leitura['manifesto']
+
+
+def cobertura_snapshot():
+    """(primeiro, último) dia disponível no snapshot, ou None sem snapshot"""
+    manifesto = _manifesto()
+    if not manifesto:
+        return None
+    return date.fromisoformat(manifesto['inicio']), date.fromisoformat(manifesto['ate'])
+
+
+def _coluna(mes, caixa_id, tabela, coluna):
+    chave = (mes, caixa_id, tabela, coluna)
+    arrays = _leitura['arrays']
+    if chave not in arrays:
+        caminho = os.path.join(_diretorio(), mes, str(caixa_id), f'{tabela}.{coluna}.npy')
+        # asarray: ndarray comum sobre o mapeamento, sem o custo da subclasse memmap a cada operação
+        arrays[chave] = (np.asarray(np.load(caminho, mmap_mode='r')) if os.path.exists(caminho)
+                         else np.empty(0, COLUNAS[tabela][coluna]))
+    return arrays[chave]
+
+
+def _dividir(inicio, fim):
+    """
+    [inicio, fim] -> (parte coberta pelo snapshot ou None, [partes lidas do banco]).
+    Tudo que o snapshot não tem (hoje, dias depois da última exportação) vai ao banco.
+    """
+    cobertura = cobertura_snapshot()
+    if cobertura:
+        de, ate = max(inicio, cobertura[0]), min(fim, cobertura[1])
+        if de <= ate:
+            banco = [(i, f) for i, f in ((inicio, de - timedelta(days=1)), (ate + timedelta(days=1), fim)) if i <= f]
+            return (de, ate), banco
+    return None, [(inicio, fim)]
+
+
+def _particoes(inicio, fim):
+    """(1º dia do mês, 'AAAA-MM', caixa_id, dias) de cada partição no período; dias = None no mês inteiro"""
+    manifesto = _manifesto()
+    for de, ate in meses_do_periodo(inicio, fim):
+        mes = de.strftime('%Y-%m')
+        resumo = manifesto['meses'].get(mes)
+        if not resumo:
+            continue
+        inteiro = de.day == 1 and ate == proximo_mes(de) - timedelta(days=1)
+        for caixa_id in resumo['caixas']:
+            yield inicio_mes(de), mes, caixa_id, None if inteiro else (de.day, ate.day)
+
+
+def _filtrar(mes, caixa_id, dias, tabela, *colunas):
+    arrays = [_coluna(mes, caixa_id, tabela, coluna) for coluna in colunas]
+    if dias is None:
+        return arrays
+    dia = _coluna(mes, caixa_id, tabela, 'dia')
+    mascara = (dia >= dias[0]) & (dia <= dias[1])
+    return [array[mascara] for array in arrays]
+
+
+# Campos de dinheiro somados em centavos nos arrays e convertidos para reais no fim
+CAMPOS_DINHEIRO = ('total_vista', 'total_prazo', 'total_pago_vendas', 'total_recebimentos', 'total_despesas')
+
+
+def _totais_particao(mes, caixa_id, dias):
+    tipo, total, pago = _filtrar(mes, caixa_id, dias, 'vendas', 'tipo', 'valor_total', 'valor_pago')
+    recebido, = _filtrar(mes, caixa_id, dias, 'pagamentos', 'valor')
+    despesa, = _filtrar(mes, caixa_id, dias, 'despesas', 'valor')
+    # Agrupamento por tipo de pagamento (-1, vista, prazo) em uma passada; pesos em
+    # float64 são exatos para somas de centavos abaixo de 2**53
+    posicao = tipo.astype(np.intp) + 1
+    quantidades = np.bincount(posicao, minlength=3)
+    totais = np.bincount(posicao, weights=total, minlength=3)
+    vista, prazo = TIPOS_PAGAMENTO['vista'] + 1, TIPOS_PAGAMENTO['prazo'] + 1
+    return {
+        'quantidade_vista': int(quantidades[vista]),
+        'quantidade_prazo': int(quantidades[prazo]),
+        'total_vista': round(totais[vista]),
+        'total_prazo': round(totais[prazo]),
+        'total_pago_vendas': int(pago.sum()),
+        'total_recebimentos': int(recebido.sum()),
+        'total_despesas': int(despesa.sum()),
+    }
+
+
+def _somar_snapshot(inicio, fim, chave):
+    """Soma as partições do período agrupando por chave(mes_data, caixa_id), já em reais"""
+    totais = {}
+    for mes_data, mes, caixa_id, dias in _particoes(inicio, fim):
+        somar_totais(totais, {chave(mes_data, caixa_id): _totais_particao(mes, caixa_id, dias)})
+    for valores in totais.values():
+        for campo in CAMPOS_DINHEIRO:
+            valores[campo] = reais(valores[campo])
+    return totais
+
+
+def totais_por_mes(inicio, fim):
+    """
+    Como totais_resumo_mensais ({mes: {campo: valor}}), com os dias fechados
+    lidos do snapshot. É a foto da última exportação: pagamentos de vendas
+    antigas e despesas lançadas com data passada só entram na próxima, por
+    isso serve ao comparativo, não aos relatórios que precisam fechar com o caixa.
+    """
+    coberto, banco = _dividir(inicio, fim)
+    totais = _somar_snapshot(*coberto, lambda mes, caixa_id: mes) if coberto else {}
+    for de, ate in banco:
+        somar_totais(totais, totais_resumo_mensais(de, ate))
+    return totais
+
+
+def produtos_mais_vendidos(inicio, fim, limite=10):
+    """
+    Produtos de maior faturamento no período: [{'produto_id', 'quantidade', 'total'}].
+    No snapshot o agrupamento por produto é um bincount sobre os itens de
+    todas as partições; o resto do período é um GROUP BY no banco.
+    """
+    coberto, banco = _dividir(inicio, fim)
+    quantidades = {}
+    totais = {}
+    if coberto:
+        partes = [_filtrar(mes, caixa_id, dias, 'itens_venda', 'produto_id', 'quantidade', 'subtotal')
+                  for _, mes, caixa_id, dias in _particoes(*coberto)]
+        if partes:
+            produtos, quantidade, subtotal = (np.concatenate(coluna) for coluna in zip(*partes))
+            por_quantidade = np.bincount(produtos, weights=quantidade)
+            por_total = np.bincount(produtos, weights=subtotal)
+            for produto_id in np.flatnonzero(np.bincount(produtos)).tolist():
+                quantidades[produto_id] = int(por_quantidade[produto_id])
+                totais[produto_id] = int(round(por_total[produto_id]))
+
+    for de, ate in banco:
+        consulta = db.select(
+            ItemVenda.produto_id, db.func.sum(db.func.coalesce(ItemVenda.quantidade, 1)),
+            _centavos(db.func.sum(ItemVenda.subtotal))
+        ).join(Venda, ItemVenda.venda_id == Venda.id).where(
+            filtro_periodo(Venda.data_venda, de, ate)
+        ).group_by(ItemVenda.produto_id)
+        for produto_id, quantidade, total in db.session.execute(consulta):
+            quantidades[produto_id] = quantidades.get(produto_id, 0) + int(quantidade or 0)
+            totais[produto_id] = totais.get(produto_id, 0) + int(total or 0)
+
+    maiores = sorted(totais, key=lambda produto_id: (-totais[produto_id], produto_id))[:limite]
+    return [{'produto_id': produto_id, 'quantidade': quantidades[produto_id], 'total': reais(totais[produto_id])}
+            for produto_id in maiores]
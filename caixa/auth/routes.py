@@ -4,11 +4,14 @@ from caixa import db
 from caixa.auth import bp
 from caixa.auth.forms import LoginForm, RegisterCaixaForm
 from caixa.models import User, Caixa
+import logging
 import os
 import requests
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 
+log = logging.getLogger(__name__)
+
 
 # Configurações do Google OAuth
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
@@ -77,7 +80,7 @@ def login_callback():
         return redirect(url_for('main.index'))
         
     except Exception as e:
-        print(f"Erro na autenticação: {e}")
+        log.exception('Erro na autenticação')
         flash('Erro na autenticação exececional', 'danger')
         return redirect(url_for('auth.login'))
 
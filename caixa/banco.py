@@ -0,0 +1,32 @@
+from sqlalchemy import event
+
+from caixa.extensoes import db
+
+
+def configurar_motores(app):
+    """
+    Registra os PRAGMAs de SQLITE_PRAGMAS em cada engine SQLite da app
+    (principal e binds). Eles valem por conexão, por isso vão no evento
+    'connect' do pool e não numa execução avulsa na subida.
+    """
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if not pragmas:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _aplicador_pragmas(pragmas))
+
+
+def _aplicador_pragmas(pragmas):
+    comandos = [f'PRAGMA {nome}={valor}' for nome, valor in pragmas.items()]
+
+    def aplicar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for comando in comandos:
+                cursor.execute(comando)
+        finally:
+            cursor.close()
+
+    return aplicar
@@ -0,0 +1,181 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+
+LIMITE_BUSCA_PADRAO = 10
+LIMITE_BUSCA_MAXIMO = 50
+
+# Acima disso o filtro das listagens não usa IN (ids): o SQLite limita o número de parâmetros
+LIMITE_IDS_FILTRO = 5000
+
+_TOKEN = re.compile(r'[^\W_]+')
+_ACENTOS = re.compile('[\u0300-\u036f]')
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'João' -> 'joao'"""
+    texto = texto or ''
+    if not texto.isascii():
+        texto = _ACENTOS.sub('', unicodedata.normalize('NFKD', texto))
+    return texto.lower()
+
+
+def tokens(texto):
+    return _TOKEN.findall(normalizar(texto))
+
+
+class IndiceBusca:
+    """
+    Índice em memória para autocompletar: lista ordenada de (token, id) em
+    que cada termo digitado é procurado por prefixo com busca binária.
+    Uma linha casa quando todos os termos são prefixo de algum token dela.
+    """
+
+    def __init__(self, linhas):
+        textos = []
+        pares = []
+        for id_linha, texto in linhas:
+            normalizado = normalizar(texto)
+            textos.append((normalizado, id_linha))
+            pares.extend((token, id_linha) for token in set(_TOKEN.findall(normalizado)))
+        textos.sort()
+        pares.sort()
+        # Textos completos em ordem alfabética e a posição de cada id nessa ordem
+        self._textos = [texto for texto, _ in textos]
+        self._ids_textos = [id_linha for _, id_linha in textos]
+        self._ordem = {id_linha: posicao for posicao, id_linha in enumerate(self._ids_textos)}
+        self._tokens = [token for token, _ in pares]
+        self._ids = [id_linha for _, id_linha in pares]
+
+    def __len__(self):
+        return len(self._textos)
+
+    @staticmethod
+    def _faixa(lista, prefixo):
+        inicio = bisect_left(lista, prefixo)
+        return inicio, bisect_left(lista, prefixo + '\uffff', inicio)
+
+    def buscar(self, termo, limite=LIMITE_BUSCA_PADRAO):
+        """Ids das linhas que casam com o termo, melhores primeiro"""
+        termos = tokens(termo)
+        if not termos:
+            return []
+
+        # Começar pelo termo mais seletivo e filtrar pelos demais
+        faixas = sorted((self._faixa(self._tokens, t) for t in set(termos)), key=lambda f: f[1] - f[0])
+        inicio, fim = faixas[0]
+        encontrados = set(self._ids[inicio:fim])
+        for inicio, fim in faixas[1:]:
+            encontrados.intersection_update(self._ids[inicio:fim])
+            if not encontrados:
+                return []
+
+        # Quem começa com o termo digitado vem antes (já em ordem alfabética)
+        inicio, fim = self._faixa(self._textos, ' '.join(termos))
+        if limite is not None:
+            fim = min(fim, inicio + limite)
+        primeiros = [i for i in self._ids_textos[inicio:fim] if i in encontrados]
+        if limite is not None and len(primeiros) >= limite:
+            return primeiros
+
+        # Depois os demais, em ordem alfabética
+        encontrados.difference_update(primeiros)
+        if limite is None:
+            return primeiros + sorted(encontrados, key=self._ordem.__getitem__)
+        return primeiros + heapq.nsmallest(limite - len(primeiros), encontrados, key=self._ordem.__getitem__)
+
+
+def usa_trigrama():
+    """No PostgreSQL a busca usa os índices pg_trgm criados na migração"""
+    from caixa.extensoes import db
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _indice(nome, modelo, coluna):
+    from caixa.extensoes import catalogo, db
+
+    def carregar():
+        return IndiceBusca(db.session.execute(db.select(modelo.id, coluna)).all())
+
+    return catalogo.obter(nome, carregar)
+
+
+def _indice_clientes():
+    from caixa.models import Cliente
+    return _indice('busca_clientes', Cliente, Cliente.nome)
+
+
+def _indice_produtos():
+    from caixa.models import Produto
+    return _indice('busca_produtos', Produto, Produto.descricao)
+
+
+def _filtro_trigrama(coluna, termos):
+    from caixa.extensoes import db
+    expressao = db.func.f_unaccent(db.func.lower(coluna))
+    return db.and_(*(expressao.like(f'%{t}%') for t in termos))
+
+
+def filtro_busca(modelo, coluna, termo, indice):
+    """
+    Condição WHERE para filtrar as listagens pelo termo de busca.
+    PostgreSQL: substring sem acentos sobre o índice GIN de trigramas.
+    Outros bancos: ids vindos do índice em memória (prefixo de palavra).
+    """
+    from caixa.extensoes import db
+
+    termos = tokens(termo)
+    if not termos:
+        return modelo.id.in_([])
+    if usa_trigrama():
+        return _filtro_trigrama(coluna, termos)
+    ids = indice().buscar(termo, limite=LIMITE_IDS_FILTRO + 1)
+    if len(ids) > LIMITE_IDS_FILTRO:
+        # Termo muito genérico: LIKE simples (sem tratar acentos) em vez de uma lista enorme
+        return db.and_(*(coluna.like(f'%{t}%') for t in termos))
+    return modelo.id.in_(ids)
+
+
+def filtro_busca_clientes(termo):
+    from caixa.models import Cliente
+    return filtro_busca(Cliente, Cliente.nome, termo, _indice_clientes)
+
+
+def filtro_busca_produtos(termo):
+    from caixa.models import Produto
+    return filtro_busca(Produto, Produto.descricao, termo, _indice_produtos)
+
+
+def _buscar(modelo, coluna, termo, limite, indice):
+    from caixa.extensoes import db
+
+    termos = tokens(termo)
+    if not termos:
+        return []
+
+    if usa_trigrama():
+        consulta = ' '.join(termos)
+        expressao = db.func.f_unaccent(db.func.lower(coluna))
+        return modelo.query.filter(_filtro_trigrama(coluna, termos)).order_by(
+            expressao.startswith(consulta).desc(),
+            db.func.similarity(expressao, consulta).desc(),
+            coluna
+        ).limit(limite).all()
+
+    ids = indice().buscar(termo, limite=limite)
+    if not ids:
+        return []
+    # Dados atuais (saldo, estoque, preço) direto do banco, na ordem do índice
+    por_id = {obj.id: obj for obj in modelo.query.filter(modelo.id.in_(ids)).all()}
+    return [por_id[i] for i in ids if i in por_id]
+
+
+def buscar_clientes(termo, limite=LIMITE_BUSCA_PADRAO):
+    from caixa.models import Cliente
+    return _buscar(Cliente, Cliente.nome, termo, limite, _indice_clientes)
+
+
+def buscar_produtos(termo, limite=LIMITE_BUSCA_PADRAO):
+    from caixa.models import Produto
+    return _buscar(Produto, Produto.descricao, termo, limite, _indice_produtos)
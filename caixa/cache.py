@@ -0,0 +1,106 @@
+import threading
+from collections import Counter
+from cachetools import TTLCache
+
+
+class CacheRelatorios:
+    """
+    Cache LRU com TTL curto para os agregados de relatórios e painéis.
+
+    As chaves são (rota, caixa_id, data_inicio, data_fim). Os valores devem
+    ser dados simples (dicts, listas, números) e nunca objetos do ORM, que
+    ficariam desanexados da sessão na requisição seguinte.
+
+    O cache é por processo: as rotas de escrita invalidam o processo atual e
+    o TTL limita quanto tempo os outros workers podem mostrar valores antigos.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._cache = TTLCache(maxsize=512, ttl=30)
+        self._geracao = 0
+        self.ativo = True
+        self.acertos = Counter()
+        self.falhas = Counter()
+        self.invalidacoes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._cache = TTLCache(
+            maxsize=app.config.get('RELATORIOS_CACHE_TAMANHO', 512),
+            ttl=app.config.get('RELATORIOS_CACHE_TTL', 30)
+        )
+        self.ativo = app.config.get('RELATORIOS_CACHE_ATIVO', True)
+        app.extensions['cache_relatorios'] = self
+
+    def obter(self, rota, caixa_id, data_inicio, data_fim, calcular):
+        """
+        Devolve o valor em cache ou executa calcular() e guarda o resultado.
+        None não é guardado (valor ainda indisponível, p.ex. tarefa na fila).
+        """
+        if not self.ativo:
+            return calcular()
+
+        chave = (rota, caixa_id, data_inicio, data_fim)
+        with self._lock:
+            if chave in self._cache:
+                self.acertos[rota] += 1
+                return self._cache[chave]
+            self.falhas[rota] += 1
+            geracao = self._geracao
+
+        valor = calcular()
+
+        with self._lock:
+            # Não guardar se houve invalidação enquanto o valor era calculado
+            if valor is not None and geracao == self._geracao:
+                self._cache[chave] = valor
+        return valor
+
+    def invalidar(self, data=None, caixa_id=None, rotas=None):
+        """
+        Remove as entradas afetadas por uma escrita.
+
+        data: remove apenas entradas cujo período contém a data (None = todas).
+        caixa_id: remove as entradas desse caixa e as visões gerais (caixa None);
+        None remove de todos os caixas.
+        rotas: restringe a remoção a essas rotas.
+        """
+        with self._lock:
+            self._geracao += 1
+            self.invalidacoes += 1
+            for chave in list(self._cache.keys()):
+                rota, caixa_chave, inicio, fim = chave
+                if rotas and rota not in rotas:
+                    continue
+                if caixa_id and caixa_chave not in (None, caixa_id):
+                    continue
+                if data and not (inicio <= data <= fim):
+                    continue
+                self._cache.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self._cache.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            rotas = sorted(set(self.acertos) | set(self.falhas))
+            por_rota = {}
+            for rota in rotas:
+                total = self.acertos[rota] + self.falhas[rota]
+                por_rota[rota] = {
+                    'acertos': self.acertos[rota],
+                    'falhas': self.falhas[rota],
+                    'taxa_acerto': round(self.acertos[rota] / total, 3) if total else 0
+                }
+            return {
+                'ativo': self.ativo,
+                'tamanho': len(self._cache),
+                'tamanho_maximo': self._cache.maxsize,
+                'ttl': self._cache.ttl,
+                'invalidacoes': self.invalidacoes,
+                'rotas': por_rota
+            }
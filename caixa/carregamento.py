@@ -0,0 +1,68 @@
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+from caixa.models import (Venda, ItemVenda, Pagamento, Produto, FluxoCaixa,
+                          Despesa, CategoriaDespesa)
+
+# Perfis de carregamento antecipado por tela: cada um lista os relacionamentos
+# que o template acessa, para que sejam buscados junto (joinedload, muitos-para-um)
+# ou em uma consulta extra por relacionamento (selectinload, um-para-muitos),
+# em vez de uma consulta por linha.
+#
+# São funções porque os backrefs (Venda.cliente, Pagamento.venda...) só existem
+# depois que os mapeamentos são configurados.
+PERFIS = {
+    'venda_lista': lambda: (
+        joinedload(Venda.cliente),
+        joinedload(Venda.vendedor),
+        joinedload(Venda.caixa_local),
+    ),
+    'venda_detalhe': lambda: (
+        joinedload(Venda.cliente),
+        joinedload(Venda.vendedor),
+        joinedload(Venda.caixa_local),
+        selectinload(Venda.itens).joinedload(ItemVenda.produto),
+        selectinload(Venda.pagamentos).joinedload(Pagamento.recebedor),
+    ),
+    'venda_api': lambda: (
+        joinedload(Venda.cliente),
+        selectinload(Venda.itens).joinedload(ItemVenda.produto),
+    ),
+    'venda_pagamento': lambda: (
+        joinedload(Venda.cliente),
+        selectinload(Venda.pagamentos).joinedload(Pagamento.recebedor),
+    ),
+    'venda_cliente': lambda: (
+        joinedload(Venda.vendedor),
+        joinedload(Venda.caixa_local),
+    ),
+    'pagamento_relatorio': lambda: (
+        joinedload(Pagamento.venda).joinedload(Venda.cliente),
+        joinedload(Pagamento.recebedor),
+    ),
+    'fluxo_relatorio': lambda: (
+        joinedload(FluxoCaixa.caixa),
+    ),
+    'produto_detalhe': lambda: (
+        selectinload(Produto.itens_venda).joinedload(ItemVenda.venda).options(
+            joinedload(Venda.cliente),
+            joinedload(Venda.vendedor),
+        ),
+    ),
+    'despesa_lista': lambda: (
+        joinedload(Despesa.categoria),
+        joinedload(Despesa.usuario),
+    ),
+    'despesa_detalhe': lambda: (
+        joinedload(Despesa.categoria),
+        joinedload(Despesa.usuario),
+        joinedload(Despesa.caixa),
+    ),
+    'categoria_despesas': lambda: (
+        selectinload(CategoriaDespesa.despesas),
+    ),
+}
+
+
+def perfil(nome):
+    """Opções de carregamento do perfil, para usar em query.options(*perfil(nome))"""
+    configure_mappers()
+    return PERFIS[nome]()
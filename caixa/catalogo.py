@@ -0,0 +1,150 @@
+import hashlib
+import json
+import threading
+import time
+
+from caixa.dinheiro import para_json
+
+
+class CatalogoCache:
+    """
+    Cache versionado dos catálogos usados na tela de venda (clientes e
+    produtos): as opções dos selects e o catálogo JSON de produtos.
+
+    Cada catálogo tem um número de versão incrementado pelas rotas que
+    alteram produtos ou clientes; a próxima leitura recarrega do banco.
+    Como o cache é por processo, o TTL limita quanto tempo os outros workers
+    continuam servindo uma versão antiga. O ETag é o hash do conteúdo, então
+    é o mesmo em todos os workers enquanto o catálogo não muda.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._versoes = {}
+        self._entradas = {}
+        self._cargas = {}
+        self.ttl = 300
+        self.ativo = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CATALOGO_CACHE_TTL', 300)
+        self.ativo = app.config.get('CATALOGO_CACHE_ATIVO', True)
+        app.extensions['catalogo'] = self
+
+    def obter(self, nome, carregar):
+        """Devolve o catálogo em cache ou executa carregar() e guarda o resultado"""
+        if not self.ativo:
+            return carregar()
+
+        valor = self._valido(nome)
+        if valor is not None:
+            return valor
+
+        # Uma só carga por catálogo: as outras requisições esperam e reaproveitam
+        with self._lock:
+            carga = self._cargas.setdefault(nome, threading.Lock())
+        with carga:
+            valor = self._valido(nome)
+            if valor is not None:
+                return valor
+
+            with self._lock:
+                versao = self._versoes.get(nome, 0)
+            agora = time.monotonic()
+            valor = carregar()
+
+            with self._lock:
+                # Não guardar se o catálogo mudou enquanto era carregado
+                if self._versoes.get(nome, 0) == versao:
+                    self._entradas[nome] = (versao, agora, valor)
+            return valor
+
+    def _valido(self, nome):
+        with self._lock:
+            entrada = self._entradas.get(nome)
+            if (entrada and entrada[0] == self._versoes.get(nome, 0)
+                    and time.monotonic() - entrada[1] < self.ttl):
+                return entrada[2]
+        return None
+
+    def invalidar(self, *nomes):
+        """Incrementa a versão dos catálogos alterados por uma escrita"""
+        with self._lock:
+            for nome in nomes:
+                self._versoes[nome] = self._versoes.get(nome, 0) + 1
+                self._entradas.pop(nome, None)
+
+    def limpar(self):
+        with self._lock:
+            for nome in list(self._entradas):
+                self._versoes[nome] = self._versoes.get(nome, 0) + 1
+            self._entradas.clear()
+
+
+def _carregar_opcoes_clientes():
+    from caixa.extensoes import db
+    from caixa.models import Cliente
+
+    linhas = db.session.execute(
+        db.select(Cliente.id, Cliente.nome).order_by(Cliente.nome)
+    ).all()
+    return [(id_cliente, nome) for id_cliente, nome in linhas]
+
+
+def _carregar_opcoes_produtos():
+    from caixa.extensoes import db
+    from caixa.models import Produto
+
+    linhas = db.session.execute(
+        db.select(Produto.id, Produto.descricao, Produto.preco).order_by(Produto.id)
+    ).all()
+    return [(id_produto, f"{descricao} - R$ {preco:.2f}") for id_produto, descricao, preco in linhas]
+
+
+def _carregar_catalogo_produtos():
+    from caixa.extensoes import db
+    from caixa.models import Produto
+
+    linhas = db.session.execute(
+        db.select(Produto.id, Produto.descricao, Produto.preco, Produto.tipo, Produto.estoque)
+        .order_by(Produto.id)
+    ).all()
+    corpo = json.dumps([{
+        'id': id_produto,
+        'descricao': descricao,
+        'preco': preco,
+        'tipo': tipo,
+        'estoque': estoque
+    } for id_produto, descricao, preco, tipo, estoque in linhas], ensure_ascii=False, default=para_json)
+    etag = hashlib.sha1(corpo.encode('utf-8')).hexdigest()
+    return corpo, etag
+
+
+def opcoes_clientes():
+    """Lista (id, nome) de todos os clientes para o select da venda"""
+    from caixa.extensoes import catalogo
+    return catalogo.obter('clientes', _carregar_opcoes_clientes)
+
+
+def opcoes_produtos():
+    """Lista (id, rótulo) de todos os produtos para os selects dos itens"""
+    from caixa.extensoes import catalogo
+    return catalogo.obter('produtos', _carregar_opcoes_produtos)
+
+
+def catalogo_produtos():
+    """Catálogo de produtos já serializado em JSON e o seu ETag"""
+    from caixa.extensoes import catalogo
+    return catalogo.obter('produtos_json', _carregar_catalogo_produtos)
+
+
+def invalidar_produtos():
+    from caixa.extensoes import catalogo
+    catalogo.invalidar('produtos', 'produtos_json', 'busca_produtos')
+
+
+def invalidar_clientes():
+    from caixa.extensoes import catalogo
+    catalogo.invalidar('clientes', 'busca_clientes')
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, SelectField, TextAreaField, SubmitField
+from wtforms import StringField, SelectField, TextAreaField, SubmitField
 from wtforms.validators import DataRequired, Email, Optional, NumberRange
+from caixa.dinheiro import CampoDinheiro
 
 class ClienteForm(FlaskForm):
     nome = StringField('Nome', validators=[DataRequired()])
@@ -9,7 +10,7 @@ class ClienteForm(FlaskForm):
     tipo_pagamento = SelectField('Tipo de Pagamento', 
                                 choices=[('vista', 'À Vista'), ('prazo', 'A Prazo')],
                                 validators=[DataRequired()])
-    limite_credito = FloatField('Limite de Crédito', default=100000.00, 
+    limite_credito = CampoDinheiro('Limite de Crédito', default=100000.00, 
                                validators=[NumberRange(min=0)])
     observacoes = TextAreaField('Observações')
     submit = SubmitField('Salvar')
\ No newline at end of file
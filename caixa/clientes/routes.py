@@ -3,19 +3,67 @@ from flask_login import login_required
 from caixa import db
 from caixa.clientes import bp
 from caixa.clientes.forms import ClienteForm
-from caixa.models import Cliente, Venda
+from caixa.models import Cliente, Venda, LancamentoCliente
 from caixa.decoradores import caixa_required
+from caixa.carregamento import perfil
+from caixa.extensoes import cache_relatorios
+from caixa.catalogo import invalidar_clientes
+from caixa.paginacao import paginar_cursor, usar_cursor, chave_contagem, dados_pagina
+from caixa.busca import buscar_clientes, filtro_busca_clientes, LIMITE_BUSCA_PADRAO, LIMITE_BUSCA_MAXIMO
+
+POR_PAGINA_CLIENTES = 10
+POR_PAGINA_EXTRATO = 20
+
+# Vendas mais recentes exibidas no detalhe (o restante fica no extrato)
+VENDAS_DETALHE = 20
+
+
+def paginar_clientes(query, contagem):
+    """Ordem alfabética: por cursor (nome, id) ou, com ?page=, numerada"""
+    if usar_cursor():
+        return paginar_cursor(query, [Cliente.nome, Cliente.id], lambda c: (c.nome, c.id),
+                              POR_PAGINA_CLIENTES, contagem=contagem)
+    page = request.args.get('page', 1, type=int)
+    return query.order_by(Cliente.nome, Cliente.id).paginate(
+        page=page, per_page=POR_PAGINA_CLIENTES, error_out=False
+    )
+
 
 @bp.route('/')
 @login_required
 @caixa_required
 def lista_clientes():
-    page = request.args.get('page', 1, type=int)
-    clientes = Cliente.query.order_by(Cliente.nome).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    busca = request.args.get('busca', '')
+    
+    query = Cliente.query
+    if busca:
+        query = query.filter(filtro_busca_clientes(busca))
+    
+    clientes = paginar_clientes(query, chave_contagem('clientes', busca=busca))
     return render_template('clientes/lista.html', clientes=clientes)
 
+
+@bp.route('/api/listagem')
+@login_required
+def api_listagem_clientes():
+    """API paginada por cursor (?apos=/?antes=, ?busca=); ?total=1 inclui o total"""
+    busca = request.args.get('busca', '')
+    query = Cliente.query
+    if busca:
+        query = query.filter(filtro_busca_clientes(busca))
+    contagem = chave_contagem('clientes', busca=busca) if request.args.get('total', type=int) else None
+    clientes = paginar_cursor(query, [Cliente.nome, Cliente.id], lambda c: (c.nome, c.id),
+                              POR_PAGINA_CLIENTES, contagem=contagem)
+    return jsonify(dados_pagina(clientes, lambda c: {
+        'id': c.id,
+        'nome': c.nome,
+        'telefone': c.telefone,
+        'email': c.email,
+        'tipo_pagamento': c.tipo_pagamento,
+        'limite': c.limite_credito,
+        'saldo': c.saldo_devedor
+    }))
+
 @bp.route('/novo', methods=['GET', 'POST'])
 @login_required
 @caixa_required
@@ -32,6 +80,7 @@ def novo_cliente():
         )
         db.session.add(cliente)
         db.session.commit()
+        invalidar_clientes()
         flash(f'Cliente {cliente.nome} cadastrado com sucesso!', 'success')
         return redirect(url_for('clientes.lista_clientes'))
     
@@ -42,17 +91,20 @@ def novo_cliente():
 @caixa_required
 def detalhe_cliente(id):
     cliente = Cliente.query.get_or_404(id)
-    vendas = Venda.query.filter_by(cliente_id=id).order_by(Venda.data_venda.desc()).all()
-    
-    # Calcular totais
-    total_compras = sum(v.valor_total for v in vendas)
-    total_pago = sum(v.valor_pago for v in vendas)
+    # Totais vêm das colunas mantidas pelo extrato: o custo não cresce com o histórico
+    vendas = Venda.query.options(*perfil('venda_cliente')).filter_by(cliente_id=id).order_by(
+        Venda.data_venda.desc(), Venda.id.desc()
+    ).limit(VENDAS_DETALHE).all()
+    lancamentos = LancamentoCliente.query.filter_by(cliente_id=id).order_by(
+        LancamentoCliente.id.desc()
+    ).limit(POR_PAGINA_EXTRATO).all()
     
     context = {
         'cliente': cliente,
         'vendas': vendas,
-        'total_compras': total_compras,
-        'total_pago': total_pago
+        'lancamentos': lancamentos,
+        'total_compras': cliente.total_compras,
+        'total_pago': cliente.total_pago
     }
     
     return render_template('clientes/detalhe.html', **context)
@@ -73,21 +125,59 @@ def editar_cliente(id):
         cliente.observacoes = form.observacoes.data
         
         db.session.commit()
+        # Nome e limite aparecem nos relatórios em cache
+        cache_relatorios.invalidar()
+        invalidar_clientes()
         flash('Cliente atualizado com sucesso!', 'success')
         return redirect(url_for('clientes.detalhe_cliente', id=id))
     
     return render_template('clientes/novo.html', form=form, cliente=cliente)
 
+@bp.route('/api/buscar')
+@login_required
+def api_buscar_clientes():
+    """API de autocompletar: clientes cujo nome casa com ?q= (sem acentos, por prefixo)"""
+    termo = request.args.get('q', '')
+    limite = max(1, min(request.args.get('limite', LIMITE_BUSCA_PADRAO, type=int), LIMITE_BUSCA_MAXIMO))
+    return jsonify([{
+        'id': c.id,
+        'nome': c.nome,
+        'telefone': c.telefone,
+        'tipo_pagamento': c.tipo_pagamento,
+        'limite': c.limite_credito,
+        'saldo': c.saldo_devedor
+    } for c in buscar_clientes(termo, limite=limite)])
+
 @bp.route('/api/cliente/<int:id>/info')
 @login_required
 def cliente_info_api(id):
     """API para retornar informações do cliente em JSON"""
     cliente = Cliente.query.get_or_404(id)
-    lista = []
     return jsonify({
         'username': cliente.nome,
         'limite': cliente.limite_credito,
         'saldo': cliente.saldo_devedor,
         'disponivel': cliente.limite_credito - cliente.saldo_devedor,
-        'vendas': [venda.data_venda for venda in cliente.vendas]
-    })
\ No newline at end of file
+        'quantidade_compras': cliente.quantidade_compras,
+        'total_compras': cliente.total_compras,
+        'total_pago': cliente.total_pago,
+        'ultima_compra': cliente.ultima_compra.isoformat() if cliente.ultima_compra else None
+    })
+
+@bp.route('/api/cliente/<int:id>/extrato')
+@login_required
+def api_extrato_cliente(id):
+    """Extrato do cliente paginado por cursor (?apos=/?antes=), mais recentes primeiro"""
+    Cliente.query.get_or_404(id)
+    query = LancamentoCliente.query.filter_by(cliente_id=id)
+    lancamentos = paginar_cursor(query, [LancamentoCliente.id], lambda l: (l.id,),
+                                 POR_PAGINA_EXTRATO, descendente=True)
+    return jsonify(dados_pagina(lancamentos, lambda l: {
+        'id': l.id,
+        'data': l.data.isoformat(),
+        'tipo': l.tipo,
+        'valor': l.valor,
+        'saldo': l.saldo,
+        'venda_id': l.venda_id,
+        'descricao': l.descricao
+    }))
@@ -0,0 +1,190 @@
+import os
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import AppGroup
+from caixa.fluxo import recalcular_fluxo_em_lote
+from caixa.consolidacao import reconstruir_resumos
+from caixa.extrato import TAMANHO_LOTE_EXTRATO, reconstruir_extratos
+from caixa.tarefas import executar_trabalhadores
+from caixa.analitico import exportar_snapshot
+from caixa.importacao import (TAMANHO_LOTE_IMPORTACAO, Rejeitados, importar_clientes,
+                              importar_produtos, importar_vendas)
+
+caixa_cli = AppGroup('caixa', help='Comandos de manutenção do sistema de caixa.')
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+@caixa_cli.command('recalcular-fluxo')
+@click.option('--inicio', required=True, help='Data inicial (AAAA-MM-DD).')
+@click.option('--fim', required=True, help='Data final (AAAA-MM-DD).')
+@click.option('--caixa', 'caixa_id', type=int, default=None, help='Recalcular apenas este caixa.')
+@click.option('--dias-por-janela', type=int, default=31, show_default=True,
+              help='Dias gravados por transação.')
+def recalcular_fluxo(inicio, fim, caixa_id, dias_por_janela):
+    """Recalcula o fluxo de caixa de um período em lote.
+
+    Cada janela é confirmada separadamente: se o comando for interrompido,
+    basta rodar de novo a partir da última data exibida.
+    """
+    inicio, fim = _data(inicio), _data(fim)
+
+    def progresso(processados, total):
+        click.echo(f'{processados}/{total} dias recalculados')
+
+    resultado = recalcular_fluxo_em_lote(inicio, fim, caixa_id=caixa_id,
+                                         dias_por_janela=dias_por_janela,
+                                         progresso=progresso)
+    click.echo(f"Concluído: {resultado['registros']} registros de fluxo gravados.")
+
+
+@caixa_cli.command('reconstruir-resumos')
+@click.option('--inicio', required=True, help='Data inicial (AAAA-MM-DD); o mês inteiro é refeito.')
+@click.option('--fim', required=True, help='Data final (AAAA-MM-DD); o mês inteiro é refeito.')
+def reconstruir_resumos_cmd(inicio, fim):
+    """Reconstrói os resumos diários e mensais usados no relatório geral.
+
+    Cada mês é confirmado separadamente: se o comando for interrompido,
+    basta rodar de novo a partir do último mês exibido.
+    """
+    inicio, fim = _data(inicio), _data(fim)
+
+    def progresso(processados, total):
+        click.echo(f'{processados}/{total} meses reconstruídos')
+
+    resultado = reconstruir_resumos(inicio, fim, progresso=progresso)
+    click.echo(f"Concluído: {resultado['registros']} registros de resumo gravados.")
+
+
+@caixa_cli.command('reconstruir-extratos')
+@click.option('--cliente', 'clientes', type=int, multiple=True, help='Reconstruir apenas este cliente (repetível).')
+@click.option('--manter-saldos', is_flag=True,
+              help='Preservar o saldo_devedor atual com um lançamento de saldo anterior.')
+@click.option('--lote', type=int, default=TAMANHO_LOTE_EXTRATO, show_default=True,
+              help='Clientes gravados por transação.')
+def reconstruir_extratos_cmd(clientes, manter_saldos, lote):
+    """Reconstrói o extrato, o saldo devedor e os totais de compras dos clientes.
+
+    Os lançamentos são refeitos a partir das vendas e pagamentos; cada lote
+    de clientes é confirmado separadamente.
+    """
+    def progresso(processados, total):
+        click.echo(f'{processados}/{total} clientes reconstruídos')
+
+    resultado = reconstruir_extratos(list(clientes) or None, manter_saldo=manter_saldos,
+                                     tamanho_lote=lote, progresso=progresso)
+    click.echo(f"Concluído: {resultado['registros']} lançamentos gravados.")
+
+
+@caixa_cli.command('worker')
+@click.option('--processos', type=int, default=None,
+              help='Processos trabalhadores (padrão: TAREFAS_PROCESSOS; 0 = um por CPU).')
+@click.option('--intervalo', type=float, default=None,
+              help='Segundos de espera com a fila vazia (padrão: TAREFAS_INTERVALO).')
+@click.option('--uma-vez', is_flag=True, help='Executar as tarefas pendentes e sair.')
+def worker(processos, intervalo, uma_vez):
+    """Executa as tarefas em segundo plano (recálculos e relatórios pesados).
+
+    Cada processo pega uma tarefa por vez da tabela de tarefas; SIGTERM ou
+    CTRL+C encerram depois da tarefa em andamento.
+    """
+    if processos is None:
+        processos = current_app.config.get('TAREFAS_PROCESSOS', 0)
+    processos = processos or os.cpu_count() or 1
+    if intervalo is None:
+        intervalo = current_app.config.get('TAREFAS_INTERVALO', 1.0)
+
+    click.echo(f'Worker com {processos} processo(s); CTRL+C para parar.')
+    executar_trabalhadores(current_app._get_current_object(), processos=processos,
+                           intervalo=intervalo, uma_vez=uma_vez)
+
+
+@caixa_cli.command('snapshot')
+@click.option('--desde', default=None,
+              help='Refazer só a partir deste mês (AAAA-MM-DD); padrão: todo o histórico.')
+def snapshot(desde):
+    """Exporta os dias fechados para o snapshot colunar dos relatórios.
+
+    Rodar toda noite (agendador/cron), depois da meia-noite. Sem --desde o
+    histórico inteiro é regravado, o que também atualiza o valor pago de
+    vendas antigas que receberam pagamentos desde a última exportação.
+    """
+    if not current_app.config.get('ANALITICO_DIRETORIO'):
+        raise click.ClickException('Defina ANALITICO_DIRETORIO para gerar o snapshot.')
+
+    def progresso(exportados, total):
+        click.echo(f'{exportados}/{total} meses exportados')
+
+    resultado = exportar_snapshot(_data(desde) if desde else None, progresso=progresso)
+    click.echo(f"Concluído: {resultado['registros']} registros, de {resultado['inicio']} a {resultado['ate']}.")
+
+
+importar_cli = AppGroup('importar', help='Importação em lote de arquivos CSV ou JSON Lines.')
+caixa_cli.add_command(importar_cli)
+
+
+def _opcoes_importacao(comando):
+    comando = click.option('--lote', type=int, default=TAMANHO_LOTE_IMPORTACAO, show_default=True,
+                           help='Linhas gravadas por transação.')(comando)
+    comando = click.option('--rejeitados', default=None,
+                           help='Arquivo JSONL das linhas rejeitadas (padrão: ARQUIVO.rejeitados.jsonl).')(comando)
+    return click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))(comando)
+
+
+def _executar_importacao(importar, arquivo, rejeitados, lote, **opcoes):
+    caminho_rejeitados = rejeitados or f'{arquivo}.rejeitados.jsonl'
+
+    def progresso(importados):
+        click.echo(f'{importados} registros gravados')
+
+    with Rejeitados(caminho_rejeitados) as arquivo_rejeitados:
+        resultado = importar(arquivo, arquivo_rejeitados, tamanho_lote=lote, progresso=progresso, **opcoes)
+
+    click.echo(f"Concluído: {resultado['importados']} de {resultado['lidos']} importados.")
+    if resultado['rejeitados']:
+        click.echo(f"{resultado['rejeitados']} linhas rejeitadas em {caminho_rejeitados}")
+    return resultado
+
+
+@importar_cli.command('clientes')
+@_opcoes_importacao
+def importar_clientes_cmd(arquivo, rejeitados, lote):
+    """Importa clientes (nome, telefone, email, tipo_pagamento, limite_credito, saldo_devedor, id opcional)."""
+    _executar_importacao(importar_clientes, arquivo, rejeitados, lote)
+
+
+@importar_cli.command('produtos')
+@_opcoes_importacao
+def importar_produtos_cmd(arquivo, rejeitados, lote):
+    """Importa produtos (tipo, descricao, preco, estoque, id opcional)."""
+    _executar_importacao(importar_produtos, arquivo, rejeitados, lote)
+
+
+@importar_cli.command('vendas')
+@_opcoes_importacao
+@click.option('--saldos/--sem-saldos', default=True, show_default=True,
+              help='Somar o valor em aberto das vendas ao saldo devedor dos clientes '
+                   '(--sem-saldos mantém o saldo vindo do arquivo de clientes).')
+def importar_vendas_cmd(arquivo, rejeitados, lote, saldos):
+    """Importa vendas históricas com itens e pagamentos.
+
+    Aceita o formato da exportação: CSV com uma linha por item (linhas
+    seguidas com o mesmo id formam uma venda) ou JSONL com a lista 'itens'.
+    O estoque não é alterado. No fim, o fluxo de caixa e os resumos do
+    período importado são recalculados de uma vez.
+    """
+    resultado = _executar_importacao(importar_vendas, arquivo, rejeitados, lote, atualizar_saldos=saldos)
+    if not resultado['importados']:
+        return
+
+    inicio, fim = resultado['inicio'], resultado['fim']
+    click.echo(f'Recalculando fluxo de caixa e resumos de {inicio} a {fim}...')
+    fluxo = recalcular_fluxo_em_lote(inicio, fim)
+    resumos = reconstruir_resumos(inicio, fim)
+    click.echo(f"{fluxo['registros']} registros de fluxo e {resumos['registros']} de resumo gravados.")
+    if current_app.config.get('ANALITICO_DIRETORIO'):
+        click.echo('Atualizando o snapshot colunar...')
+        exportar_snapshot(inicio)
@@ -1,15 +1,204 @@
 import os
 from dotenv import load_dotenv
+from caixa.registro import ler_niveis
 
 load_dotenv()
 
+
+def url_banco(url):
+    """Heroku e afins ainda entregam postgres://, que o SQLAlchemy 2 não aceita"""
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def opcoes_motor(url, pool_tamanho=5, pool_excedente=5):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS adequadas ao banco da URL.
+
+    Postgres: pool dimensionado para os workers gthread (uma conexão por
+    thread mais folga), pre_ping para sobreviver a conexões derrubadas pelo
+    servidor/PgBouncer, reciclagem periódica e statement_timeout para que
+    uma consulta presa não segure a thread até o timeout do gunicorn.
+    SQLite: o pool padrão já serve; os ajustes vão por PRAGMA (SQLITE_PRAGMAS).
+    """
+    if not url or not url.startswith('postgresql'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_TAMANHO', pool_tamanho)),
+        'max_overflow': int(os.environ.get('DB_POOL_EXCEDENTE', pool_excedente)),
+        'pool_timeout': int(os.environ.get('DB_POOL_ESPERA', '10')),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECICLAR', '1800')),
+        'pool_pre_ping': True,
+        'connect_args': {
+            'application_name': 'caixa',
+            'connect_timeout': 5,
+            'options': f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '30000'))}",
+        },
+    }
+
+
+def binds_leitura(url_leitura, **opcoes):
+    """Bind 'leitura' (réplica) quando DATABASE_URL_LEITURA estiver definida"""
+    url_leitura = url_banco(url_leitura)
+    if not url_leitura:
+        return {}
+    return {'leitura': {'url': url_leitura, **opcoes_motor(url_leitura, **opcoes)}}
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'chave-secreta-padrao'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///caixa.db'
+    SQLALCHEMY_DATABASE_URI = url_banco(os.environ.get('DATABASE_URL')) or 'sqlite:///caixa.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = opcoes_motor(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = binds_leitura(os.environ.get('DATABASE_URL_LEITURA'))
+
+    # Réplica de leitura (só com DATABASE_URL_LEITURA): endpoints somente leitura cujos
+    # SELECTs vão para o bind 'leitura'; depois de uma escrita o usuário fica no primário
+    # por LEITURA_JANELA_POS_ESCRITA segundos para ver o que acabou de gravar
+    LEITURA_ROTAS = [
+        'relatorios.*',
+        'despesas.resumo_diario', 'despesas.faturamento_diario',
+        'vendas.vendas_ativas', 'vendas.todas_vendas', 'vendas.api_listagem_vendas',
+        'clientes.lista_clientes', 'clientes.api_listagem_clientes', 'clientes.api_extrato_cliente',
+        'produtos.lista_produtos', 'produtos.api_listagem_produtos',
+        'despesas.lista_despesas', 'despesas.api_listagem_despesas',
+    ]
+    LEITURA_JANELA_POS_ESCRITA = int(os.environ.get('LEITURA_JANELA_POS_ESCRITA', '10'))
+
+    # PRAGMAs aplicados a cada conexão SQLite nova (banco principal e réplica).
+    # WAL deixa leituras (relatórios) rodarem junto com a escrita de uma venda;
+    # synchronous=NORMAL é seguro com WAL (perde no máximo a última transação numa
+    # queda de energia, sem corromper); busy_timeout espera o lock em vez de falhar
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+        'cache_size': -20000,  # ~20 MB por conexão
+        'temp_store': 'MEMORY',
+    }
+
+    # Fluxo de caixa: aplicar deltas a cada venda/pagamento (True) ou recalcular o dia inteiro (False)
+    FLUXO_CAIXA_INCREMENTAL = os.environ.get('FLUXO_CAIXA_INCREMENTAL', 'True').lower() == 'true'
+
+    # Recálculo em lote: parar antes do timeout do gunicorn (120s) e devolver de onde retomar
+    FLUXO_RECALCULO_LIMITE_SEGUNDOS = int(os.environ.get('FLUXO_RECALCULO_LIMITE_SEGUNDOS', '90'))
+
+    # Tarefas em segundo plano (caixa/tarefas.py): recálculos do fluxo e relatório geral de
+    # períodos longos vão para a fila do banco e rodam no `flask caixa worker`, fora do
+    # timeout do gunicorn. False executa na própria requisição (sem worker rodando)
+    TAREFAS_ASSINCRONAS = os.environ.get('TAREFAS_ASSINCRONAS', 'True').lower() == 'true'
+    TAREFAS_PROCESSOS = int(os.environ.get('TAREFAS_PROCESSOS', '0'))  # 0 = um por CPU
+    TAREFAS_INTERVALO = float(os.environ.get('TAREFAS_INTERVALO', '1'))  # espera com a fila vazia (s)
+    # Relatório geral com mais dias que isto é gerado pelo worker; os mais curtos saem dos resumos na hora
+    TAREFAS_RELATORIO_GERAL_DIAS = int(os.environ.get('TAREFAS_RELATORIO_GERAL_DIAS', '92'))
+    # Resultado de relatório reaproveitado por pedidos iguais (pode mostrar vendas de alguns minutos atrás)
+    TAREFAS_RESULTADO_TTL = int(os.environ.get('TAREFAS_RESULTADO_TTL', '300'))
+    # Tarefa em execução sem progresso por este tempo volta para a fila (worker derrubado)
+    TAREFAS_TEMPO_LIMITE = int(os.environ.get('TAREFAS_TEMPO_LIMITE', '1800'))
+    TAREFAS_MAX_TENTATIVAS = int(os.environ.get('TAREFAS_MAX_TENTATIVAS', '3'))
+    TAREFAS_RETENCAO_DIAS = int(os.environ.get('TAREFAS_RETENCAO_DIAS', '7'))
+
+    # Painel em tempo real (Server-Sent Events)
+    # Com vários workers do gunicorn, aponte para um arquivo SQLite compartilhado
+    # (ex.: /tmp/caixa-eventos.db); vazio = eventos apenas dentro do processo
+    TEMPO_REAL_BROKER = os.environ.get('TEMPO_REAL_BROKER', '')
+    TEMPO_REAL_DURACAO_CONEXAO = int(os.environ.get('TEMPO_REAL_DURACAO_CONEXAO', '300'))
+    TEMPO_REAL_KEEPALIVE = 15
+    # Cada aba com o stream aberto ocupa uma thread do gunicorn enquanto a conexão durar.
+    # Só estas páginas abrem o stream (painel, relatórios e o saldo na ficha do cliente; as
+    # outras atualizam por polling a cada 30s) e cada processo aceita até
+    # TEMPO_REAL_MAX_CONEXOES, o que deixa threads livres para vendas:
+    # com o Procfile (WEB_CONCURRENCY=2 workers x 8 threads) são 2 x 4 = 8 abas ao vivo;
+    # além disso as abas excedentes passam ao polling. Mantenha abaixo de --threads.
+    # Com mais de um worker, defina TEMPO_REAL_BROKER para os eventos chegarem a todos
+    TEMPO_REAL_ROTAS = ['main.index', 'relatorios.*', 'clientes.detalhe_cliente']
+    TEMPO_REAL_MAX_CONEXOES = int(os.environ.get('TEMPO_REAL_MAX_CONEXOES', '4'))
+
+    # Cache dos agregados de relatórios/painéis (por processo, LRU + TTL em segundos)
+    RELATORIOS_CACHE_ATIVO = os.environ.get('RELATORIOS_CACHE_ATIVO', 'True').lower() == 'true'
+    RELATORIOS_CACHE_TAMANHO = int(os.environ.get('RELATORIOS_CACHE_TAMANHO', '512'))
+    RELATORIOS_CACHE_TTL = int(os.environ.get('RELATORIOS_CACHE_TTL', '30'))
+    # Relatório geral de período longo e reconstruções (worker/CLI) calculados por mês em
+    # processos paralelos (caixa/paralelo.py); 0 = um por CPU, 1 = em série.
+    # No worker os TAREFAS_PROCESSOS trabalhadores repartem este total (cada tarefa usa
+    # RELATORIOS_PROCESSOS / TAREFAS_PROCESSOS, no mínimo 1): com os dois em 0 numa máquina
+    # de N núcleos são N trabalhadores com tarefas em série, não N x N processos e conexões
+    RELATORIOS_PROCESSOS = int(os.environ.get('RELATORIOS_PROCESSOS', '0'))
+    # Snapshot colunar do histórico (caixa/analitico.py), gerado toda noite por `flask caixa snapshot`:
+    # os totais de dias já exportados saem dos arquivos e só o resto (hoje) vai ao banco.
+    # Vazio desliga; com vários servidores precisa ser um diretório compartilhado
+    ANALITICO_DIRETORIO = os.environ.get('ANALITICO_DIRETORIO', '')
+
+    # Cache dos catálogos da tela de venda (clientes e produtos), por processo.
+    # Escritas invalidam o processo atual; o TTL limita a defasagem nos demais workers
+    CATALOGO_CACHE_ATIVO = os.environ.get('CATALOGO_CACHE_ATIVO', 'True').lower() == 'true'
+    CATALOGO_CACHE_TTL = int(os.environ.get('CATALOGO_CACHE_TTL', '300'))
+
+    # Listagens paginadas por cursor (keyset); ?page=N ainda usa a paginação numerada.
+    # O total exibido vem de um COUNT guardado por alguns segundos
+    PAGINACAO_CURSOR = os.environ.get('PAGINACAO_CURSOR', 'True').lower() == 'true'
+    PAGINACAO_CONTAGEM_TTL = int(os.environ.get('PAGINACAO_CONTAGEM_TTL', '60'))
+
+    # Orçamento de comandos SQL por requisição (pega regressões N+1).
+    # Com TESTING=True a requisição falha ao estourar; em produção só gera aviso no log.
+    SQL_ORCAMENTO_CONSULTAS = int(os.environ.get('SQL_ORCAMENTO_CONSULTAS', '25'))
+    # A primeira venda do mês cria os registros de fluxo/resumo (INSERT em savepoint).
+    # None isenta: os recálculos do fluxo, com TAREFAS_ASSINCRONAS=False, rodam na própria
+    # requisição com alguns comandos por lote de dias, proporcionais ao período pedido
+    SQL_ORCAMENTO_POR_ROTA = {
+        'vendas.nova_venda': 30,
+        'vendas.recalcular_fluxo_periodo': None,
+        'vendas.recalcular_fluxo_data': None,
+    }
+
+    # Métricas por requisição: cabeçalho Server-Timing, histogramas em /admin/metrics
+    # e log (JSON) das requisições acima de REQUISICAO_LENTA_MS com os N comandos SQL mais lentos
+    METRICAS_ATIVAS = os.environ.get('METRICAS_ATIVAS', 'True').lower() == 'true'
+    SERVER_TIMING_ATIVO = os.environ.get('SERVER_TIMING_ATIVO', 'True').lower() == 'true'
+    REQUISICAO_LENTA_MS = int(os.environ.get('REQUISICAO_LENTA_MS', '500'))
+    METRICAS_CONSULTAS_LENTAS = int(os.environ.get('METRICAS_CONSULTAS_LENTAS', '5'))
         
+    # Logging: fila não bloqueante, uma linha JSON por registro ('texto' para desenvolvimento).
+    # LOG_NIVEIS ajusta módulos específicos, ex.: caixa.vendas=DEBUG,sqlalchemy.engine=INFO
+    LOG_NIVEL = os.environ.get('LOG_NIVEL', 'INFO')
+    LOG_FORMATO = os.environ.get('LOG_FORMATO', 'json')
+    LOG_NIVEIS = ler_niveis(os.environ.get('LOG_NIVEIS', ''))
+
     # Configurações de segurança
     SESSION_COOKIE_SECURE = True
     REMEMBER_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
-    REMEMBER_COOKIE_HTTPONLY = True
\ No newline at end of file
+    REMEMBER_COOKIE_HTTPONLY = True
+
+
+class DesenvolvimentoConfig(Config):
+    """SQLite local, log legível no terminal"""
+    LOG_FORMATO = os.environ.get('LOG_FORMATO', 'texto')
+
+
+class ProducaoConfig(Config):
+    """
+    Postgres atrás do gunicorn gthread (Procfile: 8 threads por worker): pool
+    de 8 conexões + 4 de folga por worker, para que cada thread tenha a sua
+    sem estourar o max_connections com vários workers/dynos.
+    """
+    SQLALCHEMY_ENGINE_OPTIONS = opcoes_motor(Config.SQLALCHEMY_DATABASE_URI, pool_tamanho=8, pool_excedente=4)
+    SQLALCHEMY_BINDS = binds_leitura(os.environ.get('DATABASE_URL_LEITURA'), pool_tamanho=8, pool_excedente=4)
+
+
+PERFIS = {
+    'desenvolvimento': DesenvolvimentoConfig,
+    'producao': ProducaoConfig,
+}
+
+
+def config_do_ambiente():
+    """Perfil escolhido por CAIXA_PERFIL; sem ele, produção quando o banco é Postgres"""
+    perfil = os.environ.get('CAIXA_PERFIL')
+    if not perfil:
+        perfil = 'producao' if Config.SQLALCHEMY_DATABASE_URI.startswith('postgresql') else 'desenvolvimento'
+    if perfil not in PERFIS:
+        raise ValueError(f'CAIXA_PERFIL={perfil!r} desconhecido; perfis válidos: {", ".join(PERFIS)}')
+    return PERFIS[perfil]
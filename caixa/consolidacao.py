@@ -0,0 +1,319 @@
+import time
+from datetime import timedelta
+from sqlalchemy import case, delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from caixa.extensoes import db
+from caixa.models import Venda, Pagamento, Despesa, ResumoDiario, ResumoMensal, SEM_CAIXA
+from caixa.paralelo import mapear_particoes
+from caixa.periodos import como_data, filtro_periodo, meses_do_periodo
+
+CAMPOS_RESUMO = ('quantidade_vista', 'quantidade_prazo', 'total_vista', 'total_prazo',
+                 'total_pago_vendas', 'total_recebimentos', 'total_despesas')
+
+# Quantidade de registros gravados por comando na reconstrução
+TAMANHO_LOTE_RESUMO = 1000
+
+
+def _caixa_resumo(caixa_id):
+    return caixa_id if caixa_id is not None else SEM_CAIXA
+
+
+def inicio_mes(data):
+    return data.replace(day=1)
+
+
+def proximo_mes(data):
+    return (data.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _totais_vazios():
+    return dict.fromkeys(CAMPOS_RESUMO, 0)
+
+
+# ========== ATUALIZAÇÃO INCREMENTAL ==========
+
+def _somar_resumo(modelo, coluna_data, data, caixa_id, deltas):
+    stmt = (
+        update(modelo)
+        .where(coluna_data == data, modelo.caixa_id == caixa_id)
+        .values({getattr(modelo, campo): getattr(modelo, campo) + valor for campo, valor in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(stmt).rowcount:
+        return
+
+    # Primeiro movimento do dia/mês: criar o registro já com os valores
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(modelo).values(
+                {'caixa_id': caixa_id, coluna_data.key: data, **_totais_vazios(), **deltas}
+            ))
+    except IntegrityError:
+        # Outra transação criou o registro ao mesmo tempo
+        db.session.execute(stmt)
+
+
+def aplicar_delta_resumo(data, caixa_id, **deltas):
+    """
+    Soma os deltas (campos de CAMPOS_RESUMO) ao resumo do dia e ao do mês.
+
+    Mesmo esquema do fluxo incremental: UPDATE ... SET campo = campo + :v
+    no banco e, se o registro ainda não existir, INSERT em um savepoint.
+    """
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+    caixa_id = _caixa_resumo(caixa_id)
+    _somar_resumo(ResumoDiario, ResumoDiario.data, data, caixa_id, deltas)
+    _somar_resumo(ResumoMensal, ResumoMensal.mes, inicio_mes(data), caixa_id, deltas)
+
+
+def registrar_venda_resumo(venda, recebido=0):
+    """
+    Aplica aos resumos uma venda recém-criada; recebido é o pagamento
+    registrado junto com a venda (à vista), somado no mesmo comando.
+    """
+    deltas = {'total_pago_vendas': venda.valor_pago or 0, 'total_recebimentos': recebido}
+    if venda.tipo_pagamento == 'vista':
+        deltas.update(quantidade_vista=1, total_vista=venda.valor_total)
+    elif venda.tipo_pagamento == 'prazo':
+        deltas.update(quantidade_prazo=1, total_prazo=venda.valor_total)
+    aplicar_delta_resumo(venda.data_venda.date(), venda.caixa_id, **deltas)
+
+
+def registrar_pagamento_resumo(pagamento, venda, acrescimo_pago=0):
+    """
+    Aplica um pagamento: o valor recebido entra no dia do pagamento e o
+    aumento de valor_pago da venda (acrescimo_pago) entra no dia da venda.
+    """
+    dia_pagamento = pagamento.data_pagamento.date()
+    dia_venda = venda.data_venda.date()
+    if dia_pagamento == dia_venda:
+        aplicar_delta_resumo(dia_venda, venda.caixa_id, total_recebimentos=pagamento.valor,
+                             total_pago_vendas=acrescimo_pago)
+        return
+    aplicar_delta_resumo(dia_pagamento, venda.caixa_id, total_recebimentos=pagamento.valor)
+    aplicar_delta_resumo(dia_venda, venda.caixa_id, total_pago_vendas=acrescimo_pago)
+
+
+def registrar_despesa_resumo(data, caixa_id, valor):
+    """Soma (ou, com valor negativo, desconta) uma despesa do resumo"""
+    aplicar_delta_resumo(data, caixa_id, total_despesas=valor)
+
+
+# ========== LEITURA ==========
+
+def _somas(modelo):
+    return [db.func.coalesce(db.func.sum(getattr(modelo, campo)), 0) for campo in CAMPOS_RESUMO]
+
+
+def totais_resumo(data_inicio, data_fim):
+    """
+    Totais do período por caixa: {caixa_id: {campo: valor}}.
+
+    Os meses inteiros do período vêm do resumo mensal e só os dias das
+    pontas (meses incompletos) são somados do resumo diário.
+    """
+    meses_inicio = data_inicio if data_inicio.day == 1 else proximo_mes(data_inicio)
+    meses_fim = inicio_mes(data_fim + timedelta(days=1))  # exclusivo
+
+    consultas = []
+    if meses_inicio < meses_fim:
+        consultas.append(db.select(ResumoMensal.caixa_id, *_somas(ResumoMensal)).where(
+            ResumoMensal.mes >= meses_inicio, ResumoMensal.mes < meses_fim
+        ).group_by(ResumoMensal.caixa_id))
+        faixas = [(data_inicio, meses_inicio - timedelta(days=1)), (meses_fim, data_fim)]
+    else:
+        faixas = [(data_inicio, data_fim)]
+
+    faixas = [(inicio, fim) for inicio, fim in faixas if inicio <= fim]
+    if faixas:
+        consultas.append(db.select(ResumoDiario.caixa_id, *_somas(ResumoDiario)).where(
+            or_(*(ResumoDiario.data.between(inicio, fim) for inicio, fim in faixas))
+        ).group_by(ResumoDiario.caixa_id))
+
+    totais = {}
+    for consulta in consultas:
+        for caixa_id, *valores in db.session.execute(consulta):
+            somar_totais(totais, {caixa_id: dict(zip(CAMPOS_RESUMO, valores))})
+    return totais
+
+
+def totais_resumo_mensais(data_inicio, data_fim):
+    """
+    Totais do período por mês, somando todos os caixas: {mes: {campo: valor}}
+    (mes = primeiro dia do mês). Como em totais_resumo, os meses inteiros vêm
+    do resumo mensal (uma consulta) e só os das pontas do resumo diário.
+    """
+    partes = meses_do_periodo(data_inicio, data_fim)
+    inteiros = [inicio for inicio, fim in partes if inicio.day == 1 and fim == proximo_mes(inicio) - timedelta(days=1)]
+
+    totais = {}
+    if inteiros:
+        for mes, *valores in db.session.execute(db.select(ResumoMensal.mes, *_somas(ResumoMensal)).where(
+            ResumoMensal.mes >= inteiros[0], ResumoMensal.mes <= inteiros[-1]
+        ).group_by(ResumoMensal.mes)):
+            somar_totais(totais, {como_data(mes): dict(zip(CAMPOS_RESUMO, valores))})
+
+    for inicio, fim in partes:
+        if inicio not in inteiros:
+            valores = db.session.execute(
+                db.select(*_somas(ResumoDiario)).where(ResumoDiario.data.between(inicio, fim))
+            ).one()
+            somar_totais(totais, {inicio_mes(inicio): dict(zip(CAMPOS_RESUMO, valores))})
+    return totais
+
+
+def somar_totais(totais, parciais):
+    """
+    Acumula em totais ({chave: {campo: valor}}, chave = caixa ou mês) os
+    totais parciais de outra parte do período
+    """
+    for chave, valores in parciais.items():
+        somados = totais.setdefault(chave, _totais_vazios())
+        for campo in CAMPOS_RESUMO:
+            somados[campo] += valores[campo]
+    return totais
+
+
+# ========== RECONSTRUÇÃO (REPARO) ==========
+
+def calcular_resumos_periodo(data_inicio, data_fim):
+    """
+    Calcula do zero os resumos diários do período a partir de vendas,
+    pagamentos e despesas, com uma consulta agregada para cada tabela.
+
+    Retorna {(caixa_id, data): {campo: valor}}.
+    """
+    caixa_venda = db.func.coalesce(Venda.caixa_id, SEM_CAIXA)
+    dia_venda = db.func.date(Venda.data_venda)
+    vendas = db.session.query(
+        caixa_venda,
+        dia_venda,
+        db.func.sum(case((Venda.tipo_pagamento == 'vista', 1), else_=0)),
+        db.func.sum(case((Venda.tipo_pagamento == 'prazo', 1), else_=0)),
+        db.func.sum(case((Venda.tipo_pagamento == 'vista', Venda.valor_total), else_=0)),
+        db.func.sum(case((Venda.tipo_pagamento == 'prazo', Venda.valor_total), else_=0)),
+        db.func.sum(db.func.coalesce(Venda.valor_pago, 0))
+    ).filter(
+        filtro_periodo(Venda.data_venda, data_inicio, data_fim)
+    ).group_by(caixa_venda, dia_venda)
+
+    dia_pagamento = db.func.date(Pagamento.data_pagamento)
+    pagamentos = db.session.query(
+        caixa_venda,
+        dia_pagamento,
+        db.func.sum(Pagamento.valor)
+    ).join(Venda).filter(
+        filtro_periodo(Pagamento.data_pagamento, data_inicio, data_fim)
+    ).group_by(caixa_venda, dia_pagamento)
+
+    caixa_despesa = db.func.coalesce(Despesa.caixa_id, SEM_CAIXA)
+    despesas = db.session.query(
+        caixa_despesa,
+        Despesa.data_despesa,
+        db.func.sum(Despesa.valor)
+    ).filter(
+        Despesa.data_despesa >= data_inicio,
+        Despesa.data_despesa <= data_fim
+    ).group_by(caixa_despesa, Despesa.data_despesa)
+
+    totais = {}
+
+    def linha(caixa_id, dia):
+        return totais.setdefault((caixa_id, como_data(dia)), _totais_vazios())
+
+    for caixa_id, dia, qtd_vista, qtd_prazo, vista, prazo, pago in vendas:
+        linha(caixa_id, dia).update(
+            quantidade_vista=qtd_vista or 0, quantidade_prazo=qtd_prazo or 0,
+            total_vista=vista or 0, total_prazo=prazo or 0, total_pago_vendas=pago or 0
+        )
+    for caixa_id, dia, recebido in pagamentos:
+        linha(caixa_id, dia)['total_recebimentos'] = recebido or 0
+    for caixa_id, dia, valor in despesas:
+        linha(caixa_id, dia)['total_despesas'] = valor or 0
+
+    return totais
+
+
+def _gravar_em_lotes(stmt, linhas):
+    for i in range(0, len(linhas), TAMANHO_LOTE_RESUMO):
+        db.session.execute(stmt, linhas[i:i + TAMANHO_LOTE_RESUMO])
+
+
+def _dias_do_mes(mes):
+    return mes, proximo_mes(mes) - timedelta(days=1)
+
+
+def reconstruir_mes_resumo(mes, totais=None):
+    """
+    Apaga e grava de novo os resumos diários e o mensal de um mês.
+    totais: resultado de calcular_resumos_periodo para o mês, se já calculado.
+    Retorna a quantidade de registros gravados.
+    """
+    mes, ultimo_dia = _dias_do_mes(inicio_mes(mes))
+    if totais is None:
+        totais = calcular_resumos_periodo(mes, ultimo_dia)
+
+    db.session.execute(delete(ResumoDiario).where(ResumoDiario.data.between(mes, ultimo_dia)))
+    db.session.execute(delete(ResumoMensal).where(ResumoMensal.mes == mes))
+
+    mensais = {}
+    for (caixa_id, _), valores in totais.items():
+        somados = mensais.setdefault(caixa_id, _totais_vazios())
+        for campo in CAMPOS_RESUMO:
+            somados[campo] += valores[campo]
+
+    _gravar_em_lotes(insert(ResumoDiario), [
+        dict(valores, caixa_id=caixa_id, data=dia) for (caixa_id, dia), valores in totais.items()
+    ])
+    _gravar_em_lotes(insert(ResumoMensal), [
+        dict(valores, caixa_id=caixa_id, mes=mes) for caixa_id, valores in mensais.items()
+    ])
+    return len(totais) + len(mensais)
+
+
+def reconstruir_resumos(data_inicio, data_fim, limite_segundos=None, progresso=None):
+    """
+    Reconstrói os resumos dos meses que cobrem o período, um mês por transação.
+
+    Mesmo contrato do recálculo do fluxo em lote: se limite_segundos for
+    atingido, devolve 'proximo_inicio' para retomar de onde parou.
+    progresso(meses_processados, total_meses) é chamado após cada mês.
+    Os agregados de cada mês são calculados em paralelo (mapear_particoes);
+    a gravação fica neste processo, mês a mês.
+    """
+    inicio_execucao = time.monotonic()
+    mes = inicio_mes(data_inicio)
+    ultimo = inicio_mes(data_fim)
+    meses = []
+    while mes <= ultimo:
+        meses.append(mes)
+        mes = proximo_mes(mes)
+    total_meses = len(meses)
+    processados = 0
+    registros = 0
+
+    parciais = mapear_particoes(calcular_resumos_periodo, [_dias_do_mes(mes) for mes in meses])
+    try:
+        for mes, totais in zip(meses, parciais):
+            registros += reconstruir_mes_resumo(mes, totais)
+            db.session.commit()
+
+            processados += 1
+            if progresso:
+                progresso(processados, total_meses)
+
+            if limite_segundos and time.monotonic() - inicio_execucao > limite_segundos:
+                break
+    finally:
+        parciais.close()
+
+    concluido = processados == total_meses
+    return {
+        'concluido': concluido,
+        'proximo_inicio': None if concluido else meses[processados],
+        'meses_processados': processados,
+        'total_meses': total_meses,
+        'registros': registros
+    }
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, SelectField, TextAreaField, DateField, SubmitField
+from wtforms import StringField, SelectField, TextAreaField, DateField, SubmitField
 from wtforms.validators import DataRequired, NumberRange, Optional, Length
+from caixa.dinheiro import CENTAVO, CampoDinheiro
 from datetime import date
 
 class DespesaForm(FlaskForm):
@@ -8,8 +9,8 @@ class DespesaForm(FlaskForm):
                            validators=[DataRequired(), Length(min=3, max=200)],
                            render_kw={"placeholder": "Ex: Conta de luz, Aluguel, Compra de material..."})
     
-    valor = FloatField('Valor (R$)', 
-                      validators=[DataRequired(), NumberRange(min=0.01)],
+    valor = CampoDinheiro('Valor (R$)', 
+                      validators=[DataRequired(), NumberRange(min=CENTAVO)],
                       render_kw={"placeholder": "0.00", "step": "0.01"})
     
     data_despesa = DateField('Data da Despesa', 
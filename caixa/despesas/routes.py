@@ -6,20 +6,43 @@ from caixa.despesas.forms import DespesaForm, CategoriaDespesaForm
 from caixa.models import Despesa, CategoriaDespesa, Caixa
 from datetime import datetime, date
 from sqlalchemy import func
+from caixa.carregamento import perfil
+from caixa.extensoes import cache_relatorios
+from caixa.resumos import resumo_vendas_dia, total_despesas_dia
+from caixa.consolidacao import registrar_despesa_resumo
+from caixa.tempo_real import notificar_caixa
+from caixa.paginacao import paginar_cursor, usar_cursor, chave_contagem, dados_pagina
+import logging
+
+log = logging.getLogger(__name__)
 
 # ========== ROTAS DE DESPESAS ==========
 
-@bp.route('/')
-@login_required
-def lista_despesas():
-    """Lista todas as despesas com filtros"""
-    page = request.args.get('page', 1, type=int)
+POR_PAGINA_DESPESAS = 20
+
+
+def atualizar_paineis(caixa_id, *datas):
+    """
+    Descarta os relatórios em cache dos dias afetados e envia os novos totais
+    aos painéis. Roda depois do commit: uma falha aqui só vai para o log,
+    a despesa já está gravada.
+    """
+    try:
+        for data in datas:
+            cache_relatorios.invalidar(data=data)
+        notificar_caixa(caixa_id)
+    except Exception:
+        log.exception('Despesa gravada, mas falhou a atualização de caches e painéis')
+
+
+def consulta_despesas():
+    """Consulta das despesas com os filtros da URL; devolve (query, filtros)"""
     data_inicio = request.args.get('data_inicio', '')
     data_fim = request.args.get('data_fim', '')
     categoria_id = request.args.get('categoria_id', 0, type=int)
     forma_pagamento = request.args.get('forma_pagamento', '')
     
-    query = Despesa.query
+    query = Despesa.query.options(*perfil('despesa_lista'))
     
     # Aplicar filtros
     if data_inicio:
@@ -37,18 +60,44 @@ def lista_despesas():
         query = query.filter_by(forma_pagamento=forma_pagamento)
     
     # Se for operador de caixa, filtrar por caixa
+    caixa_id = None
     if not current_user.is_owner and current_user.caixa_id:
-        query = query.filter_by(caixa_id=current_user.caixa_id)
-    
-    # Ordenar por data (mais recentes primeiro)
-    despesas = query.order_by(Despesa.data_despesa.desc(), Despesa.data_registro.desc()).paginate(
-        page=page, per_page=20, error_out=False
+        caixa_id = current_user.caixa_id
+        query = query.filter_by(caixa_id=caixa_id)
+    
+    filtros = {
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'categoria_id': categoria_id,
+        'forma_pagamento': forma_pagamento,
+        'caixa_id': caixa_id
+    }
+    return query, filtros
+
+
+def paginar_despesas(query, contagem):
+    """Mais recentes primeiro: por cursor (data_despesa, id) ou, com ?page=, numerada"""
+    if usar_cursor():
+        return paginar_cursor(query, [Despesa.data_despesa, Despesa.id], lambda d: (d.data_despesa, d.id),
+                              POR_PAGINA_DESPESAS, descendente=True, contagem=contagem)
+    page = request.args.get('page', 1, type=int)
+    return query.order_by(Despesa.data_despesa.desc(), Despesa.id.desc()).paginate(
+        page=page, per_page=POR_PAGINA_DESPESAS, error_out=False
     )
+
+
+@bp.route('/')
+@login_required
+def lista_despesas():
+    """Lista todas as despesas com filtros"""
+    query, filtros = consulta_despesas()
+    despesas = paginar_despesas(query, chave_contagem('despesas', **filtros))
     
     # Calcular totais
+    data_inicio, data_fim = filtros['data_inicio'], filtros['data_fim']
     total_periodo = db.session.query(func.sum(Despesa.valor)).filter(
-        Despesa.data_despesa >= (data_inicio_obj if data_inicio else date(1900,1,1)),
-        Despesa.data_despesa <= (data_fim_obj if data_fim else date(2100,12,31))
+        Despesa.data_despesa >= (datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else date(1900,1,1)),
+        Despesa.data_despesa <= (datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else date(2100,12,31))
     ).scalar() or 0
     
     # Categorias para o filtro
@@ -58,12 +107,27 @@ def lista_despesas():
                          despesas=despesas,
                          categorias=categorias,
                          total_periodo=total_periodo,
-                         filtros={
-                             'data_inicio': data_inicio,
-                             'data_fim': data_fim,
-                             'categoria_id': categoria_id,
-                             'forma_pagamento': forma_pagamento
-                         })
+                         filtros=filtros)
+
+
+@bp.route('/api/listagem')
+@login_required
+def api_listagem_despesas():
+    """API paginada por cursor (?apos=/?antes=) com os mesmos filtros da lista; ?total=1 inclui o total"""
+    query, filtros = consulta_despesas()
+    contagem = chave_contagem('despesas', **filtros) if request.args.get('total', type=int) else None
+    despesas = paginar_cursor(query, [Despesa.data_despesa, Despesa.id], lambda d: (d.data_despesa, d.id),
+                              POR_PAGINA_DESPESAS, descendente=True, contagem=contagem)
+    return jsonify(dados_pagina(despesas, lambda d: {
+        'id': d.id,
+        'descricao': d.descricao,
+        'valor': d.valor,
+        'data_despesa': d.data_despesa.isoformat(),
+        'forma_pagamento': d.forma_pagamento,
+        'categoria': d.categoria.nome if d.categoria else None,
+        'usuario': d.usuario.nome if d.usuario else None,
+        'caixa_id': d.caixa_id
+    }))
 
 
 @bp.route('/nova', methods=['GET', 'POST'])
@@ -88,7 +152,9 @@ def nova_despesa():
         )
         
         db.session.add(despesa)
+        registrar_despesa_resumo(despesa.data_despesa, despesa.caixa_id, despesa.valor)
         db.session.commit()
+        atualizar_paineis(despesa.caixa_id, despesa.data_despesa)
         
         flash(f'✅ Despesa "{despesa.descricao}" registrada com sucesso!', 'success')
         return redirect(url_for('despesas.lista_despesas'))
@@ -100,7 +166,7 @@ def nova_despesa():
 @login_required
 def detalhe_despesa(id):
     """Ver detalhes de uma despesa"""
-    despesa = Despesa.query.get_or_404(id)
+    despesa = Despesa.query.options(*perfil('despesa_detalhe')).get_or_404(id)
     return render_template('despesas/detalhe.html', despesa=despesa)
 
 
@@ -115,6 +181,8 @@ def editar_despesa(id):
     form.categoria_id.choices = [(c.id, c.nome) for c in CategoriaDespesa.query.order_by('nome').all()]
     
     if form.validate_on_submit():
+        data_anterior = despesa.data_despesa
+        valor_anterior = despesa.valor
         despesa.descricao = form.descricao.data
         despesa.valor = form.valor.data
         despesa.data_despesa = form.data_despesa.data
@@ -122,7 +190,10 @@ def editar_despesa(id):
         despesa.forma_pagamento = form.forma_pagamento.data
         despesa.observacoes = form.observacoes.data
         
+        registrar_despesa_resumo(data_anterior, despesa.caixa_id, -valor_anterior)
+        registrar_despesa_resumo(despesa.data_despesa, despesa.caixa_id, despesa.valor)
         db.session.commit()
+        atualizar_paineis(despesa.caixa_id, data_anterior, despesa.data_despesa)
         
         flash(f'✅ Despesa "{despesa.descricao}" atualizada!', 'success')
         return redirect(url_for('despesas.lista_despesas'))
@@ -135,9 +206,13 @@ def editar_despesa(id):
 def excluir_despesa(id):
     """Excluir uma despesa"""
     despesa = Despesa.query.get_or_404(id)
+    caixa_id = despesa.caixa_id
+    data_despesa = despesa.data_despesa
     
     db.session.delete(despesa)
+    registrar_despesa_resumo(data_despesa, caixa_id, -despesa.valor)
     db.session.commit()
+    atualizar_paineis(caixa_id, data_despesa)
     
     flash(f'✅ Despesa excluída!', 'success')
     return redirect(url_for('despesas.lista_despesas'))
@@ -149,7 +224,7 @@ def excluir_despesa(id):
 @login_required
 def lista_categorias():
     """Listar categorias de despesa"""
-    categorias = CategoriaDespesa.query.order_by('nome').all()
+    categorias = CategoriaDespesa.query.options(*perfil('categoria_despesas')).order_by('nome').all()
     return render_template('despesas/categorias.html', categorias=categorias)
 
 
@@ -219,52 +294,48 @@ def resumo_diario():
     """Resumo de despesas do dia"""
     hoje = date.today()
     
-    despesas_hoje = Despesa.query.filter(
-        Despesa.data_despesa == hoje
-    ).all()
-    
-    total_hoje = sum(d.valor for d in despesas_hoje)
-    
-    return jsonify({
-        'data': hoje.strftime('%d/%m/%Y'),
-        'total': total_hoje,
-        'quantidade': len(despesas_hoje),
-        'despesas': [{
-            'id': d.id,
-            'descricao': d.descricao,
-            'valor': d.valor,
-            'categoria': d.categoria.nome
-        } for d in despesas_hoje]
-    })
+    def calcular():
+        despesas_hoje = Despesa.query.options(*perfil('despesa_lista')).filter(
+            Despesa.data_despesa == hoje
+        ).all()
+        
+        total_hoje = sum(d.valor for d in despesas_hoje)
+        
+        return {
+            'data': hoje.strftime('%d/%m/%Y'),
+            'total': total_hoje,
+            'quantidade': len(despesas_hoje),
+            'despesas': [{
+                'id': d.id,
+                'descricao': d.descricao,
+                'valor': d.valor,
+                'categoria': d.categoria.nome
+            } for d in despesas_hoje]
+        }
+    
+    return jsonify(cache_relatorios.obter('resumo_diario', None, hoje, hoje, calcular))
 
 
 @bp.route('/faturamento-diario')
 @login_required
 def faturamento_diario():
     """Relatório de faturamento do dia (vendas - despesas)"""
-    from caixa.models import Venda
-    
     hoje = date.today()
     
-    # Total de vendas do dia
-    vendas_hoje = Venda.query.filter(
-        func.date(Venda.data_venda) == hoje
-    ).all()
-    total_vendas = sum(v.valor_total for v in vendas_hoje)
-    
-    # Total de despesas do dia
-    despesas_hoje = Despesa.query.filter(
-        Despesa.data_despesa == hoje
-    ).all()
-    total_despesas = sum(d.valor for d in despesas_hoje)
-    
-    # Resultado líquido
-    resultado_liquido = total_vendas - total_despesas
-    
-    return jsonify({
-        'data': hoje.strftime('%d/%m/%Y'),
-        'vendas': total_vendas,
-        'despesas': total_despesas,
-        'resultado': resultado_liquido,
-        'status': 'positivo' if resultado_liquido >= 0 else 'negativo'
-    })
\ No newline at end of file
+    def calcular():
+        # Totais do dia somados no banco
+        total_vendas = resumo_vendas_dia(hoje)['total_vendas']
+        total_despesas = total_despesas_dia(hoje)
+        
+        # Resultado líquido
+        resultado_liquido = total_vendas - total_despesas
+        
+        return {
+            'data': hoje.strftime('%d/%m/%Y'),
+            'vendas': total_vendas,
+            'despesas': total_despesas,
+            'resultado': resultado_liquido,
+            'status': 'positivo' if resultado_liquido >= 0 else 'negativo'
+        }
+    
+    return jsonify(cache_relatorios.obter('faturamento_diario', None, hoje, hoje, calcular))
\ No newline at end of file
@@ -0,0 +1,124 @@
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import BigInteger, Float, Integer
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+from wtforms import DecimalField
+
+CENTAVO = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def centavos(valor):
+    """
+    Converte um valor em reais (Decimal, float, int ou texto) para centavos inteiros,
+    arredondando meio centavo para cima.
+
+    Floats (importação CSV) arredondam como o texto que os representa, igual
+    ao caminho Decimal dos formulários: 1.005 -> 101, 0.125 -> 13. Longe do
+    meio centavo round(v * 100) já dá o mesmo resultado, bem mais rápido;
+    perto dele o float passa por Decimal(repr(v)).
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        multiplicado = valor * 100
+        arredondado = round(multiplicado)
+        if abs(multiplicado - arredondado) < 0.49:
+            return arredondado
+        valor = Decimal(repr(valor))
+    if isinstance(valor, int):
+        return valor * 100
+    if not isinstance(valor, Decimal):
+        valor = Decimal(str(valor).strip().replace(',', '.'))
+    return int((valor * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def reais(valor_centavos):
+    """Centavos inteiros -> Decimal com duas casas (exato)"""
+    if valor_centavos is None:
+        return None
+    if isinstance(valor_centavos, int):
+        return Decimal(valor_centavos).scaleb(-2)
+    # AVG e afins devolvem frações de centavo
+    return (Decimal(valor_centavos) / 100).quantize(CENTAVO, ROUND_HALF_UP)
+
+
+def dinheiro(valor):
+    """Qualquer valor em reais -> Decimal com duas casas (0 para None)"""
+    if valor is None:
+        return ZERO
+    return reais(centavos(valor))
+
+
+def somar(valores):
+    """Soma exata de valores em reais, feita em centavos inteiros"""
+    return reais(sum(centavos(valor) or 0 for valor in valores))
+
+
+class Dinheiro(TypeDecorator):
+    """
+    Coluna de dinheiro: guardada no banco como centavos inteiros (SUM exato
+    no SQL) e exposta no Python como Decimal em reais. Parâmetros são sempre
+    em reais (int, float, Decimal), inclusive em UPDATE col = col + :delta.
+    AVG não herda o tipo: use type_coerce(func.avg(col), Dinheiro).
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    class comparator_factory(TypeDecorator.Comparator):
+        # valor ± valor e valor * quantidade continuam dinheiro (senão o resultado
+        # de SUM(valor_total - valor_pago) voltaria em centavos); valor / valor é razão
+        def _adapt_expression(self, op, other_comparator):
+            outro = other_comparator.type
+            if op in (operators.add, operators.sub) and isinstance(outro, (Dinheiro, Integer)):
+                return op, self.type
+            if op is operators.mul and isinstance(outro, Integer) and not isinstance(outro, Dinheiro):
+                return op, self.type
+            if op is operators.truediv and isinstance(outro, Dinheiro):
+                return op, Float()  # razão entre valores (percentuais)
+            return super()._adapt_expression(op, other_comparator)
+
+    def process_bind_param(self, value, dialect):
+        return centavos(value)
+
+    def process_result_value(self, value, dialect):
+        return reais(value)
+
+    def process_literal_param(self, value, dialect):
+        return str(centavos(value))
+
+    @property
+    def python_type(self):
+        return Decimal
+
+
+def para_json(valor):
+    """default= do json.dumps: dinheiro vira número (como era com float), datas em ISO"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+class ProvedorJson(DefaultJSONProvider):
+    """jsonify/tojson com Decimal como número, para o front-end continuar somando valores"""
+
+    @staticmethod
+    def default(valor):
+        if isinstance(valor, Decimal):
+            return float(valor)
+        return DefaultJSONProvider.default(valor)
+
+
+class CampoDinheiro(DecimalField):
+    """Campo de valor em reais: Decimal já arredondado ao centavo, como será gravado"""
+
+    def process_formdata(self, valuelist):
+        super().process_formdata(valuelist)
+        if self.data is not None:
+            self.data = dinheiro(self.data)
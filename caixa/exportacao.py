@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+from itertools import groupby
+
+from caixa.dinheiro import para_json
+from caixa.extensoes import db
+from caixa.models import Venda, ItemVenda, Produto, Pagamento, Despesa, CategoriaDespesa, Cliente
+from caixa.periodos import filtro_periodo
+
+# Linhas lidas do banco por vez (cursor no servidor no PostgreSQL)
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+# Linhas de CSV/JSONL agrupadas em cada pedaço enviado ao cliente
+LINHAS_POR_PEDACO = 200
+
+
+def _consulta_em_lotes(consulta):
+    return db.session.execute(consulta.execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO))
+
+
+def registros_vendas(data_inicio, data_fim, caixa_id=None):
+    """Vendas do período, uma por vez, com a lista de itens"""
+    consulta = (
+        db.select(
+            Venda.id, Venda.data_venda, Venda.caixa_id, Venda.cliente_id, Cliente.nome.label('cliente'),
+            Venda.tipo_pagamento, Venda.status, Venda.valor_total, Venda.valor_pago,
+            ItemVenda.produto_id, Produto.descricao.label('produto'), ItemVenda.quantidade,
+            ItemVenda.preco_unitario, ItemVenda.subtotal
+        )
+        .join(Cliente, Cliente.id == Venda.cliente_id)
+        .outerjoin(ItemVenda, ItemVenda.venda_id == Venda.id)
+        .outerjoin(Produto, Produto.id == ItemVenda.produto_id)
+        .where(filtro_periodo(Venda.data_venda, data_inicio, data_fim))
+        .order_by(Venda.data_venda, Venda.id, ItemVenda.id)
+    )
+    if caixa_id:
+        consulta = consulta.where(Venda.caixa_id == caixa_id)
+
+    # As linhas de uma mesma venda chegam juntas (ordenadas por venda)
+    for _, linhas in groupby(_consulta_em_lotes(consulta), key=lambda linha: linha.id):
+        linhas = list(linhas)
+        primeira = linhas[0]
+        yield {
+            'id': primeira.id,
+            'data_venda': primeira.data_venda,
+            'caixa_id': primeira.caixa_id,
+            'cliente_id': primeira.cliente_id,
+            'cliente': primeira.cliente,
+            'tipo_pagamento': primeira.tipo_pagamento,
+            'status': primeira.status,
+            'valor_total': primeira.valor_total,
+            'valor_pago': primeira.valor_pago,
+            'itens': [{
+                'produto_id': linha.produto_id,
+                'produto': linha.produto,
+                'quantidade': linha.quantidade,
+                'preco_unitario': linha.preco_unitario,
+                'subtotal': linha.subtotal
+            } for linha in linhas if linha.produto_id is not None]
+        }
+
+
+def linhas_csv_vendas(venda):
+    """Uma linha de CSV por item (a venda se repete); venda sem itens vira uma linha só"""
+    dados = {chave: valor for chave, valor in venda.items() if chave != 'itens'}
+    if not venda['itens']:
+        yield dados
+    for item in venda['itens']:
+        yield {**dados, **item}
+
+
+def registros_pagamentos(data_inicio, data_fim, caixa_id=None):
+    consulta = (
+        db.select(
+            Pagamento.id, Pagamento.data_pagamento, Pagamento.venda_id, Venda.caixa_id,
+            Venda.cliente_id, Pagamento.valor, Pagamento.forma_pagamento, Pagamento.recebedor_id,
+            Pagamento.observacoes
+        )
+        .join(Venda, Venda.id == Pagamento.venda_id)
+        .where(filtro_periodo(Pagamento.data_pagamento, data_inicio, data_fim))
+        .order_by(Pagamento.data_pagamento, Pagamento.id)
+    )
+    if caixa_id:
+        consulta = consulta.where(Venda.caixa_id == caixa_id)
+    for linha in _consulta_em_lotes(consulta):
+        yield linha._asdict()
+
+
+def registros_despesas(data_inicio, data_fim, caixa_id=None):
+    consulta = (
+        db.select(
+            Despesa.id, Despesa.data_despesa, Despesa.caixa_id, Despesa.descricao,
+            CategoriaDespesa.nome.label('categoria'), Despesa.valor, Despesa.forma_pagamento,
+            Despesa.usuario_id, Despesa.observacoes
+        )
+        .join(CategoriaDespesa, CategoriaDespesa.id == Despesa.categoria_id)
+        .where(Despesa.data_despesa >= data_inicio, Despesa.data_despesa <= data_fim)
+        .order_by(Despesa.data_despesa, Despesa.id)
+    )
+    if caixa_id:
+        consulta = consulta.where(Despesa.caixa_id == caixa_id)
+    for linha in _consulta_em_lotes(consulta):
+        yield linha._asdict()
+
+
+# tipo -> (registros, colunas do CSV, conversão de um registro em linhas de CSV)
+EXPORTACOES = {
+    'vendas': (
+        registros_vendas,
+        ['id', 'data_venda', 'caixa_id', 'cliente_id', 'cliente', 'tipo_pagamento', 'status',
+         'valor_total', 'valor_pago', 'produto_id', 'produto', 'quantidade', 'preco_unitario', 'subtotal'],
+        linhas_csv_vendas
+    ),
+    'pagamentos': (
+        registros_pagamentos,
+        ['id', 'data_pagamento', 'venda_id', 'caixa_id', 'cliente_id', 'valor', 'forma_pagamento',
+         'recebedor_id', 'observacoes'],
+        None
+    ),
+    'despesas': (
+        registros_despesas,
+        ['id', 'data_despesa', 'caixa_id', 'descricao', 'categoria', 'valor', 'forma_pagamento',
+         'usuario_id', 'observacoes'],
+        None
+    ),
+}
+
+
+def gerar_csv(registros, colunas, achatar=None):
+    """Gera o CSV em pedaços (cabeçalho primeiro), sem montar o arquivo em memória"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(colunas)
+    yield buffer.getvalue()
+
+    pedaco = []
+    for registro in registros:
+        for linha in (achatar(registro) if achatar else (registro,)):
+            pedaco.append([linha.get(coluna) for coluna in colunas])
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            buffer.seek(0)
+            buffer.truncate()
+            escritor.writerows(pedaco)
+            yield buffer.getvalue()
+            pedaco = []
+    if pedaco:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(pedaco)
+        yield buffer.getvalue()
+
+
+def gerar_jsonl(registros):
+    """Gera JSON Lines (um objeto por linha) em pedaços"""
+    pedaco = []
+    for registro in registros:
+        pedaco.append(json.dumps(registro, default=para_json, ensure_ascii=False))
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield '\n'.join(pedaco) + '\n'
+            pedaco = []
+    if pedaco:
+        yield '\n'.join(pedaco) + '\n'
@@ -1,7 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from caixa.cache import CacheRelatorios
+from caixa.catalogo import CatalogoCache
+from caixa.instrumentacao import MetricasRequisicoes, OrcamentoConsultas
+from caixa.registro import Registro
+from caixa.replica import RoteadorLeitura, SessaoRoteada
+from caixa.tempo_real import Publicador
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 migrate = Migrate()
 login_manager = LoginManager()
+roteador_leitura = RoteadorLeitura()
+registro = Registro()
+tempo_real = Publicador()
+cache_relatorios = CacheRelatorios()
+orcamento_consultas = OrcamentoConsultas()
+metricas = MetricasRequisicoes()
+catalogo = CatalogoCache()
@@ -0,0 +1,212 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, insert, update
+
+from caixa.extensoes import db
+from caixa.models import Cliente, LancamentoCliente, Pagamento, Venda, agora_brasil
+
+DEBITO = 'debito'
+CREDITO = 'credito'
+
+# Clientes reconstruídos por transação
+TAMANHO_LOTE_EXTRATO = 500
+
+
+def _descricao_venda(venda_id):
+    return f'Venda #{venda_id}'
+
+
+def _descricao_pagamento(venda_id):
+    return f'Pagamento da venda #{venda_id}'
+
+
+def _assinado(tipo, valor):
+    return valor if tipo == DEBITO else -valor
+
+
+# ========== LANÇAMENTOS ==========
+
+def _lancar(cliente_id, lancamentos, **totais):
+    """
+    Grava os lançamentos do cliente e soma os totais (total_compras,
+    total_pago, quantidade_compras; ultima_compra é substituída).
+
+    Um único UPDATE ... SET saldo_devedor = saldo_devedor + :delta trava a
+    linha do cliente, o que põe em fila lançamentos concorrentes, e devolve
+    o saldo final pelo RETURNING; os saldos de cada lançamento são
+    calculados a partir dele.
+    """
+    delta = sum(_assinado(l['tipo'], l['valor']) for l in lancamentos)
+    valores = {Cliente.saldo_devedor: db.func.coalesce(Cliente.saldo_devedor, 0) + delta}
+    for campo, valor in totais.items():
+        if campo == 'ultima_compra':
+            valores[Cliente.ultima_compra] = valor
+        elif valor:
+            valores[getattr(Cliente, campo)] = getattr(Cliente, campo) + valor
+
+    saldo = db.session.execute(
+        update(Cliente)
+        .where(Cliente.id == cliente_id)
+        .values(valores)
+        .returning(Cliente.saldo_devedor)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+    for lancamento in reversed(lancamentos):
+        lancamento.update(cliente_id=cliente_id, saldo=saldo)
+        saldo -= _assinado(lancamento['tipo'], lancamento['valor'])
+    db.session.execute(insert(LancamentoCliente.__table__), lancamentos)
+
+
+def registrar_venda_extrato(venda, pagamento=None):
+    """
+    Lança uma venda recém-criada no extrato do cliente (débito) e, se
+    informado, o pagamento feito junto com ela (crédito), no mesmo UPDATE.
+    """
+    db.session.flush()  # ids da venda e do pagamento
+    lancamentos = [{
+        'data': venda.data_venda, 'tipo': DEBITO, 'valor': venda.valor_total,
+        'venda_id': venda.id, 'pagamento_id': None, 'descricao': _descricao_venda(venda.id),
+    }]
+    pago = 0
+    if pagamento is not None:
+        pago = pagamento.valor
+        lancamentos.append({
+            'data': pagamento.data_pagamento, 'tipo': CREDITO, 'valor': pagamento.valor,
+            'venda_id': venda.id, 'pagamento_id': pagamento.id, 'descricao': _descricao_pagamento(venda.id),
+        })
+    _lancar(venda.cliente_id, lancamentos, total_compras=venda.valor_total, total_pago=pago,
+            quantidade_compras=1, ultima_compra=venda.data_venda)
+
+
+def registrar_pagamento_extrato(pagamento, venda):
+    """Lança um pagamento no extrato do cliente da venda (crédito)"""
+    db.session.flush()
+    _lancar(venda.cliente_id, [{
+        'data': pagamento.data_pagamento, 'tipo': CREDITO, 'valor': pagamento.valor,
+        'venda_id': venda.id, 'pagamento_id': pagamento.id, 'descricao': _descricao_pagamento(venda.id),
+    }], total_pago=pagamento.valor)
+
+
+# ========== RECONSTRUÇÃO (REPARO) ==========
+
+def _movimentos(ids):
+    """Vendas e pagamentos dos clientes, como lançamentos: {cliente_id: [(ordenação, lançamento)]}"""
+    movimentos = defaultdict(list)
+    vendas = db.session.query(Venda.cliente_id, Venda.id, Venda.data_venda, Venda.valor_total).filter(
+        Venda.cliente_id.in_(ids)
+    )
+    for cliente_id, venda_id, data, valor in vendas:
+        movimentos[cliente_id].append(((data or datetime.min, 1, venda_id), {
+            'data': data or agora_brasil(), 'tipo': DEBITO, 'valor': valor,
+            'venda_id': venda_id, 'pagamento_id': None, 'descricao': _descricao_venda(venda_id),
+        }))
+    pagamentos = db.session.query(
+        Venda.cliente_id, Pagamento.id, Pagamento.venda_id, Pagamento.data_pagamento, Pagamento.valor
+    ).join(Venda).filter(Venda.cliente_id.in_(ids))
+    for cliente_id, pagamento_id, venda_id, data, valor in pagamentos:
+        movimentos[cliente_id].append(((data or datetime.min, 2, pagamento_id), {
+            'data': data or agora_brasil(), 'tipo': CREDITO, 'valor': valor,
+            'venda_id': venda_id, 'pagamento_id': pagamento_id, 'descricao': _descricao_pagamento(venda_id),
+        }))
+    return movimentos
+
+
+def reconstruir_lote_extrato(ids, manter_saldo=False):
+    """
+    Apaga e grava de novo o extrato e os totais dos clientes a partir das
+    vendas e pagamentos. Os lançamentos de saldo anterior são mantidos; com
+    manter_saldo=True eles são trocados por um único ajuste que preserva o
+    saldo_devedor atual (arquivo de clientes que já trazia o saldo das
+    vendas importadas). Retorna a quantidade de lançamentos gravados.
+    """
+    movimentos = _movimentos(ids)
+    anteriores = defaultdict(list)
+    for lancamento in LancamentoCliente.query.filter(
+        LancamentoCliente.cliente_id.in_(ids),
+        LancamentoCliente.venda_id.is_(None),
+        LancamentoCliente.pagamento_id.is_(None),
+    ):
+        anteriores[lancamento.cliente_id].append(((lancamento.data, 0, lancamento.id), {
+            'data': lancamento.data, 'tipo': lancamento.tipo, 'valor': lancamento.valor,
+            'venda_id': None, 'pagamento_id': None, 'descricao': lancamento.descricao,
+        }))
+    saldos_atuais = dict(db.session.query(Cliente.id, Cliente.saldo_devedor).filter(Cliente.id.in_(ids))) \
+        if manter_saldo else {}
+
+    db.session.execute(delete(LancamentoCliente).where(LancamentoCliente.cliente_id.in_(ids)))
+
+    linhas, totais = [], []
+    for cliente_id in ids:
+        do_cliente = movimentos.get(cliente_id, [])
+        if manter_saldo:
+            ajuste = (saldos_atuais.get(cliente_id) or 0) - sum(_assinado(l['tipo'], l['valor']) for _, l in do_cliente)
+            inicio = min((l['data'] for _, l in do_cliente), default=agora_brasil())
+            anteriores[cliente_id] = [((inicio, 0, 0), {
+                'data': inicio, 'tipo': DEBITO if ajuste > 0 else CREDITO, 'valor': abs(ajuste),
+                'venda_id': None, 'pagamento_id': None, 'descricao': 'Saldo anterior',
+            })] if ajuste else []
+
+        saldo = compras = pago = 0
+        quantidade, ultima = 0, None
+        for _, lancamento in sorted(anteriores[cliente_id] + do_cliente, key=lambda m: m[0]):
+            saldo += _assinado(lancamento['tipo'], lancamento['valor'])
+            linhas.append(dict(lancamento, cliente_id=cliente_id, saldo=saldo))
+            if lancamento['pagamento_id']:
+                pago += lancamento['valor']
+            elif lancamento['venda_id']:
+                compras += lancamento['valor']
+                quantidade += 1
+                ultima = max(ultima or lancamento['data'], lancamento['data'])
+        totais.append({'id_cliente': cliente_id, 'saldo': saldo, 'compras': compras, 'pago': pago,
+                       'quantidade': quantidade, 'ultima': ultima})
+
+    if linhas:
+        db.session.execute(insert(LancamentoCliente.__table__), linhas)
+    clientes = Cliente.__table__
+    db.session.execute(
+        update(clientes).where(clientes.c.id == bindparam('id_cliente')).values(
+            saldo_devedor=bindparam('saldo'), total_compras=bindparam('compras'), total_pago=bindparam('pago'),
+            quantidade_compras=bindparam('quantidade'), ultima_compra=bindparam('ultima')
+        ),
+        totais
+    )
+    return len(linhas)
+
+
+def reconstruir_extratos(cliente_ids=None, manter_saldo=False, tamanho_lote=TAMANHO_LOTE_EXTRATO,
+                         limite_segundos=None, progresso=None):
+    """
+    Reconstrói o extrato dos clientes informados (None = todos), um lote de
+    clientes por transação. Mesmo contrato das outras reconstruções: se
+    limite_segundos for atingido, 'proximo_id' indica de onde retomar.
+    progresso(clientes_processados, total_clientes) é chamado após cada lote.
+    """
+    if cliente_ids is None:
+        cliente_ids = db.session.execute(db.select(Cliente.id).order_by(Cliente.id)).scalars().all()
+    else:
+        cliente_ids = sorted(set(cliente_ids))
+
+    inicio_execucao = time.monotonic()
+    processados = registros = 0
+    while processados < len(cliente_ids):
+        lote = cliente_ids[processados:processados + tamanho_lote]
+        registros += reconstruir_lote_extrato(lote, manter_saldo=manter_saldo)
+        db.session.commit()
+
+        processados += len(lote)
+        if progresso:
+            progresso(processados, len(cliente_ids))
+        if limite_segundos and time.monotonic() - inicio_execucao > limite_segundos:
+            break
+
+    concluido = processados >= len(cliente_ids)
+    return {
+        'concluido': concluido,
+        'proximo_id': None if concluido else cliente_ids[processados],
+        'clientes_processados': processados,
+        'total_clientes': len(cliente_ids),
+        'registros': registros
+    }
@@ -0,0 +1,374 @@
+import time
+from datetime import timedelta
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+from caixa.extensoes import db
+from caixa.models import Venda, Pagamento, FluxoCaixa
+from caixa.paralelo import mapear_particoes
+from caixa.periodos import como_data, filtro_dia, filtro_periodo
+from caixa.tarefas import tipo_tarefa
+
+CAMPOS_FLUXO = ('total_vendas_vista', 'total_vendas_prazo', 'total_recebimentos', 'saldo_final')
+
+# Quantidade de registros gravados por comando no recálculo em lote
+TAMANHO_LOTE_FLUXO = 1000
+
+
+def fluxo_incremental_ativo():
+    """Indica se o fluxo de caixa é mantido por deltas (padrão) ou por recálculo"""
+    return current_app.config.get('FLUXO_CAIXA_INCREMENTAL', True)
+
+
+# ========== MODO INCREMENTAL (DELTAS) ==========
+
+def aplicar_delta_fluxo(data, caixa_id, vendas_vista=0, vendas_prazo=0, recebimentos=0):
+    """
+    Soma os valores de uma venda/pagamento ao registro de fluxo do dia.
+
+    A atualização é feita no banco (UPDATE ... SET total = total + :v), então
+    o custo não depende de quantas vendas o dia já tem e duas transações
+    simultâneas não sobrescrevem o valor uma da outra.
+    """
+    stmt = (
+        update(FluxoCaixa)
+        .where(FluxoCaixa.data == data, FluxoCaixa.caixa_id == caixa_id)
+        .values(
+            total_vendas_vista=db.func.coalesce(FluxoCaixa.total_vendas_vista, 0) + vendas_vista,
+            total_vendas_prazo=db.func.coalesce(FluxoCaixa.total_vendas_prazo, 0) + vendas_prazo,
+            total_recebimentos=db.func.coalesce(FluxoCaixa.total_recebimentos, 0) + recebimentos,
+            saldo_final=db.func.coalesce(FluxoCaixa.saldo_final, 0) + recebimentos
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    resultado = db.session.execute(stmt)
+    if resultado.rowcount:
+        return
+
+    # Primeiro movimento do dia: criar o registro já com os valores
+    try:
+        with db.session.begin_nested():
+            db.session.add(FluxoCaixa(
+                data=data,
+                saldo_inicial=0,
+                total_vendas_vista=vendas_vista,
+                total_vendas_prazo=vendas_prazo,
+                total_recebimentos=recebimentos,
+                saldo_final=recebimentos,
+                caixa_id=caixa_id
+            ))
+    except IntegrityError:
+        # Outra transação criou o registro ao mesmo tempo
+        db.session.execute(stmt)
+
+
+def registrar_venda_fluxo(venda):
+    """Aplica ao fluxo de caixa os valores de uma venda recém-criada"""
+    data = venda.data_venda.date()
+    if venda.tipo_pagamento == 'vista':
+        aplicar_delta_fluxo(data, venda.caixa_id, vendas_vista=venda.valor_total)
+    elif venda.tipo_pagamento == 'prazo':
+        aplicar_delta_fluxo(data, venda.caixa_id, vendas_prazo=venda.valor_total)
+
+
+def registrar_pagamento_fluxo(pagamento, venda):
+    """Aplica ao fluxo de caixa um pagamento (contabilizado no caixa da venda)"""
+    aplicar_delta_fluxo(
+        pagamento.data_pagamento.date(),
+        venda.caixa_id,
+        recebimentos=pagamento.valor
+    )
+
+
+# ========== RECÁLCULO COMPLETO (REPARO) ==========
+
+def calcular_totais_dia(data, caixa_id=None):
+    """
+    Calcula do zero os totais de um dia a partir de vendas e pagamentos
+    """
+    vendas_dia = Venda.query.filter(
+        filtro_dia(Venda.data_venda, data)
+    )
+    if caixa_id:
+        vendas_dia = vendas_dia.filter_by(caixa_id=caixa_id)
+    vendas_dia = vendas_dia.all()
+
+    pagamentos_dia = Pagamento.query.join(Venda).filter(
+        filtro_dia(Pagamento.data_pagamento, data)
+    )
+    if caixa_id:
+        pagamentos_dia = pagamentos_dia.filter(Venda.caixa_id == caixa_id)
+    pagamentos_dia = pagamentos_dia.all()
+
+    return {
+        'total_vendas_vista': sum(v.valor_total for v in vendas_dia if v.tipo_pagamento == 'vista'),
+        'total_vendas_prazo': sum(v.valor_total for v in vendas_dia if v.tipo_pagamento == 'prazo'),
+        'total_recebimentos': sum(p.valor for p in pagamentos_dia)
+    }
+
+
+def atualizar_fluxo_caixa(data, caixa_id=None):
+    """
+    Atualiza ou cria o registro de fluxo de caixa para uma data específica,
+    recalculando todos os valores do dia (caminho de reparo)
+    """
+    # Se não especificar caixa, usar o caixa do usuário atual
+    if not caixa_id and not current_user.is_owner:
+        caixa_id = current_user.caixa_id
+
+    # Buscar ou criar fluxo de caixa para esta data
+    fluxo = FluxoCaixa.query.filter_by(
+        data=data,
+        caixa_id=caixa_id
+    ).first()
+
+    if not fluxo:
+        fluxo = FluxoCaixa(
+            data=data,
+            saldo_inicial=0,
+            total_vendas_vista=0,
+            total_vendas_prazo=0,
+            total_recebimentos=0,
+            saldo_final=0,
+            caixa_id=caixa_id
+        )
+        db.session.add(fluxo)
+
+    totais = calcular_totais_dia(data, caixa_id)
+
+    # Atualizar fluxo
+    fluxo.total_vendas_vista = totais['total_vendas_vista']
+    fluxo.total_vendas_prazo = totais['total_vendas_prazo']
+    fluxo.total_recebimentos = totais['total_recebimentos']
+
+    # Calcular saldo final (saldo_inicial + recebimentos)
+    # Nota: saldo_inicial pode ser ajustado manualmente ou vir do dia anterior
+    fluxo.saldo_final = (fluxo.saldo_inicial or 0) + totais['total_recebimentos']
+
+    return fluxo
+
+
+def atualizar_fluxo_mes(data_inicio, data_fim, caixa_id=None):
+    """
+    Atualiza o fluxo de caixa para um período
+    """
+    data_atual = data_inicio
+    while data_atual <= data_fim:
+        atualizar_fluxo_caixa(data_atual, caixa_id)
+        data_atual += timedelta(days=1)
+
+    db.session.commit()
+
+
+# ========== RECÁLCULO EM LOTE (PERÍODOS LONGOS) ==========
+
+def calcular_totais_periodo(data_inicio, data_fim, caixa_id=None):
+    """
+    Calcula os totais de todos os (caixa, dia) do período com duas consultas
+    agregadas (GROUP BY caixa, dia) em vez de duas consultas por caixa e dia.
+
+    Retorna {(caixa_id, data): {'total_vendas_vista': ..., ...}}.
+    """
+    dia_venda = db.func.date(Venda.data_venda)
+    vendas = db.session.query(
+        Venda.caixa_id,
+        dia_venda,
+        db.func.sum(case((Venda.tipo_pagamento == 'vista', Venda.valor_total), else_=0)),
+        db.func.sum(case((Venda.tipo_pagamento == 'prazo', Venda.valor_total), else_=0))
+    ).filter(
+        filtro_periodo(Venda.data_venda, data_inicio, data_fim),
+        Venda.caixa_id.isnot(None)
+    )
+    if caixa_id:
+        vendas = vendas.filter(Venda.caixa_id == caixa_id)
+    vendas = vendas.group_by(Venda.caixa_id, dia_venda)
+
+    dia_pagamento = db.func.date(Pagamento.data_pagamento)
+    pagamentos = db.session.query(
+        Venda.caixa_id,
+        dia_pagamento,
+        db.func.sum(Pagamento.valor)
+    ).join(Venda).filter(
+        filtro_periodo(Pagamento.data_pagamento, data_inicio, data_fim),
+        Venda.caixa_id.isnot(None)
+    )
+    if caixa_id:
+        pagamentos = pagamentos.filter(Venda.caixa_id == caixa_id)
+    pagamentos = pagamentos.group_by(Venda.caixa_id, dia_pagamento)
+
+    def vazio():
+        return {'total_vendas_vista': 0, 'total_vendas_prazo': 0, 'total_recebimentos': 0}
+
+    totais = {}
+    for id_caixa, dia, vista, prazo in vendas:
+        chave = (id_caixa, como_data(dia))
+        totais.setdefault(chave, vazio())
+        totais[chave]['total_vendas_vista'] = vista or 0
+        totais[chave]['total_vendas_prazo'] = prazo or 0
+
+    for id_caixa, dia, recebido in pagamentos:
+        chave = (id_caixa, como_data(dia))
+        totais.setdefault(chave, vazio())
+        totais[chave]['total_recebimentos'] = recebido or 0
+
+    return totais
+
+
+def _gravar_em_lotes(stmt, linhas):
+    for i in range(0, len(linhas), TAMANHO_LOTE_FLUXO):
+        db.session.execute(stmt, linhas[i:i + TAMANHO_LOTE_FLUXO])
+
+
+def recalcular_janela_fluxo(data_inicio, data_fim, caixa_id=None, totais=None):
+    """
+    Recalcula e grava (upsert) os registros de fluxo de uma janela de dias.
+
+    Registros existentes sem movimento no período são zerados; só são criados
+    registros novos para (caixa, dia) que tiveram vendas ou pagamentos.
+    totais: resultado de calcular_totais_periodo para a janela, se já calculado.
+    Retorna a quantidade de registros gravados.
+    """
+    if totais is None:
+        totais = calcular_totais_periodo(data_inicio, data_fim, caixa_id)
+
+    existentes = db.session.query(
+        FluxoCaixa.id, FluxoCaixa.caixa_id, FluxoCaixa.data, FluxoCaixa.saldo_inicial
+    ).filter(
+        FluxoCaixa.data >= data_inicio,
+        FluxoCaixa.data <= data_fim,
+        FluxoCaixa.caixa_id.isnot(None)
+    )
+    if caixa_id:
+        existentes = existentes.filter(FluxoCaixa.caixa_id == caixa_id)
+
+    atualizacoes = []
+    chaves_existentes = set()
+    for id_fluxo, id_caixa, dia, saldo_inicial in existentes:
+        chave = (id_caixa, dia)
+        chaves_existentes.add(chave)
+        valores = totais.get(chave) or {'total_vendas_vista': 0, 'total_vendas_prazo': 0, 'total_recebimentos': 0}
+        atualizacoes.append(dict(
+            valores,
+            id=id_fluxo,
+            saldo_final=(saldo_inicial or 0) + valores['total_recebimentos']
+        ))
+
+    insercoes = [
+        dict(valores, caixa_id=id_caixa, data=dia, saldo_inicial=0, saldo_final=valores['total_recebimentos'])
+        for (id_caixa, dia), valores in totais.items()
+        if (id_caixa, dia) not in chaves_existentes
+    ]
+
+    _gravar_em_lotes(update(FluxoCaixa), atualizacoes)
+    _gravar_em_lotes(insert(FluxoCaixa), insercoes)
+
+    return len(atualizacoes) + len(insercoes)
+
+
+def recalcular_fluxo_em_lote(data_inicio, data_fim, caixa_id=None, dias_por_janela=31,
+                             limite_segundos=None, progresso=None):
+    """
+    Recalcula o fluxo de caixa de um período longo, janela por janela.
+
+    Cada janela é gravada e confirmada (commit) separadamente, então o trabalho
+    já feito não se perde. Se limite_segundos for atingido, para na próxima
+    janela e devolve 'proximo_inicio' para retomar de onde parou.
+    progresso(dias_processados, total_dias) é chamado após cada janela.
+    Os totais das janelas são calculados em paralelo (mapear_particoes);
+    a gravação fica neste processo, janela a janela.
+    """
+    inicio_execucao = time.monotonic()
+    total_dias = (data_fim - data_inicio).days + 1
+    registros = 0
+
+    janelas = []
+    janela_inicio = data_inicio
+    while janela_inicio <= data_fim:
+        janela_fim = min(janela_inicio + timedelta(days=dias_por_janela - 1), data_fim)
+        janelas.append((janela_inicio, janela_fim, caixa_id))
+        janela_inicio = janela_fim + timedelta(days=1)
+
+    janela_inicio = data_inicio
+    parciais = mapear_particoes(calcular_totais_periodo, janelas)
+    try:
+        for (_, janela_fim, _), totais in zip(janelas, parciais):
+            registros += recalcular_janela_fluxo(janela_inicio, janela_fim, caixa_id, totais)
+            db.session.commit()
+
+            janela_inicio = janela_fim + timedelta(days=1)
+            if progresso:
+                progresso((janela_fim - data_inicio).days + 1, total_dias)
+
+            if limite_segundos and time.monotonic() - inicio_execucao > limite_segundos:
+                break
+    finally:
+        parciais.close()
+
+    concluido = janela_inicio > data_fim
+    return {
+        'concluido': concluido,
+        'proximo_inicio': None if concluido else janela_inicio,
+        'dias_processados': (min(janela_inicio, data_fim + timedelta(days=1)) - data_inicio).days,
+        'total_dias': total_dias,
+        'registros': registros
+    }
+
+
+@tipo_tarefa('recalcular_fluxo')
+def tarefa_recalcular_fluxo(inicio, fim, caixa_id=None, limite_segundos=None, progresso=None):
+    """Recálculo do fluxo pela fila de tarefas; no worker roda sem limite de tempo"""
+    return recalcular_fluxo_em_lote(inicio, fim, caixa_id=caixa_id, limite_segundos=limite_segundos,
+                                    progresso=progresso)
+
+
+# ========== VERIFICAÇÃO DE CONSISTÊNCIA ==========
+
+def _divergencias_fluxo(fluxo, totais):
+    saldo_inicial = (fluxo.saldo_inicial or 0) if fluxo else 0
+    esperado = dict(totais, saldo_final=saldo_inicial + totais['total_recebimentos'])
+
+    divergencias = {}
+    for campo in CAMPOS_FLUXO:
+        registrado = (getattr(fluxo, campo) or 0) if fluxo else 0
+        # Dinheiro é exato (centavos inteiros): qualquer diferença é divergência
+        if registrado != esperado[campo]:
+            divergencias[campo] = {
+                'registrado': registrado,
+                'calculado': esperado[campo]
+            }
+
+    return divergencias
+
+
+def verificar_fluxo_caixa(data, caixa_id):
+    """
+    Compara o registro incremental de um dia com um recálculo completo.
+
+    Retorna um dicionário com os campos divergentes
+    ({campo: {'registrado': x, 'calculado': y}}); vazio se estiver consistente.
+    """
+    fluxo = FluxoCaixa.query.filter_by(data=data, caixa_id=caixa_id).first()
+    return _divergencias_fluxo(fluxo, calcular_totais_dia(data, caixa_id))
+
+
+def verificar_fluxo_dia(data, caixa_ids):
+    """
+    verificar_fluxo_caixa de vários caixas com as mesmas três consultas
+    (totais agregados por caixa e registros do dia), em vez de três por caixa.
+
+    Retorna {caixa_id: divergencias} só com os caixas divergentes.
+    """
+    fluxos = {f.caixa_id: f for f in FluxoCaixa.query.filter(
+        FluxoCaixa.data == data, FluxoCaixa.caixa_id.in_(caixa_ids)
+    )}
+    totais = calcular_totais_periodo(data, data)
+    vazio = {'total_vendas_vista': 0, 'total_vendas_prazo': 0, 'total_recebimentos': 0}
+
+    divergencias = {}
+    for caixa_id in caixa_ids:
+        diferencas = _divergencias_fluxo(fluxos.get(caixa_id), totais.get((caixa_id, data), vazio))
+        if diferencas:
+            divergencias[caixa_id] = diferencas
+    return divergencias
@@ -0,0 +1,423 @@
+import csv
+import json
+import math
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import case, exists, insert, literal, select
+
+from caixa.dinheiro import centavos, reais
+from caixa.extensoes import db
+from caixa.extrato import DEBITO, CREDITO, reconstruir_extratos
+from caixa.models import (Cliente, Produto, Venda, ItemVenda, Pagamento, Caixa, User, LancamentoCliente,
+                          agora_brasil)
+
+# Linhas gravadas por transação (um INSERT com vários valores por tabela)
+TAMANHO_LOTE_IMPORTACAO = 5000
+
+TIPOS_PRODUTO = ('placa_carro', 'placa_moto', 'placa_caminhao', 'outro')
+TIPOS_PAGAMENTO = ('vista', 'prazo')
+
+class RegistroInvalido(ValueError):
+    """Linha do arquivo que não pode ser importada (vai para o arquivo de rejeitados)"""
+
+
+class Rejeitados:
+    """Arquivo JSONL com as linhas rejeitadas e o motivo; só é criado se houver rejeição"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.quantidade = 0
+        self._arquivo = None
+
+    def registrar(self, linha, erro, dados):
+        if self._arquivo is None:
+            self._arquivo = open(self.caminho, 'w', encoding='utf-8')
+        self._arquivo.write(json.dumps({'linha': linha, 'erro': erro, 'dados': dados},
+                                       ensure_ascii=False, default=str) + '\n')
+        self.quantidade += 1
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def ler_registros(caminho):
+    """
+    Lê um arquivo CSV (com cabeçalho) ou JSON Lines (.jsonl/.ndjson) e gera
+    (número da linha, registro, erro de leitura ou None).
+    """
+    if caminho.endswith(('.jsonl', '.ndjson')):
+        with open(caminho, encoding='utf-8') as arquivo:
+            for numero, linha in enumerate(arquivo, 1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except ValueError as erro:
+                    yield numero, {'conteudo': linha.rstrip('\n')}, f'JSON inválido: {erro}'
+                    continue
+                if not isinstance(registro, dict):
+                    yield numero, {'conteudo': registro}, 'cada linha deve ser um objeto JSON'
+                    continue
+                yield numero, registro, None
+    else:
+        with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+            for numero, registro in enumerate(csv.DictReader(arquivo), 2):
+                yield numero, registro, None
+
+
+# ========== CONVERSÃO E VALIDAÇÃO DE CAMPOS ==========
+
+def _vazio(valor):
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+
+def _texto(registro, campo, obrigatorio=False, minimo=0, maximo=None):
+    valor = registro.get(campo)
+    if _vazio(valor):
+        if obrigatorio:
+            raise RegistroInvalido(f'{campo} é obrigatório')
+        return None
+    valor = str(valor).strip()
+    if len(valor) < minimo or (maximo and len(valor) > maximo):
+        raise RegistroInvalido(f'{campo} deve ter entre {minimo} e {maximo} caracteres')
+    return valor
+
+
+def _numero(registro, campo, tipo=float, padrao=None, minimo=None, obrigatorio=False):
+    valor = registro.get(campo)
+    if _vazio(valor):
+        if obrigatorio:
+            raise RegistroInvalido(f'{campo} é obrigatório')
+        return padrao
+    try:
+        if isinstance(valor, str):
+            valor = valor.strip().replace(',', '.') if tipo is float else valor.strip()
+        numero = tipo(valor)
+    except (TypeError, ValueError):
+        raise RegistroInvalido(f'{campo} inválido: {valor!r}')
+    if tipo is float and not math.isfinite(numero):
+        raise RegistroInvalido(f'{campo} inválido: {valor!r}')
+    if tipo is int and isinstance(valor, float) and valor != numero:
+        raise RegistroInvalido(f'{campo} deve ser inteiro: {valor!r}')
+    if minimo is not None and numero < minimo:
+        raise RegistroInvalido(f'{campo} deve ser no mínimo {minimo}')
+    return numero
+
+
+def _data_hora(registro, campo, obrigatorio=False):
+    """Aceita AAAA-MM-DD ou data e hora ISO; guarda sem fuso, como as vendas do sistema"""
+    valor = registro.get(campo)
+    if _vazio(valor):
+        if obrigatorio:
+            raise RegistroInvalido(f'{campo} é obrigatório')
+        return None
+    try:
+        return datetime.fromisoformat(str(valor).strip()).replace(tzinfo=None)
+    except ValueError:
+        raise RegistroInvalido(f'{campo} inválido: {valor!r}')
+
+
+def _opcao(registro, campo, opcoes, padrao=None):
+    valor = _texto(registro, campo) or padrao
+    if valor not in opcoes:
+        raise RegistroInvalido(f'{campo} deve ser um de: {", ".join(opcoes)}')
+    return valor
+
+
+def _referencia(registro, campo, existentes, obrigatorio=False):
+    valor = _numero(registro, campo, tipo=int, obrigatorio=obrigatorio)
+    if valor is not None and valor not in existentes:
+        raise RegistroInvalido(f'{campo} {valor} não existe')
+    return valor
+
+
+def _ids(modelo):
+    return set(db.session.execute(db.select(modelo.id)).scalars())
+
+
+def validar_cliente(registro):
+    return {
+        'nome': _texto(registro, 'nome', obrigatorio=True, maximo=100),
+        'telefone': _texto(registro, 'telefone', maximo=20),
+        'email': _texto(registro, 'email', maximo=120),
+        'tipo_pagamento': _opcao(registro, 'tipo_pagamento', TIPOS_PAGAMENTO, padrao='vista'),
+        'limite_credito': _numero(registro, 'limite_credito', padrao=100000.00, minimo=0),
+        'saldo_devedor': _numero(registro, 'saldo_devedor', padrao=0, minimo=0),
+        'observacoes': _texto(registro, 'observacoes'),
+    }
+
+
+def validar_produto(registro):
+    return {
+        'tipo': _opcao(registro, 'tipo', TIPOS_PRODUTO),
+        'descricao': _texto(registro, 'descricao', obrigatorio=True, minimo=3, maximo=200),
+        'preco': _numero(registro, 'preco', obrigatorio=True, minimo=0.01),
+        'estoque': _numero(registro, 'estoque', tipo=int, padrao=0, minimo=0),
+    }
+
+
+# ========== GRAVAÇÃO EM LOTES ==========
+
+def _ajustar_sequencia(modelo):
+    """No PostgreSQL, ids informados no arquivo não avançam a sequência do id"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    tabela = modelo.__tablename__
+    db.session.execute(db.text(
+        f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), "
+        f"(SELECT COALESCE(MAX(id), 1) FROM {tabela}))"
+    ))
+
+
+def _importar_cadastro(modelo, validar, caminho, rejeitados, tamanho_lote, progresso):
+    """
+    Importa clientes ou produtos. A coluna id é opcional; quando informada é
+    mantida (para que o arquivo de vendas possa referenciar os mesmos ids).
+    Ou todas as linhas têm id ou nenhuma, para não colidir com os ids gerados.
+    """
+    existentes = _ids(modelo)
+    criado_em = agora_brasil()
+    lote = []
+    resultado = {'lidos': 0, 'importados': 0}
+    com_id = None
+
+    def gravar():
+        db.session.execute(insert(modelo), lote)
+        db.session.commit()
+        resultado['importados'] += len(lote)
+        lote.clear()
+        if progresso:
+            progresso(resultado['importados'])
+
+    for numero, registro, erro in ler_registros(caminho):
+        resultado['lidos'] += 1
+        try:
+            if erro:
+                raise RegistroInvalido(erro)
+            dados = validar(registro)
+            id_registro = _numero(registro, 'id', tipo=int, minimo=1)
+            if com_id is None:
+                com_id = id_registro is not None
+            if com_id != (id_registro is not None):
+                raise RegistroInvalido('id deve ser informado em todas as linhas ou em nenhuma')
+            if id_registro is not None:
+                if id_registro in existentes:
+                    raise RegistroInvalido(f'id {id_registro} já existe')
+                existentes.add(id_registro)
+                dados['id'] = id_registro
+        except RegistroInvalido as erro_validacao:
+            rejeitados.registrar(numero, str(erro_validacao), registro)
+            continue
+
+        dados['created_at'] = criado_em
+        lote.append(dados)
+        if len(lote) >= tamanho_lote:
+            gravar()
+
+    if lote:
+        gravar()
+    if com_id:
+        _ajustar_sequencia(modelo)
+        db.session.commit()
+    resultado['rejeitados'] = rejeitados.quantidade
+    return resultado
+
+
+def _lancar_saldos_anteriores():
+    """Saldo devedor trazido no arquivo vira o lançamento 'Saldo anterior' do extrato (um INSERT ... SELECT)"""
+    sem_extrato = ~exists().where(LancamentoCliente.cliente_id == Cliente.id)
+    db.session.execute(insert(LancamentoCliente).from_select(
+        ['cliente_id', 'data', 'tipo', 'valor', 'saldo', 'descricao'],
+        select(
+            Cliente.id, Cliente.created_at,
+            case((Cliente.saldo_devedor > 0, DEBITO), else_=CREDITO),
+            db.func.abs(Cliente.saldo_devedor), Cliente.saldo_devedor, literal('Saldo anterior')
+        ).where(Cliente.saldo_devedor != 0, sem_extrato)
+    ))
+    db.session.commit()
+
+
+def importar_clientes(caminho, rejeitados, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, progresso=None):
+    resultado = _importar_cadastro(Cliente, validar_cliente, caminho, rejeitados, tamanho_lote, progresso)
+    if resultado['importados']:
+        _lancar_saldos_anteriores()
+    return resultado
+
+
+def importar_produtos(caminho, rejeitados, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, progresso=None):
+    return _importar_cadastro(Produto, validar_produto, caminho, rejeitados, tamanho_lote, progresso)
+
+
+# ========== VENDAS HISTÓRICAS ==========
+
+def _agrupar_vendas(caminho):
+    """
+    Gera (número da primeira linha, registros, erro) por venda.
+
+    JSONL: um objeto por venda com a lista 'itens' (formato da exportação).
+    CSV: uma linha por item; linhas seguidas com o mesmo 'id' formam uma venda.
+    """
+    if caminho.endswith(('.jsonl', '.ndjson')):
+        for numero, registro, erro in ler_registros(caminho):
+            yield numero, [registro], erro
+        return
+
+    def chave(linha):
+        numero, registro, _ = linha
+        return registro.get('id') or f'linha-{numero}'
+
+    for _, linhas in groupby(ler_registros(caminho), key=chave):
+        linhas = list(linhas)
+        yield linhas[0][0], [registro for _, registro, _ in linhas], None
+
+
+def validar_venda(registros, referencias):
+    """Converte os registros de uma venda em (venda, itens, pagamento ou None)"""
+    cabecalho = registros[0]
+    itens_brutos = cabecalho.get('itens') if 'itens' in cabecalho else registros
+    if not isinstance(itens_brutos, list):
+        raise RegistroInvalido('itens deve ser uma lista')
+
+    itens = []
+    for item in itens_brutos:
+        if not isinstance(item, dict):
+            raise RegistroInvalido('cada item deve ser um objeto')
+        if _vazio(item.get('produto_id')) and 'itens' not in cabecalho:
+            continue  # venda sem itens exportada como uma linha só
+        quantidade = _numero(item, 'quantidade', tipo=int, padrao=1, minimo=1)
+        preco = _numero(item, 'preco_unitario', obrigatorio=True, minimo=0)
+        itens.append({
+            'produto_id': _referencia(item, 'produto_id', referencias['produtos'], obrigatorio=True),
+            'quantidade': quantidade,
+            'preco_unitario': preco,
+            'subtotal': _numero(item, 'subtotal', padrao=reais(centavos(preco) * quantidade), minimo=0),
+        })
+
+    # Comparações em centavos inteiros, como o valor é gravado (Dinheiro)
+    soma_itens = sum(centavos(item['subtotal']) for item in itens)
+    valor_total = _numero(cabecalho, 'valor_total', padrao=reais(soma_itens), minimo=0)
+    if itens and centavos(valor_total) != soma_itens:
+        raise RegistroInvalido(f'valor_total {valor_total} difere da soma dos itens {reais(soma_itens)}')
+
+    tipo_pagamento = _opcao(cabecalho, 'tipo_pagamento', TIPOS_PAGAMENTO)
+    valor_pago = _numero(cabecalho, 'valor_pago', padrao=valor_total if tipo_pagamento == 'vista' else 0,
+                         minimo=0)
+    pago_centavos, total_centavos = centavos(valor_pago), centavos(valor_total)
+    if pago_centavos > total_centavos:
+        raise RegistroInvalido('valor_pago maior que valor_total')
+
+    data_venda = _data_hora(cabecalho, 'data_venda', obrigatorio=True)
+    caixa_id = _referencia(cabecalho, 'caixa_id', referencias['caixas'])
+    venda = {
+        'data_venda': data_venda,
+        'valor_total': valor_total,
+        'valor_pago': valor_pago,
+        'status': 'pago' if pago_centavos >= total_centavos else 'pendente',
+        'tipo_pagamento': tipo_pagamento,
+        'observacoes': _texto(cabecalho, 'observacoes'),
+        'cliente_id': _referencia(cabecalho, 'cliente_id', referencias['clientes'], obrigatorio=True),
+        'vendedor_id': _referencia(cabecalho, 'vendedor_id', referencias['usuarios']),
+        'caixa_id': caixa_id,
+    }
+
+    pagamento = None
+    if valor_pago > 0:
+        pagamento = {
+            'valor': valor_pago,
+            'data_pagamento': _data_hora(cabecalho, 'data_pagamento') or data_venda,
+            'forma_pagamento': _texto(cabecalho, 'forma_pagamento', maximo=50) or 'dinheiro',
+            'recebedor_id': venda['vendedor_id'],
+        }
+    return venda, itens, pagamento
+
+
+def importar_vendas(caminho, rejeitados, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, progresso=None,
+                    atualizar_saldos=True):
+    """
+    Importa vendas históricas com itens e o pagamento de valor_pago.
+
+    Cada lote de até tamanho_lote itens é gravado com um INSERT por tabela
+    (os ids das vendas voltam pelo RETURNING) e confirmado em seguida.
+    O estoque não é baixado. Ao final, o extrato dos clientes das vendas é
+    reconstruído e o valor em aberto entra no saldo devedor
+    (atualizar_saldos=False se o arquivo de clientes já trouxe o
+    saldo_devedor: o saldo é mantido e o extrato ganha um ajuste de saldo
+    anterior). Devolve também o período das datas importadas
+    ('inicio'/'fim') para o recálculo do fluxo e dos resumos.
+    """
+    referencias = {
+        'clientes': _ids(Cliente),
+        'produtos': _ids(Produto),
+        'caixas': _ids(Caixa),
+        'usuarios': _ids(User),
+    }
+    resultado = {'lidos': 0, 'importados': 0, 'itens': 0, 'inicio': None, 'fim': None}
+    vendas, itens, pagamentos = [], [], []
+    clientes_afetados = set()
+
+    def gravar():
+        # INSERT da tabela (Core): evita o processamento por linha do insert em lote do ORM
+        ids = db.session.execute(
+            insert(Venda.__table__).returning(Venda.id, sort_by_parameter_order=True), vendas
+        ).scalars().all()
+        for item in itens:
+            item['venda_id'] = ids[item.pop('_venda')]
+        for pagamento in pagamentos:
+            pagamento['venda_id'] = ids[pagamento.pop('_venda')]
+        if itens:
+            db.session.execute(insert(ItemVenda.__table__), itens)
+        if pagamentos:
+            db.session.execute(insert(Pagamento.__table__), pagamentos)
+        db.session.commit()
+
+        resultado['importados'] += len(vendas)
+        resultado['itens'] += len(itens)
+        vendas.clear()
+        itens.clear()
+        pagamentos.clear()
+        if progresso:
+            progresso(resultado['importados'])
+
+    def ampliar_periodo(momento):
+        dia = momento.date()
+        resultado['inicio'] = min(resultado['inicio'] or dia, dia)
+        resultado['fim'] = max(resultado['fim'] or dia, dia)
+
+    for numero, registros, erro in _agrupar_vendas(caminho):
+        resultado['lidos'] += 1
+        try:
+            if erro:
+                raise RegistroInvalido(erro)
+            venda, itens_venda, pagamento = validar_venda(registros, referencias)
+        except RegistroInvalido as erro_validacao:
+            for deslocamento, registro in enumerate(registros):
+                rejeitados.registrar(numero + deslocamento, str(erro_validacao), registro)
+            continue
+
+        posicao = len(vendas)
+        vendas.append(venda)
+        itens.extend(dict(item, _venda=posicao) for item in itens_venda)
+        ampliar_periodo(venda['data_venda'])
+        if pagamento:
+            pagamentos.append(dict(pagamento, _venda=posicao))
+            ampliar_periodo(pagamento['data_pagamento'])
+        clientes_afetados.add(venda['cliente_id'])
+
+        if len(itens) + len(vendas) >= tamanho_lote:
+            gravar()
+
+    if vendas:
+        gravar()
+    if clientes_afetados:
+        reconstruir_extratos(clientes_afetados, manter_saldo=not atualizar_saldos)
+
+    resultado['rejeitados'] = rejeitados.quantidade
+    return resultado
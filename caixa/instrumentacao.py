@@ -0,0 +1,265 @@
+import heapq
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Limites dos histogramas (segundos e quantidade de comandos SQL)
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+
+# Tamanho máximo do SQL guardado para o log de requisições lentas
+TAMANHO_SQL_LOG = 300
+
+log_lentas = logging.getLogger('caixa.requisicoes_lentas')
+
+
+class OrcamentoConsultasExcedido(RuntimeError):
+    """Uma requisição executou mais comandos SQL do que o orçamento permite"""
+
+
+class OrcamentoConsultas:
+    """
+    Conta os comandos SQL executados em cada requisição e compara com um
+    orçamento (SQL_ORCAMENTO_CONSULTAS, com exceções por endpoint em
+    SQL_ORCAMENTO_POR_ROTA; None isenta o endpoint).
+
+    Em modo estrito (padrão quando TESTING=True) a requisição falha ao
+    estourar o orçamento, para que regressões N+1 sejam pegas nos testes;
+    fora dele o excesso só é registrado no log.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Engine, 'before_cursor_execute', _contar_consulta):
+            event.listen(Engine, 'before_cursor_execute', _contar_consulta)
+
+        app.before_request(_iniciar_contagem)
+        app.after_request(self._verificar_orcamento)
+        app.extensions['orcamento_consultas'] = self
+
+    def _verificar_orcamento(self, response):
+        from flask import current_app
+
+        orcamento = current_app.config.get('SQL_ORCAMENTO_POR_ROTA', {}).get(
+            request.endpoint, current_app.config.get('SQL_ORCAMENTO_CONSULTAS')
+        )
+        consultas = g.get('consultas_sql', 0)
+        if not orcamento or consultas <= orcamento:
+            return response
+
+        mensagem = (f'{request.endpoint} executou {consultas} comandos SQL '
+                    f'(orçamento: {orcamento})')
+        if current_app.config.get('SQL_ORCAMENTO_ESTRITO', current_app.testing):
+            raise OrcamentoConsultasExcedido(mensagem)
+        current_app.logger.warning(mensagem)
+        return response
+
+
+def _iniciar_contagem():
+    g.consultas_sql = 0
+
+
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.consultas_sql = g.get('consultas_sql', 0) + 1
+
+
+def consultas_na_requisicao():
+    """Quantidade de comandos SQL executados até agora na requisição atual"""
+    return g.get('consultas_sql', 0)
+
+
+# ========== TEMPOS POR REQUISIÇÃO E MÉTRICAS ==========
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus (buckets le=..., soma e contagem)"""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        else:
+            self.contagens[-1] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, quantidade in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += quantidade
+            yield f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}'
+        yield f'{nome}_sum{{{rotulos}}} {self.soma:.6f}'
+        yield f'{nome}_count{{{rotulos}}} {self.total}'
+
+
+class MetricasRequisicoes:
+    """
+    Mede cada requisição: quantidade e tempo dos comandos SQL (eventos do
+    engine), tempo de renderização dos templates e tempo total.
+
+    - Cabeçalho Server-Timing (db, render, total) para ver no navegador;
+    - log estruturado (logger caixa.requisicoes_lentas) das requisições
+      acima de REQUISICAO_LENTA_MS, com os comandos SQL mais lentos;
+    - histogramas por endpoint em /admin/metrics (formato texto do Prometheus).
+
+    Os histogramas são por processo: com vários workers, cada um expõe os seus.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._duracao = {}
+        self._tempo_sql = {}
+        self._consultas = {}
+        self._respostas = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICAS_ATIVAS', True):
+            return
+        if not event.contains(Engine, 'before_cursor_execute', _iniciar_consulta):
+            event.listen(Engine, 'before_cursor_execute', _iniciar_consulta)
+            event.listen(Engine, 'after_cursor_execute', _finalizar_consulta)
+        before_render_template.connect(_iniciar_render, app)
+        template_rendered.connect(_finalizar_render, app)
+
+        app.before_request(_iniciar_medicao)
+        app.after_request(self._finalizar_medicao)
+        app.teardown_request(self._registrar_falha)
+        app.extensions['metricas'] = self
+
+    def _finalizar_medicao(self, response):
+        from flask import current_app
+
+        if 'inicio_requisicao' not in g:
+            return response
+        total = time.perf_counter() - g.pop('inicio_requisicao')
+        tempo_sql = g.get('tempo_sql', 0)
+        tempo_render = g.get('tempo_render', 0)
+        consultas = consultas_na_requisicao()
+
+        if current_app.config.get('SERVER_TIMING_ATIVO', True):
+            response.headers['Server-Timing'] = (
+                f'db;dur={tempo_sql * 1000:.1f};desc="{consultas} SQL", '
+                f'render;dur={tempo_render * 1000:.1f}, total;dur={total * 1000:.1f}'
+            )
+
+        self.registrar(request.endpoint, response.status_code, total, tempo_sql, consultas)
+
+        limite_ms = current_app.config.get('REQUISICAO_LENTA_MS', 500)
+        if limite_ms and total * 1000 >= limite_ms:
+            log_lentas.warning('Requisição lenta: %s %s (%.0f ms)', request.method, request.path, total * 1000, extra={
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'sql_ms': round(tempo_sql * 1000, 1),
+                'render_ms': round(tempo_render * 1000, 1),
+                'consultas': consultas,
+                'mais_lentas': [{'ms': round(duracao * 1000, 1), 'sql': sql}
+                                for duracao, _, sql in sorted(g.get('consultas_lentas', []), reverse=True)],
+            })
+        return response
+
+    def _registrar_falha(self, erro):
+        # Exceção não tratada: o after_request não rodou
+        if erro is not None and 'inicio_requisicao' in g:
+            total = time.perf_counter() - g.pop('inicio_requisicao')
+            self.registrar(request.endpoint, 500, total, g.get('tempo_sql', 0), consultas_na_requisicao())
+
+    def registrar(self, endpoint, status, total, tempo_sql, consultas):
+        endpoint = endpoint or 'desconhecido'
+        with self._lock:
+            if endpoint not in self._duracao:
+                self._duracao[endpoint] = Histograma(LIMITES_DURACAO)
+                self._tempo_sql[endpoint] = Histograma(LIMITES_DURACAO)
+                self._consultas[endpoint] = Histograma(LIMITES_CONSULTAS)
+            self._duracao[endpoint].observar(total)
+            self._tempo_sql[endpoint].observar(tempo_sql)
+            self._consultas[endpoint].observar(consultas)
+            chave = (endpoint, status)
+            self._respostas[chave] = self._respostas.get(chave, 0) + 1
+
+    def texto_prometheus(self):
+        """Métricas no formato de exposição em texto do Prometheus"""
+        series = (
+            ('caixa_requisicao_duracao_segundos', 'Tempo total da requisição', self._duracao),
+            ('caixa_requisicao_sql_segundos', 'Tempo gasto em comandos SQL por requisição', self._tempo_sql),
+            ('caixa_requisicao_consultas_sql', 'Comandos SQL executados por requisição', self._consultas),
+        )
+        linhas = []
+        with self._lock:
+            for nome, descricao, histogramas in series:
+                linhas.append(f'# HELP {nome} {descricao}')
+                linhas.append(f'# TYPE {nome} histogram')
+                for endpoint in sorted(histogramas):
+                    linhas.extend(histogramas[endpoint].linhas(nome, f'endpoint="{endpoint}"'))
+
+            linhas.append('# HELP caixa_requisicoes_total Requisições atendidas por endpoint e status')
+            linhas.append('# TYPE caixa_requisicoes_total counter')
+            for (endpoint, status), quantidade in sorted(self._respostas.items()):
+                linhas.append(f'caixa_requisicoes_total{{endpoint="{endpoint}",status="{status}"}} {quantidade}')
+        return '\n'.join(linhas) + '\n'
+
+    def limpar(self):
+        with self._lock:
+            self._duracao.clear()
+            self._tempo_sql.clear()
+            self._consultas.clear()
+            self._respostas.clear()
+
+
+def _iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+    g.tempo_sql = 0
+    g.tempo_render = 0
+    g.consultas_lentas = []
+
+
+def _iniciar_consulta(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_consulta = time.perf_counter()
+
+
+def _finalizar_consulta(conn, cursor, statement, parameters, context, executemany):
+    from flask import current_app
+
+    inicio = getattr(context, '_inicio_consulta', None)
+    if inicio is None or not has_request_context() or 'inicio_requisicao' not in g:
+        return
+    duracao = time.perf_counter() - inicio
+    g.tempo_sql += duracao
+
+    # Guardar só os N comandos mais lentos (heap mínimo pela duração)
+    limite = current_app.config.get('METRICAS_CONSULTAS_LENTAS', 5)
+    item = (duracao, id(context), ' '.join(statement.split())[:TAMANHO_SQL_LOG])
+    if len(g.consultas_lentas) < limite:
+        heapq.heappush(g.consultas_lentas, item)
+    elif limite and duracao > g.consultas_lentas[0][0]:
+        heapq.heapreplace(g.consultas_lentas, item)
+
+
+def _iniciar_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('inicios_render', []).append(time.perf_counter())
+
+
+def _finalizar_render(sender, template, context, **extra):
+    if has_request_context() and g.get('inicios_render'):
+        duracao = time.perf_counter() - g.inicios_render.pop()
+        # Templates renderizados dentro de outro já contam no tempo do externo
+        if not g.inicios_render:
+            g.tempo_render = g.get('tempo_render', 0) + duracao
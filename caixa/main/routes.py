@@ -1,9 +1,13 @@
-from flask import render_template
+from flask import Response, render_template, jsonify, request
 from flask_login import login_required, current_user
 from caixa.main import bp
-from caixa.models import Venda, Cliente, Caixa
-from caixa.extensoes import db
-from datetime import datetime, date
+from caixa.models import Caixa, Tarefa
+from caixa.extensoes import db, cache_relatorios, metricas
+from caixa.decoradores import owner_required
+from caixa.resumos import resumo_vendas_dia, ultimas_vendas_dia
+from caixa.recebiveis import painel_recebiveis
+from caixa.tarefas import dados_tarefa
+from datetime import date
 
 @bp.route('/')
 @bp.route('/index')
@@ -11,18 +15,13 @@ from datetime import datetime, date
 def index():
     # Dados para o dashboard
     hoje = date.today()
-    print(datetime.now())
     
-    # Vendas do dia
-    vendas_hoje = Venda.query.filter(
-        db.func.date(Venda.data_venda) == hoje
-    ).all()
+    # Totais do dia (agregados no banco) e apenas as últimas vendas para a tabela
+    resumo_hoje = resumo_vendas_dia(hoje)
+    vendas_hoje = ultimas_vendas_dia(hoje, limite=5)
     
-    total_vendas_hoje = sum(v.valor_total for v in vendas_hoje)
-    total_recebido_hoje = sum(v.valor_pago for v in vendas_hoje)
-    
-    # Clientes com débito
-    clientes_devedores = Cliente.query.filter(Cliente.saldo_devedor > 0).all()
+    # Total a receber e maiores devedores (agregados, em cache)
+    recebiveis = painel_recebiveis()
     
     # Status do caixa atual (se for operador de caixa)
     caixa_atual = None
@@ -31,10 +30,55 @@ def index():
     
     context = {
         'vendas_hoje': vendas_hoje,
-        'total_vendas_hoje': total_vendas_hoje,
-        'total_recebido_hoje': total_recebido_hoje,
-        'clientes_devedores': clientes_devedores,
+        'quantidade_vendas_hoje': resumo_hoje['quantidade_vendas'],
+        'total_vendas_hoje': resumo_hoje['total_vendas'],
+        'total_recebido_hoje': resumo_hoje['total_recebido'],
+        'recebiveis': recebiveis,
         'caixa_atual': caixa_atual
     }
     
-    return render_template('index.html', **context)
\ No newline at end of file
+    return render_template('index.html', **context)
+
+
+@bp.route('/admin/cache')
+@login_required
+@owner_required
+def admin_cache():
+    """Acertos/falhas do cache de relatórios, para ajustar tamanho e TTL"""
+    return jsonify(cache_relatorios.estatisticas())
+
+
+@bp.route('/admin/cache/limpar', methods=['POST'])
+@login_required
+@owner_required
+def admin_cache_limpar():
+    """Esvaziar o cache de relatórios deste processo"""
+    cache_relatorios.limpar()
+    return jsonify({'sucesso': True})
+
+
+@bp.route('/admin/metrics')
+@login_required
+@owner_required
+def admin_metrics():
+    """Histogramas de tempo e de comandos SQL por endpoint (formato do Prometheus)"""
+    return Response(metricas.texto_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/tarefas/<int:id>')
+@login_required
+@owner_required
+def status_tarefa(id):
+    """Andamento de uma tarefa em segundo plano (?resultado=1 inclui o resultado)"""
+    tarefa = Tarefa.query.get_or_404(id)
+    return jsonify(dados_tarefa(tarefa, incluir_resultado=request.args.get('resultado', type=int)))
+
+
+@bp.route('/admin/tarefas')
+@login_required
+@owner_required
+def admin_tarefas():
+    """Últimas tarefas da fila e a quantidade por status"""
+    por_status = dict(db.session.query(Tarefa.status, db.func.count(Tarefa.id)).group_by(Tarefa.status).all())
+    ultimas = Tarefa.query.order_by(Tarefa.id.desc()).limit(50).all()
+    return jsonify({'por_status': por_status, 'tarefas': [dados_tarefa(t) for t in ultimas]})
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from flask_login import UserMixin
+from caixa.dinheiro import Dinheiro
 from caixa.extensoes import db
 from zoneinfo import ZoneInfo
 
@@ -68,17 +69,26 @@ class Caixa(db.Model):
 
 class Cliente(db.Model):
     __tablename__ = 'clientes'
+    __table_args__ = (
+        db.Index('ix_clientes_nome', 'nome'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     telefone = db.Column(db.String(20))
     email = db.Column(db.String(120))
     tipo_pagamento = db.Column(db.String(20), default='vista')
-    limite_credito = db.Column(db.Float, default=100000.00)
-    saldo_devedor = db.Column(db.Float, default=0)
+    limite_credito = db.Column(Dinheiro, default=100000.00)
+    saldo_devedor = db.Column(Dinheiro, default=0)
     observacoes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=agora_brasil)
     
+    # Totais mantidos a cada lançamento do extrato (ver caixa/extrato.py)
+    total_compras = db.Column(Dinheiro, nullable=False, default=0)
+    total_pago = db.Column(Dinheiro, nullable=False, default=0)
+    quantidade_compras = db.Column(db.Integer, nullable=False, default=0)
+    ultima_compra = db.Column(db.DateTime)
+    
     vendas = db.relationship('Venda', backref='cliente', foreign_keys='Venda.cliente_id', lazy=True)
 
 class Produto(db.Model):
@@ -87,7 +97,7 @@ class Produto(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tipo = db.Column(db.String(20), nullable=False)
     descricao = db.Column(db.String(200))
-    preco = db.Column(db.Float, nullable=False)
+    preco = db.Column(Dinheiro, nullable=False)
     estoque = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=agora_brasil)
     
@@ -95,11 +105,23 @@ class Produto(db.Model):
 
 class Venda(db.Model):
     __tablename__ = 'vendas'
+    __table_args__ = (
+        db.Index('ix_vendas_data_venda', 'data_venda'),
+        db.Index('ix_vendas_caixa_id_data_venda', 'caixa_id', 'data_venda'),
+        db.Index('ix_vendas_status_data_venda', 'status', 'data_venda'),
+        db.Index('ix_vendas_cliente_id', 'cliente_id'),
+        # Índices parciais das contas a receber (caixa/recebiveis.py): só as
+        # vendas em aberto, que ficam pequenos mesmo com o histórico crescendo
+        db.Index('ix_vendas_em_aberto_data_venda', 'data_venda', 'id',
+                 postgresql_where=db.text("status <> 'pago'"), sqlite_where=db.text("status <> 'pago'")),
+        db.Index('ix_vendas_em_aberto_cliente_id', 'cliente_id',
+                 postgresql_where=db.text("status <> 'pago'"), sqlite_where=db.text("status <> 'pago'")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     data_venda = db.Column(db.DateTime, default=agora_brasil)
-    valor_total = db.Column(db.Float, nullable=False)
-    valor_pago = db.Column(db.Float, default=0)
+    valor_total = db.Column(Dinheiro, nullable=False)
+    valor_pago = db.Column(Dinheiro, default=0)
     status = db.Column(db.String(20), default='pendente')
     tipo_pagamento = db.Column(db.String(20))
     observacoes = db.Column(db.Text)
@@ -115,41 +137,117 @@ class Venda(db.Model):
 
 class ItemVenda(db.Model):
     __tablename__ = 'itens_venda'
+    __table_args__ = (
+        db.Index('ix_itens_venda_venda_id', 'venda_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     venda_id = db.Column(db.Integer, db.ForeignKey('vendas.id'), nullable=False)
     produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
     quantidade = db.Column(db.Integer, default=1)
-    preco_unitario = db.Column(db.Float, nullable=False)
-    subtotal = db.Column(db.Float, nullable=False)
+    preco_unitario = db.Column(Dinheiro, nullable=False)
+    subtotal = db.Column(Dinheiro, nullable=False)
 
 class Pagamento(db.Model):
     __tablename__ = 'pagamentos'
+    __table_args__ = (
+        db.Index('ix_pagamentos_data_pagamento', 'data_pagamento'),
+        db.Index('ix_pagamentos_venda_id', 'venda_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     venda_id = db.Column(db.Integer, db.ForeignKey('vendas.id'), nullable=False)
-    valor = db.Column(db.Float, nullable=False)
+    valor = db.Column(Dinheiro, nullable=False)
     data_pagamento = db.Column(db.DateTime, default=agora_brasil)
     forma_pagamento = db.Column(db.String(50))
     recebedor_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     observacoes = db.Column(db.Text)
 
+class LancamentoCliente(db.Model):
+    """
+    Extrato do cliente: um débito por venda, um crédito por pagamento e,
+    eventualmente, o saldo anterior trazido de outro sistema. Só recebe
+    inclusões; saldo é o saldo devedor logo após o lançamento.
+    """
+    __tablename__ = 'lancamentos_cliente'
+    __table_args__ = (
+        db.Index('ix_lancamentos_cliente_cliente_id_id', 'cliente_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    data = db.Column(db.DateTime, nullable=False, default=agora_brasil)
+    tipo = db.Column(db.String(10), nullable=False)  # 'debito' ou 'credito'
+    valor = db.Column(Dinheiro, nullable=False)
+    saldo = db.Column(Dinheiro, nullable=False)
+    venda_id = db.Column(db.Integer, db.ForeignKey('vendas.id'))
+    pagamento_id = db.Column(db.Integer, db.ForeignKey('pagamentos.id'))
+    descricao = db.Column(db.String(200))
+
 class FluxoCaixa(db.Model):
     __tablename__ = 'fluxo_caixa'
+    __table_args__ = (
+        # Um registro por caixa e dia (garante o upsert do fluxo incremental)
+        db.Index('ux_fluxo_caixa_caixa_id_data', 'caixa_id', 'data', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     data = db.Column(db.Date, nullable=False)
-    saldo_inicial = db.Column(db.Float, default=0)
-    total_vendas_vista = db.Column(db.Float, default=0)
-    total_vendas_prazo = db.Column(db.Float, default=0)
-    total_recebimentos = db.Column(db.Float, default=0)
-    saldo_final = db.Column(db.Float, default=0)
+    saldo_inicial = db.Column(Dinheiro, default=0)
+    total_vendas_vista = db.Column(Dinheiro, default=0)
+    total_vendas_prazo = db.Column(Dinheiro, default=0)
+    total_recebimentos = db.Column(Dinheiro, default=0)
+    saldo_final = db.Column(Dinheiro, default=0)
     caixa_id = db.Column(db.Integer, db.ForeignKey('caixas.id'))
 
      # RELACIONAMENTO - É ISSO QUE PERMITE acessar fluxo.caixa.nome
     caixa = db.relationship('Caixa', backref=db.backref('fluxos', lazy='dynamic'))
 
 
+# caixa_id dos resumos para despesas lançadas sem caixa (pelo dono)
+SEM_CAIXA = 0
+
+
+class ResumoDiario(db.Model):
+    """Totais pré-agregados de um caixa em um dia (mantidos a cada venda, pagamento e despesa)"""
+    __tablename__ = 'resumo_diario'
+    __table_args__ = (
+        db.Index('ux_resumo_diario_caixa_id_data', 'caixa_id', 'data', unique=True),
+        db.Index('ix_resumo_diario_data', 'data'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    caixa_id = db.Column(db.Integer, nullable=False)  # SEM_CAIXA = despesas sem caixa
+    data = db.Column(db.Date, nullable=False)
+    quantidade_vista = db.Column(db.Integer, nullable=False, default=0)
+    quantidade_prazo = db.Column(db.Integer, nullable=False, default=0)
+    total_vista = db.Column(Dinheiro, nullable=False, default=0)
+    total_prazo = db.Column(Dinheiro, nullable=False, default=0)
+    total_pago_vendas = db.Column(Dinheiro, nullable=False, default=0)  # valor_pago das vendas do dia
+    total_recebimentos = db.Column(Dinheiro, nullable=False, default=0)  # pagamentos recebidos no dia
+    total_despesas = db.Column(Dinheiro, nullable=False, default=0)
+
+
+class ResumoMensal(db.Model):
+    """Mesmos totais do ResumoDiario somados por mês (mes = primeiro dia do mês)"""
+    __tablename__ = 'resumo_mensal'
+    __table_args__ = (
+        db.Index('ux_resumo_mensal_caixa_id_mes', 'caixa_id', 'mes', unique=True),
+        db.Index('ix_resumo_mensal_mes', 'mes'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    caixa_id = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Date, nullable=False)
+    quantidade_vista = db.Column(db.Integer, nullable=False, default=0)
+    quantidade_prazo = db.Column(db.Integer, nullable=False, default=0)
+    total_vista = db.Column(Dinheiro, nullable=False, default=0)
+    total_prazo = db.Column(Dinheiro, nullable=False, default=0)
+    total_pago_vendas = db.Column(Dinheiro, nullable=False, default=0)
+    total_recebimentos = db.Column(Dinheiro, nullable=False, default=0)
+    total_despesas = db.Column(Dinheiro, nullable=False, default=0)
+
+
 class CategoriaDespesa(db.Model):
     __tablename__ = 'categorias_despesa'
     
@@ -164,10 +262,13 @@ class CategoriaDespesa(db.Model):
 
 class Despesa(db.Model):
     __tablename__ = 'despesas'
+    __table_args__ = (
+        db.Index('ix_despesas_data_despesa_caixa_id', 'data_despesa', 'caixa_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.String(200), nullable=False)
-    valor = db.Column(db.Float, nullable=False)
+    valor = db.Column(Dinheiro, nullable=False)
     data_despesa = db.Column(db.Date, nullable=False, default=agora_brasil)
     data_registro = db.Column(db.DateTime, default=agora_brasil)
     forma_pagamento = db.Column(db.String(50))  # 'dinheiro', 'cartao', 'pix', 'boleto'
@@ -180,4 +281,33 @@ class Despesa(db.Model):
     
     # Relacionamentos
     usuario = db.relationship('User', backref='despesas')
-    caixa = db.relationship('Caixa', backref='despesas')
\ No newline at end of file
+    caixa = db.relationship('Caixa', backref='despesas')
+
+class Tarefa(db.Model):
+    """
+    Fila de tarefas em segundo plano (caixa/tarefas.py): recálculos e
+    relatórios pesados executados pelo `flask caixa worker` fora da
+    requisição. parametros e resultado são JSON com tipos (datas, Decimal).
+    """
+    __tablename__ = 'tarefas'
+    __table_args__ = (
+        db.Index('ix_tarefas_status_id', 'status', 'id'),
+        db.Index('ix_tarefas_chave_id', 'chave', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    chave = db.Column(db.String(255), nullable=False)  # tipo + parâmetros, para reaproveitar tarefas iguais
+    parametros = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'executando', 'concluida', 'erro'
+    processados = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    resultado = db.Column(db.Text)
+    erro = db.Column(db.Text)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    trabalhador = db.Column(db.String(100))
+    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    criada_em = db.Column(db.DateTime, nullable=False, default=agora_brasil)
+    iniciada_em = db.Column(db.DateTime)
+    atualizada_em = db.Column(db.DateTime)
+    concluida_em = db.Column(db.DateTime)
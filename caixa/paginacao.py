@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+import threading
+from datetime import date, datetime
+
+from cachetools import TTLCache
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+_contagens_lock = threading.Lock()
+
+
+class PaginaCursor:
+    """
+    Uma página de paginação por cursor (keyset).
+
+    Em vez de OFFSET, cada página começa depois (ou antes) da chave de
+    ordenação da última (ou primeira) linha da página anterior, então o
+    custo não cresce com a profundidade. Expõe os mesmos atributos do
+    Pagination do Flask-SQLAlchemy usados nos templates (items, per_page,
+    total, has_prev, has_next, first, last) e os cursores proximo/anterior.
+    """
+
+    def __init__(self, items, per_page, total, first, has_prev, has_next, proximo, anterior):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.first = first
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.proximo = proximo
+        self.anterior = anterior
+
+    @property
+    def last(self):
+        return self.first + len(self.items) - 1 if self.items else self.first
+
+
+def codificar_cursor(valores, posicao):
+    """Cursor opaco para a URL: chave de ordenação da linha e sua posição na lista"""
+    valores = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores]
+    dados = json.dumps([posicao, valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, colunas):
+    """Devolve (valores, posicao) ou None se o cursor for inválido"""
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        posicao, valores = json.loads(dados)
+        if len(valores) != len(colunas):
+            return None
+        convertidos = []
+        for coluna, valor in zip(colunas, valores):
+            tipo = coluna.type.python_type
+            if valor is not None and tipo in (date, datetime):
+                valor = tipo.fromisoformat(valor)
+            convertidos.append(valor)
+        return convertidos, int(posicao)
+    except (ValueError, TypeError, binascii.Error, NotImplementedError):
+        return None
+
+
+def contar_em_cache(query, chave):
+    """
+    COUNT(*) da consulta guardado por PAGINACAO_CONTAGEM_TTL segundos.
+    O total exibido pode ficar alguns segundos atrasado em troca de não
+    varrer a tabela inteira a cada página.
+    """
+    ttl = current_app.config.get('PAGINACAO_CONTAGEM_TTL', 60)
+    if not ttl:
+        return query.order_by(None).count()
+
+    with _contagens_lock:
+        contagens = current_app.extensions.get('paginacao_contagens')
+        if contagens is None:
+            contagens = current_app.extensions['paginacao_contagens'] = TTLCache(maxsize=256, ttl=ttl)
+        if chave in contagens:
+            return contagens[chave]
+
+    total = query.order_by(None).count()
+    with _contagens_lock:
+        contagens[chave] = total
+    return total
+
+
+def paginar_cursor(query, colunas, chave, por_pagina, descendente=False, contagem=None):
+    """
+    Pagina a consulta pelas colunas de ordenação (a última deve ser única, p.ex. o id).
+
+    colunas: expressões da ordenação, todas na mesma direção.
+    chave: função que extrai da linha os valores dessas colunas.
+    contagem: chave para o total em cache (None = não contar).
+    Os cursores vêm de ?apos= e ?antes= da requisição.
+    """
+    apos = request.args.get('apos')
+    antes = request.args.get('antes')
+    total = contar_em_cache(query, contagem) if contagem else None
+
+    ordem_normal = [c.desc() if descendente else c.asc() for c in colunas]
+    ordem_inversa = [c.asc() if descendente else c.desc() for c in colunas]
+    linha = tuple_(*colunas)
+
+    cursor_antes = decodificar_cursor(antes, colunas) if antes else None
+    cursor_apos = decodificar_cursor(apos, colunas) if apos and not cursor_antes else None
+
+    items = None
+    if cursor_antes:
+        valores, posicao = cursor_antes
+        filtro = linha > tuple_(*valores) if descendente else linha < tuple_(*valores)
+        items = query.filter(filtro).order_by(*ordem_inversa).limit(por_pagina + 1).all()
+        has_prev = len(items) > por_pagina
+        if has_prev:
+            items = items[:por_pagina][::-1]
+            has_next = True
+            first = max(posicao - len(items), 1)
+        else:
+            # Voltou ao começo: mostrar a primeira página completa
+            items = None
+    elif cursor_apos:
+        valores, posicao = cursor_apos
+        filtro = linha < tuple_(*valores) if descendente else linha > tuple_(*valores)
+        items = query.filter(filtro).order_by(*ordem_normal).limit(por_pagina + 1).all()
+        has_next = len(items) > por_pagina
+        items = items[:por_pagina]
+        has_prev = True
+        first = posicao + 1
+
+    if items is None:
+        items = query.order_by(*ordem_normal).limit(por_pagina + 1).all()
+        has_next = len(items) > por_pagina
+        items = items[:por_pagina]
+        has_prev = False
+        first = 1
+
+    proximo = codificar_cursor(chave(items[-1]), first + len(items) - 1) if has_next and items else None
+    anterior = codificar_cursor(chave(items[0]), first) if has_prev and items else None
+    return PaginaCursor(items, por_pagina, total, first, has_prev, has_next, proximo, anterior)
+
+
+def usar_cursor():
+    """Paginação por cursor, salvo quando a URL pede uma página numerada (?page=)"""
+    return current_app.config.get('PAGINACAO_CURSOR', True) and 'page' not in request.args
+
+
+def chave_contagem(nome, **filtros):
+    return (nome,) + tuple(sorted((k, v) for k, v in filtros.items() if v not in (None, '', 0)))
+
+
+def dados_pagina(pagina, serializar):
+    """Corpo JSON das APIs de listagem"""
+    dados = {
+        'itens': [serializar(item) for item in pagina.items],
+        'proximo': getattr(pagina, 'proximo', None),
+        'anterior': getattr(pagina, 'anterior', None),
+    }
+    if pagina.total is not None:
+        dados['total'] = pagina.total
+    return dados
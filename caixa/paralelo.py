@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_request_context
+
+from caixa.extensoes import db
+
+# Contexto de app de cada processo do pool (mantido enquanto o processo viver)
+_contexto_processo = None
+
+# Trabalhadores do `flask caixa worker` que repartem RELATORIOS_PROCESSOS (ver dividir_processos)
+_trabalhadores = 1
+
+
+def dividir_processos(trabalhadores):
+    """
+    Chamado em cada processo trabalhador do `flask caixa worker`: com N
+    trabalhadores, cada tarefa usa RELATORIOS_PROCESSOS / N processos, para
+    que o total de processos (e de conexões) fique em RELATORIOS_PROCESSOS
+    em vez de N x RELATORIOS_PROCESSOS.
+    """
+    global _trabalhadores
+    _trabalhadores = max(1, trabalhadores)
+
+
+def processos_relatorios():
+    """
+    Processos para relatórios/recálculos particionados (RELATORIOS_PROCESSOS;
+    0 = um por CPU), divididos entre os trabalhadores do worker
+    """
+    processos = current_app.config.get('RELATORIOS_PROCESSOS', 0)
+    processos = processos if processos > 0 else (os.cpu_count() or 1)
+    return max(1, processos // _trabalhadores)
+
+
+def paralelo_disponivel():
+    """
+    Se mapear_particoes vai usar processos: fora de requisição (threads do
+    gunicorn), com fork disponível e RELATORIOS_PROCESSOS maior que 1
+    """
+    return (not has_request_context() and processos_relatorios() > 1
+            and 'fork' in multiprocessing.get_all_start_methods())
+
+
+def _iniciar_processo(app):
+    global _contexto_processo
+    _contexto_processo = app.app_context()
+    _contexto_processo.push()
+    # Conexões herdadas do pai não podem ser usadas pelo filho: cada processo abre as suas
+    for engine in db.engines.values():
+        engine.dispose(close=False)
+
+
+def _executar_particao(funcao, particao):
+    try:
+        return funcao(*particao)
+    finally:
+        db.session.remove()
+
+
+def mapear_particoes(funcao, particoes):
+    """
+    Aplica funcao(*particao) a cada partição (ex.: um mês, um caixa) e
+    devolve os resultados parciais na ordem das partições, conforme ficam
+    prontos, para o chamador juntar (ou gravar) um a um.
+
+    Com RELATORIOS_PROCESSOS maior que 1 as partições são calculadas em um
+    ProcessPoolExecutor (fork), cada processo com seu próprio contexto de
+    app e suas conexões; funcao precisa ser de módulo (vai por pickle) e
+    só deve ler do banco, que as escritas ficam com o chamador.
+    Sem paralelo_disponivel() ou com uma partição só, calcula em série no
+    próprio processo.
+    """
+    particoes = list(particoes)
+    processos = min(processos_relatorios(), len(particoes))
+    if processos <= 1 or not paralelo_disponivel():
+        for particao in particoes:
+            yield funcao(*particao)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_iniciar_processo, initargs=(current_app._get_current_object(),))
+    try:
+        yield from executor.map(_executar_particao, [funcao] * len(particoes), particoes)
+    finally:
+        # Chamador que parou antes do fim (limite de tempo) não espera as partições restantes
+        executor.shutdown(wait=True, cancel_futures=True)
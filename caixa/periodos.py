@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_
+
+
+def limites_periodo(data_inicio, data_fim=None):
+    """
+    Converte os dias [data_inicio, data_fim] no intervalo semiaberto de
+    datetimes [data_inicio 00:00, data_fim + 1 dia 00:00)
+    """
+    data_fim = data_fim or data_inicio
+    inicio = datetime.combine(data_inicio, datetime.min.time())
+    fim = datetime.combine(data_fim + timedelta(days=1), datetime.min.time())
+    return inicio, fim
+
+
+def filtro_periodo(coluna, data_inicio, data_fim=None):
+    """
+    Filtro para colunas DateTime equivalente a data_inicio <= date(coluna) <= data_fim.
+
+    Ao contrário de func.date(coluna) == data, compara a coluna diretamente,
+    então o banco consegue usar os índices em data_venda/data_pagamento.
+    """
+    inicio, fim = limites_periodo(data_inicio, data_fim)
+    return and_(coluna >= inicio, coluna < fim)
+
+
+def filtro_dia(coluna, data):
+    """Filtro indexável para 'coluna cai no dia data'"""
+    return filtro_periodo(coluna, data, data)
+
+
+def como_data(valor):
+    """func.date() devolve texto no SQLite e date no Postgres"""
+    if isinstance(valor, str):
+        return date.fromisoformat(valor)
+    return valor
+
+
+def meses_do_periodo(data_inicio, data_fim):
+    """
+    Divide [data_inicio, data_fim] em partes de um mês de calendário:
+    [(inicio, fim), ...], com a primeira e a última cortadas nas pontas.
+    """
+    partes = []
+    inicio = data_inicio
+    while inicio <= data_fim:
+        proximo = (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+        fim = min(proximo - timedelta(days=1), data_fim)
+        partes.append((inicio, fim))
+        inicio = proximo
+    return partes
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, IntegerField, SelectField, TextAreaField, SubmitField
+from wtforms import StringField, IntegerField, SelectField, TextAreaField, SubmitField
 from wtforms.validators import DataRequired, NumberRange, Optional, Length
+from caixa.dinheiro import CENTAVO, CampoDinheiro
 
 class ProdutoForm(FlaskForm):
     tipo = SelectField('Tipo de Placa', 
@@ -16,8 +17,8 @@ class ProdutoForm(FlaskForm):
                            validators=[DataRequired(), Length(min=3, max=200)],
                            render_kw={"placeholder": "Ex: Placa Mercosul Padrão"})
     
-    preco = FloatField('Preço (R$)', 
-                      validators=[DataRequired(), NumberRange(min=0.01)],
+    preco = CampoDinheiro('Preço (R$)', 
+                      validators=[DataRequired(), NumberRange(min=CENTAVO)],
                       render_kw={"placeholder": "0.00", "step": "0.01"})
     
     estoque = IntegerField('Estoque Inicial', 
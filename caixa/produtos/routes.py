@@ -1,16 +1,20 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required
 from caixa import db
 from caixa.produtos import bp
 from caixa.produtos.forms import ProdutoForm, ProdutoFilterForm
-from caixa.models import Produto
+from caixa.models import Produto, ItemVenda
+from sqlalchemy import func
 from caixa.decoradores import caixa_required
+from caixa.carregamento import perfil
+from caixa.catalogo import catalogo_produtos, invalidar_produtos
+from caixa.paginacao import paginar_cursor, usar_cursor, chave_contagem, dados_pagina
+from caixa.busca import buscar_produtos, filtro_busca_produtos, LIMITE_BUSCA_PADRAO, LIMITE_BUSCA_MAXIMO
 
-@bp.route('/')
-@login_required
-@caixa_required
-def lista_produtos():
-    page = request.args.get('page', 1, type=int)
+POR_PAGINA_PRODUTOS = 10
+
+
+def consulta_produtos():
     tipo = request.args.get('tipo', '')
     busca = request.args.get('busca', '')
     
@@ -20,18 +24,37 @@ def lista_produtos():
         query = query.filter_by(tipo=tipo)
     
     if busca:
-        query = query.filter(Produto.descricao.contains(busca))
+        query = query.filter(filtro_busca_produtos(busca))
     
-    produtos = query.order_by(Produto.tipo, Produto.descricao).paginate(
-        page=page, per_page=10, error_out=False
+    return query, {'tipo': tipo, 'busca': busca}
+
+
+def paginar_produtos(query, contagem):
+    """Por tipo e descrição: por cursor (tipo, descricao, id) ou, com ?page=, numerada"""
+    descricao = func.coalesce(Produto.descricao, '')
+    if usar_cursor():
+        return paginar_cursor(query, [Produto.tipo, descricao, Produto.id],
+                              lambda p: (p.tipo, p.descricao or '', p.id),
+                              POR_PAGINA_PRODUTOS, contagem=contagem)
+    page = request.args.get('page', 1, type=int)
+    return query.order_by(Produto.tipo, descricao, Produto.id).paginate(
+        page=page, per_page=POR_PAGINA_PRODUTOS, error_out=False
     )
+
+
+@bp.route('/')
+@login_required
+@caixa_required
+def lista_produtos():
+    query, filtros = consulta_produtos()
+    produtos = paginar_produtos(query, chave_contagem('produtos', **filtros))
     
     form = ProdutoFilterForm()
     
     return render_template('produtos/lista.html', 
                          produtos=produtos, 
                          form=form,
-                         filtros={'tipo': tipo, 'busca': busca})
+                         filtros=filtros)
 
 @bp.route('/novo', methods=['GET', 'POST'])
 @login_required
@@ -49,6 +72,7 @@ def novo_produto():
         
         db.session.add(produto)
         db.session.commit()
+        invalidar_produtos()
         
         flash(f'Produto "{produto.descricao}" cadastrado com sucesso!', 'success')
         return redirect(url_for('produtos.lista_produtos'))
@@ -59,7 +83,7 @@ def novo_produto():
 @login_required
 @caixa_required
 def detalhe_produto(id):
-    produto = Produto.query.get_or_404(id)
+    produto = Produto.query.options(*perfil('produto_detalhe')).get_or_404(id)
     return render_template('produtos/detalhe.html', produto=produto)
 
 @bp.route('/<int:id>/editar', methods=['GET', 'POST'])
@@ -76,6 +100,7 @@ def editar_produto(id):
         produto.estoque = form.estoque.data or 0
         
         db.session.commit()
+        invalidar_produtos()
         
         flash(f'Produto "{produto.descricao}" atualizado!', 'success')
         return redirect(url_for('produtos.detalhe_produto', id=id))
@@ -89,12 +114,13 @@ def excluir_produto(id):
     produto = Produto.query.get_or_404(id)
     
     # Verificar se há vendas associadas
-    if produto.itens_venda.count() > 0:
+    if db.session.query(ItemVenda.query.filter_by(produto_id=id).exists()).scalar():
         flash('Não é possível excluir produto com vendas associadas.', 'danger')
         return redirect(url_for('produtos.detalhe_produto', id=id))
     
     db.session.delete(produto)
     db.session.commit()
+    invalidar_produtos()
     
     flash(f'Produto "{produto.descricao}" excluído!', 'success')
     return redirect(url_for('produtos.lista_produtos'))
@@ -103,14 +129,45 @@ def excluir_produto(id):
 @login_required
 def api_lista_produtos():
     """API para retornar lista de produtos em JSON (usado nos selects)"""
-    produtos = Produto.query.all()
+    corpo, etag = catalogo_produtos()
+    resposta = current_app.response_class(corpo, mimetype='application/json')
+    resposta.set_etag(etag)
+    # O navegador guarda a cópia, mas revalida sempre (If-None-Match -> 304)
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta.make_conditional(request)
+
+@bp.route('/api/listagem')
+@login_required
+def api_listagem_produtos():
+    """API paginada por cursor (?apos=/?antes=, ?tipo=, ?busca=); ?total=1 inclui o total"""
+    query, filtros = consulta_produtos()
+    contagem = chave_contagem('produtos', **filtros) if request.args.get('total', type=int) else None
+    descricao = func.coalesce(Produto.descricao, '')
+    produtos = paginar_cursor(query, [Produto.tipo, descricao, Produto.id],
+                              lambda p: (p.tipo, p.descricao or '', p.id),
+                              POR_PAGINA_PRODUTOS, contagem=contagem)
+    return jsonify(dados_pagina(produtos, lambda p: {
+        'id': p.id,
+        'descricao': p.descricao,
+        'preco': p.preco,
+        'tipo': p.tipo,
+        'estoque': p.estoque
+    }))
+
+@bp.route('/api/buscar')
+@login_required
+def api_buscar_produtos():
+    """API de autocompletar: produtos que casam com ?q= (sem acentos, por prefixo)"""
+    termo = request.args.get('q', '')
+    limite = max(1, min(request.args.get('limite', LIMITE_BUSCA_PADRAO, type=int), LIMITE_BUSCA_MAXIMO))
     return jsonify([{
         'id': p.id,
         'descricao': p.descricao,
         'preco': p.preco,
         'tipo': p.tipo,
         'estoque': p.estoque
-    } for p in produtos])
+    } for p in buscar_produtos(termo, limite=limite)])
 
 @bp.route('/api/<int:id>')
 @login_required
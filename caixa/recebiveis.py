@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, literal_column
+
+from caixa.carregamento import perfil
+from caixa.extensoes import db, cache_relatorios
+from caixa.models import Cliente, Venda
+
+# Faixas do envelhecimento dos recebíveis: (rótulo, idade mínima, idade máxima em dias)
+FAIXAS_ENVELHECIMENTO = (
+    ('0-30', 0, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+
+# Clientes no quadro de maiores devedores (painel e relatório geral)
+MAIORES_DEVEDORES = 10
+
+# Rota das entradas no cache de relatórios; o período cobre todas as datas,
+# então qualquer invalidação de vendas/pagamentos também as remove
+ROTA_CACHE = 'recebiveis'
+
+
+def em_aberto():
+    """
+    Filtro das vendas não pagas, igual ao predicado dos índices parciais
+    ix_vendas_em_aberto_*. 'pago' vai literal no SQL (e não como parâmetro)
+    para que o planejador reconheça que a consulta cabe no índice.
+    """
+    return Venda.status != literal_column("'pago'")
+
+
+def valor_em_aberto():
+    return Venda.valor_total - db.func.coalesce(Venda.valor_pago, 0)
+
+
+def vendas_em_aberto(cliente_id=None):
+    """
+    Vendas não pagas para listagem (paginar por data_venda, id crescentes:
+    mais antigas primeiro, percorrendo o índice ix_vendas_em_aberto_data_venda)
+    """
+    consulta = Venda.query.options(*perfil('venda_lista')).filter(em_aberto())
+    if cliente_id:
+        consulta = consulta.filter(Venda.cliente_id == cliente_id)
+    return consulta
+
+
+def resumo_recebiveis():
+    """Totais das vendas em aberto em uma consulta: valor, vendas, clientes e a venda mais antiga"""
+    total, vendas, clientes, mais_antiga = db.session.query(
+        db.func.coalesce(db.func.sum(valor_em_aberto()), 0),
+        db.func.count(Venda.id),
+        db.func.count(db.distinct(Venda.cliente_id)),
+        db.func.min(Venda.data_venda),
+    ).filter(em_aberto()).one()
+    return {'total': total, 'quantidade_vendas': vendas, 'quantidade_clientes': clientes,
+            'mais_antiga': mais_antiga}
+
+
+def resumo_por_cliente(limite=None, cliente_ids=None):
+    """
+    Valor em aberto por cliente (agregado no banco), do maior para o menor:
+    [{id, nome, telefone, limite_credito, total_compras, total, quantidade_vendas, mais_antiga}]
+    """
+    colunas = (Cliente.id, Cliente.nome, Cliente.telefone, Cliente.limite_credito, Cliente.total_compras)
+    total = db.func.sum(valor_em_aberto())
+    consulta = db.session.query(
+        *colunas, total, db.func.count(Venda.id), db.func.min(Venda.data_venda)
+    ).join(Venda, Venda.cliente_id == Cliente.id).filter(em_aberto())
+    if cliente_ids is not None:
+        consulta = consulta.filter(Cliente.id.in_(cliente_ids))
+    consulta = consulta.group_by(*colunas).having(total > 0).order_by(total.desc(), Cliente.id)
+    if limite:
+        consulta = consulta.limit(limite)
+    return [{
+        'id': cliente_id, 'nome': nome, 'telefone': telefone, 'limite_credito': limite_credito or 0,
+        'total_compras': total_compras, 'total': valor, 'quantidade_vendas': quantidade, 'mais_antiga': mais_antiga
+    } for cliente_id, nome, telefone, limite_credito, total_compras, valor, quantidade, mais_antiga in consulta]
+
+
+def painel_recebiveis():
+    """
+    Resumo e maiores devedores para os painéis, guardados no cache de
+    relatórios: o custo não depende da quantidade de clientes cadastrados.
+    """
+    return cache_relatorios.obter(ROTA_CACHE, None, date.min, date.max, lambda: {
+        'resumo': resumo_recebiveis(),
+        'maiores_devedores': resumo_por_cliente(limite=MAIORES_DEVEDORES),
+    })
+
+
+def envelhecimento_recebiveis(hoje=None):
+    """
+    Valores em aberto por cliente e faixa de idade da venda
+    (FAIXAS_ENVELHECIMENTO), em uma única consulta agrupada por cliente.
+
+    Retorna {'faixas': [rótulos], 'clientes': [{id, nome, telefone,
+    faixas: {rótulo: valor}, total}], 'totais': {rótulo: valor}, 'total'},
+    com os clientes do maior para o menor total em aberto.
+    """
+    hoje = hoje or date.today()
+    aberto = valor_em_aberto()
+
+    def corte(dias):
+        # idade <= dias  <=>  data_venda a partir da meia-noite de hoje - dias
+        return datetime.combine(hoje - timedelta(days=dias), datetime.min.time())
+
+    somas = []
+    for rotulo, minimo, maximo in FAIXAS_ENVELHECIMENTO:
+        condicoes = []
+        if minimo:
+            condicoes.append(Venda.data_venda < corte(minimo - 1))
+        if maximo is not None:
+            condicoes.append(Venda.data_venda >= corte(maximo))
+        somas.append(db.func.coalesce(db.func.sum(case((db.and_(*condicoes), aberto), else_=0)), 0))
+    total = db.func.sum(aberto)
+
+    linhas = db.session.query(Cliente.id, Cliente.nome, Cliente.telefone, *somas, total).join(
+        Venda, Venda.cliente_id == Cliente.id
+    ).filter(
+        em_aberto()
+    ).group_by(Cliente.id, Cliente.nome, Cliente.telefone).having(total > 0).order_by(
+        total.desc(), Cliente.id
+    ).all()
+
+    rotulos = [rotulo for rotulo, _, _ in FAIXAS_ENVELHECIMENTO]
+    clientes = []
+    totais = dict.fromkeys(rotulos, 0)
+    for cliente_id, nome, telefone, *valores in linhas:
+        por_faixa = dict(zip(rotulos, valores))
+        for rotulo in rotulos:
+            totais[rotulo] += por_faixa[rotulo]
+        clientes.append({'id': cliente_id, 'nome': nome, 'telefone': telefone,
+                         'faixas': por_faixa, 'total': valores[-1]})
+    return {'faixas': rotulos, 'clientes': clientes, 'totais': totais, 'total': sum(totais.values())}
@@ -0,0 +1,165 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import traceback
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# Atributos padrão do LogRecord; o resto veio de extra={...} e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'id_requisicao', 'excecao',
+}
+
+# Cabeçalho usado para receber/devolver o id de correlação da requisição
+CABECALHO_ID_REQUISICAO = 'X-Request-ID'
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro: horário, nível, logger, mensagem, id da requisição e extras"""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+        }
+        if getattr(record, 'id_requisicao', None):
+            dados['id_requisicao'] = record.id_requisicao
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_'):
+                dados[chave] = valor
+        if getattr(record, 'excecao', None):
+            dados['excecao'] = record.excecao
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    """Formato legível para desenvolvimento, com o id da requisição quando houver"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(id_requisicao)s] %(message)s')
+
+    def format(self, record):
+        if not getattr(record, 'id_requisicao', None):
+            record.id_requisicao = '-'
+        texto = super().format(record)
+        if getattr(record, 'excecao', None):
+            texto += '\n' + record.excecao
+        return texto
+
+
+class FilaRegistro(logging.handlers.QueueHandler):
+    """
+    Handler não bloqueante: a thread da requisição só coloca o registro na
+    fila; formatação e escrita em stdout acontecem na thread do QueueListener.
+
+    O id da requisição e o traceback são capturados aqui, ainda na thread de
+    origem, porque depois não há mais contexto de requisição nem exc_info.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if has_request_context():
+            record.id_requisicao = g.get('id_requisicao')
+        if record.exc_info:
+            record.excecao = ''.join(traceback.format_exception(*record.exc_info))
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+class Registro:
+    """
+    Logging estruturado da aplicação (logger 'caixa' e filhos, incluindo
+    app.logger): nível geral em LOG_NIVEL, níveis por módulo em LOG_NIVEIS,
+    saída JSON (LOG_FORMATO='json') ou texto, e um id de correlação por
+    requisição (cabeçalho X-Request-ID, recebido do proxy ou gerado aqui).
+
+    A fila e o listener são do processo: criados uma vez e compartilhados
+    por todas as apps criadas nele.
+    """
+
+    _listener = None
+    _handler = None
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        logger = logging.getLogger('caixa')
+        if Registro._handler is None:
+            fila = queue.SimpleQueue()
+            saida = logging.StreamHandler(sys.stdout)
+            Registro._handler = FilaRegistro(fila)
+            Registro._listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+            Registro._listener.start()
+            atexit.register(Registro.encerrar)
+            os.register_at_fork(after_in_child=Registro._apos_fork)
+            logger.addHandler(Registro._handler)
+            # Sem propagar: o root (gunicorn, pytest) escreveria a mesma linha de novo
+            logger.propagate = False
+
+        formato = app.config.get('LOG_FORMATO', 'json')
+        for destino in Registro._listener.handlers:
+            destino.setFormatter(FormatadorJson() if formato == 'json' else FormatadorTexto())
+
+        logger.setLevel(app.config.get('LOG_NIVEL', 'INFO').upper())
+        for nome, nivel in app.config.get('LOG_NIVEIS', {}).items():
+            outro = logging.getLogger(nome)
+            outro.setLevel(nivel.upper())
+            # Bibliotecas (sqlalchemy.engine, werkzeug...) passam pela mesma fila
+            if nome != 'caixa' and not nome.startswith('caixa.') and Registro._handler not in outro.handlers:
+                outro.addHandler(Registro._handler)
+                outro.propagate = False
+
+        app.before_request(_iniciar_id_requisicao)
+        app.after_request(_devolver_id_requisicao)
+        app.extensions['registro'] = self
+
+    @staticmethod
+    def _apos_fork():
+        # A thread do listener não existe no processo filho: fila e thread novas
+        fila = queue.SimpleQueue()
+        Registro._handler.queue = fila
+        Registro._listener = logging.handlers.QueueListener(
+            fila, *Registro._listener.handlers, respect_handler_level=True
+        )
+        Registro._listener.start()
+
+    @staticmethod
+    def encerrar():
+        """Escreve o que ainda está na fila (saída do processo, inclusive filhos do worker)"""
+        if Registro._listener is not None and Registro._listener._thread is not None:
+            Registro._listener.stop()
+
+
+def _iniciar_id_requisicao():
+    recebido = request.headers.get(CABECALHO_ID_REQUISICAO, '')
+    g.id_requisicao = recebido[:64] if recebido else uuid.uuid4().hex
+
+
+def _devolver_id_requisicao(response):
+    if 'id_requisicao' in g:
+        response.headers[CABECALHO_ID_REQUISICAO] = g.id_requisicao
+    return response
+
+
+def ler_niveis(texto):
+    """'caixa.vendas=DEBUG,sqlalchemy.engine=INFO' -> {'caixa.vendas': 'DEBUG', ...}"""
+    niveis = {}
+    for parte in texto.split(','):
+        if '=' in parte:
+            nome, nivel = parte.split('=', 1)
+            niveis[nome.strip()] = nivel.strip()
+    return niveis
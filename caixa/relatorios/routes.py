@@ -1,35 +1,80 @@
-from flask import render_template, request, jsonify
+import time
+from flask import render_template, request, jsonify, Response, current_app, abort, stream_with_context, url_for
 from flask_login import login_required, current_user
 from caixa import db
 from caixa.relatorios import bp
-from caixa.models import Venda, Pagamento, Cliente, Caixa, FluxoCaixa
+from caixa.models import Venda, Pagamento, Cliente, Caixa, FluxoCaixa, Produto
 from caixa.decoradores import owner_required, caixa_required
+from caixa.carregamento import perfil
+from caixa.paginacao import paginar_cursor, dados_pagina
+from caixa.periodos import filtro_dia, filtro_periodo, meses_do_periodo
+from caixa.resumos import resumo_vendas_dia, total_despesas_dia
+from caixa.consolidacao import CAMPOS_RESUMO, somar_totais, totais_resumo
+from caixa.analitico import cobertura_snapshot, produtos_mais_vendidos, totais_por_mes
+from caixa.extensoes import tempo_real, cache_relatorios
+from caixa.tempo_real import formatar_evento
+from caixa.exportacao import EXPORTACOES, gerar_csv, gerar_jsonl
+from caixa.paralelo import mapear_particoes, paralelo_disponivel
+from caixa.recebiveis import envelhecimento_recebiveis, painel_recebiveis, vendas_em_aberto
+from caixa.tarefas import CONCLUIDA, enfileirar, resultado_tarefa, tipo_tarefa
 from datetime import datetime, date, timedelta
 
-@bp.route('/diario')
-@login_required
-@caixa_required
-def relatorio_diario():
-    data = request.args.get('data', date.today().strftime('%Y-%m-%d'))
-    data_obj = datetime.strptime(data, '%Y-%m-%d').date()
-    
+POR_PAGINA_RECEBIVEIS = 25
+
+# Comparativo ano a ano: anos exibidos (padrão e máximo) e produtos por ano
+ANOS_COMPARATIVO = 3
+ANOS_COMPARATIVO_MAX = 10
+PRODUTOS_COMPARATIVO = 10
+
+
+def _venda_dados(venda):
+    """Dados simples de uma venda para os templates (seguros para o cache)"""
+    return {
+        'id': venda.id,
+        'data_venda': venda.data_venda,
+        'valor_total': venda.valor_total,
+        'valor_pago': venda.valor_pago,
+        'status': venda.status,
+        'tipo_pagamento': venda.tipo_pagamento,
+        'caixa_id': venda.caixa_id,
+        'cliente': {'nome': venda.cliente.nome} if venda.cliente else None,
+        'vendedor': {'nome': venda.vendedor.nome} if venda.vendedor else None,
+        'caixa_local': {'nome': venda.caixa_local.nome} if venda.caixa_local else None
+    }
+
+
+def _pagamento_dados(pagamento):
+    return {
+        'venda_id': pagamento.venda_id,
+        'data_pagamento': pagamento.data_pagamento,
+        'valor': pagamento.valor,
+        'forma_pagamento': pagamento.forma_pagamento,
+        'venda': {
+            'tipo_pagamento': pagamento.venda.tipo_pagamento,
+            'cliente': {'nome': pagamento.venda.cliente.nome}
+        },
+        'recebedor': {'nome': pagamento.recebedor.nome} if pagamento.recebedor else None
+    }
+
+
+def _dados_relatorio_diario(data_obj, caixa_id):
     # Filtrar por caixa se não for owner
-    query = Venda.query
-    if not current_user.is_owner and current_user.caixa_id:
-        query = query.filter_by(caixa_id=current_user.caixa_id)
+    query = Venda.query.options(*perfil('venda_lista'))
+    if caixa_id:
+        query = query.filter_by(caixa_id=caixa_id)
     
     # Vendas do dia
     vendas = query.filter(
-        db.func.date(Venda.data_venda) == data_obj
+        filtro_dia(Venda.data_venda, data_obj)
     ).all()
     
     # Pagamentos do dia
-    pagamentos_query = Pagamento.query
-    if not current_user.is_owner and current_user.caixa_id:
-        pagamentos_query = pagamentos_query.join(Venda).filter(Venda.caixa_id == current_user.caixa_id)
+    pagamentos_query = Pagamento.query.options(*perfil('pagamento_relatorio'))
+    if caixa_id:
+        pagamentos_query = pagamentos_query.join(Venda).filter(Venda.caixa_id == caixa_id)
     
     pagamentos = pagamentos_query.filter(
-        db.func.date(Pagamento.data_pagamento) == data_obj
+        filtro_dia(Pagamento.data_pagamento, data_obj)
     ).all()
     
     # Cálculos
@@ -40,10 +85,9 @@ def relatorio_diario():
     # Recebimentos de vendas antigas
     recebimentos_prazo = sum(p.valor for p in pagamentos if p.venda.tipo_pagamento == 'prazo')
     
-    context = {
-        'data': data_obj,
-        'vendas': vendas,
-        'pagamentos': pagamentos,
+    return {
+        'vendas': [_venda_dados(v) for v in vendas],
+        'pagamentos': [_pagamento_dados(p) for p in pagamentos],
         'total_vendas_vista': total_vendas_vista,
         'total_vendas_prazo': total_vendas_prazo,
         'total_vendas': total_vendas_vista + total_vendas_prazo,
@@ -51,8 +95,25 @@ def relatorio_diario():
         'recebimentos_prazo': recebimentos_prazo,
         'saldo_dia': total_vendas_vista + recebimentos_prazo
     }
+
+
+@bp.route('/diario')
+@login_required
+@caixa_required
+def relatorio_diario():
+    data = request.args.get('data', date.today().strftime('%Y-%m-%d'))
+    data_obj = datetime.strptime(data, '%Y-%m-%d').date()
     
-    return render_template('relatorios/diario.html', **context)
+    caixa_id = None
+    if not current_user.is_owner and current_user.caixa_id:
+        caixa_id = current_user.caixa_id
+    
+    dados = cache_relatorios.obter(
+        'relatorio_diario', caixa_id, data_obj, data_obj,
+        lambda: _dados_relatorio_diario(data_obj, caixa_id)
+    )
+    
+    return render_template('relatorios/diario.html', data=data_obj, **dados)
 
 # @bp.route('/geral')
 # @login_required
@@ -104,71 +165,290 @@ def relatorio_diario():
     
 #     return render_template('relatorios/geral.html', **context)
 
-@bp.route('/geral')
-@login_required
-@owner_required
-def relatorio_geral():
-    # Período
-    data_inicio = request.args.get('data_inicio', (date.today() - timedelta(days=30)).strftime('%Y-%m-%d'))
-    data_fim = request.args.get('data_fim', date.today().strftime('%Y-%m-%d'))
-    
-    inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-    fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
-    
-    # Vendas por período
-    vendas = Venda.query.filter(
-        db.func.date(Venda.data_venda) >= inicio,
-        db.func.date(Venda.data_venda) <= fim
-    ).all()
-    
-    # ===== NOVO: Buscar fluxos de caixa do período =====
-    fluxos_periodo = FluxoCaixa.query.filter(
+def _parcial_relatorio_geral(inicio, fim):
+    """Totais por caixa e fluxos de uma parte do período (no worker, um mês por processo)"""
+    fluxos = FluxoCaixa.query.options(*perfil('fluxo_relatorio')).filter(
         FluxoCaixa.data >= inicio,
         FluxoCaixa.data <= fim
     ).order_by(FluxoCaixa.data).all()
+
+    return totais_resumo(inicio, fim), [{
+        'data': f.data,
+        'caixa_id': f.caixa_id,
+        'caixa': {'nome': f.caixa.nome} if f.caixa else None,
+        'saldo_inicial': f.saldo_inicial or 0,
+        'total_vendas_vista': f.total_vendas_vista or 0,
+        'total_vendas_prazo': f.total_vendas_prazo or 0,
+        'total_recebimentos': f.total_recebimentos or 0,
+        'saldo_final': f.saldo_final or 0
+    } for f in fluxos]
+
+
+def _dados_relatorio_geral(inicio, fim, particoes=None):
+    """
+    particoes: partes do período calculadas separadamente (ex.: meses_do_periodo)
+    e depois juntadas; sem elas o período é lido de uma vez.
+    """
+    periodo = filtro_periodo(Venda.data_venda, inicio, fim)
+    
+    # Totais do período por caixa lidos dos resumos mensais/diários pré-agregados,
+    # e os fluxos de caixa do período, parte a parte
+    totais = {}
+    fluxos_periodo = []
+    for totais_parte, fluxos_parte in mapear_particoes(_parcial_relatorio_geral, particoes or [(inicio, fim)]):
+        somar_totais(totais, totais_parte)
+        fluxos_periodo.extend(fluxos_parte)
+    
+    # Apenas as vendas exibidas na tabela
+    vendas = Venda.query.options(*perfil('venda_lista')).filter(periodo).order_by(
+        Venda.data_venda.desc(), Venda.id.desc()
+    ).limit(20).all()
+    
+    # Primeiro e último fluxo de cada caixa no período (as partes vêm em ordem de data)
+    primeiro_fluxo = {}
+    ultimo_fluxo = {}
+    for fluxo in fluxos_periodo:
+        primeiro_fluxo.setdefault(fluxo['caixa_id'], fluxo)
+        ultimo_fluxo[fluxo['caixa_id']] = fluxo
     
     # Totais por caixa
     caixas = Caixa.query.all()
     dados_caixas = []
     
     for caixa in caixas:
-        vendas_caixa = [v for v in vendas if v.caixa_id == caixa.id]
-        total_vendas = sum(v.valor_total for v in vendas_caixa)
-        total_recebido = sum(v.valor_pago for v in vendas_caixa)
-        total_vistas = sum(v.valor_total for v in vendas_caixa if v.tipo_pagamento == 'vista')
-        total_prazos = sum(v.valor_total for v in vendas_caixa if v.tipo_pagamento == 'prazo')
-        
+        totais_caixa = totais.get(caixa.id) or dict.fromkeys(CAMPOS_RESUMO, 0)
+
         # Calcular saldo do período para este caixa
-        fluxos_caixa = [f for f in fluxos_periodo if f.caixa_id == caixa.id]
-        saldo_periodo = fluxos_caixa[-1].saldo_final - fluxos_caixa[0].saldo_inicial if fluxos_caixa else 0
-        
+        saldo_periodo = (ultimo_fluxo[caixa.id]['saldo_final'] - primeiro_fluxo[caixa.id]['saldo_inicial']
+                         if caixa.id in ultimo_fluxo else 0)
+
         dados_caixas.append({
-            'caixa': caixa,
-            'total_vendas': total_vendas,
-            'total_recebido': total_recebido,
-            'quantidade_vendas': len(vendas_caixa),
-            'total_vistas': total_vistas,
-            'total_prazos': total_prazos,
+            'caixa': {'id': caixa.id, 'nome': caixa.nome},
+            'total_vendas': totais_caixa['total_vista'] + totais_caixa['total_prazo'],
+            'total_recebido': totais_caixa['total_pago_vendas'],
+            'quantidade_vendas': totais_caixa['quantidade_vista'] + totais_caixa['quantidade_prazo'],
+            'total_vistas': totais_caixa['total_vista'],
+            'total_prazos': totais_caixa['total_prazo'],
+            'total_despesas': totais_caixa['total_despesas'],
             'saldo_periodo': saldo_periodo
         })
-    
-    # Clientes com débito
-    clientes_devedores = Cliente.query.filter(Cliente.saldo_devedor > 0).all()
-    total_a_receber = sum(c.saldo_devedor for c in clientes_devedores)
-    
-    context = {
-        'data_inicio': inicio,
-        'data_fim': fim,
-        'vendas': vendas,
+
+    def somar(*campos):
+        return sum(t[campo] for t in totais.values() for campo in campos)
+
+    return {
+        'vendas': [_venda_dados(v) for v in vendas],
+        'quantidade_vendas': somar('quantidade_vista', 'quantidade_prazo'),
         'fluxos_periodo': fluxos_periodo,  # NOVO
         'dados_caixas': dados_caixas,
-        'clientes_devedores': clientes_devedores,
-        'total_a_receber': total_a_receber,
-        F'total_vendas_periodo': sum(v.valor_total for v in vendas),
-        'total_recebido_periodo': sum(v.valor_pago for v in vendas)
+        'total_vendas_periodo': somar('total_vista', 'total_prazo'),
+        'total_recebido_periodo': somar('total_pago_vendas'),
+        'total_vistas_periodo': somar('total_vista'),
+        'total_prazos_periodo': somar('total_prazo'),
+        'total_despesas_periodo': somar('total_despesas')
+    }
+
+
+@tipo_tarefa('relatorio_geral', reaproveitar=True)
+def tarefa_relatorio_geral(inicio, fim, progresso=None):
+    """
+    Relatório geral de um período longo, gerado pelo worker com os meses em
+    paralelo; em série (TAREFAS_ASSINCRONAS=False) lê o período de uma vez
+    """
+    particoes = meses_do_periodo(inicio, fim) if paralelo_disponivel() else None
+    return _dados_relatorio_geral(inicio, fim, particoes=particoes)
+
+
+@bp.route('/geral')
+@login_required
+@owner_required
+def relatorio_geral():
+    # Período
+    data_inicio = request.args.get('data_inicio', (date.today() - timedelta(days=30)).strftime('%Y-%m-%d'))
+    data_fim = request.args.get('data_fim', date.today().strftime('%Y-%m-%d'))
+    
+    inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
+    fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
+    
+    if (fim - inicio).days + 1 <= current_app.config.get('TAREFAS_RELATORIO_GERAL_DIAS', 92):
+        dados = cache_relatorios.obter(
+            'relatorio_geral', None, inicio, fim,
+            lambda: _dados_relatorio_geral(inicio, fim)
+        )
+    else:
+        # Período longo: gerado pelo worker; enquanto não termina, a página acompanha a tarefa
+        tarefa = None
+
+        def pela_fila():
+            nonlocal tarefa
+            tarefa = enfileirar('relatorio_geral', usuario_id=current_user.id, inicio=inicio, fim=fim)
+            return resultado_tarefa(tarefa) if tarefa.status == CONCLUIDA else None
+
+        dados = cache_relatorios.obter('relatorio_geral', None, inicio, fim, pela_fila)
+        if dados is None:
+            return render_template('tarefas/aguardando.html', tarefa=tarefa,
+                                   titulo=f'Relatório Geral de {inicio.strftime("%d/%m/%Y")} a {fim.strftime("%d/%m/%Y")}',
+                                   voltar=url_for('relatorios.relatorio_geral')), 202
+    
+    # Contas a receber não dependem do período: resumo e maiores devedores em cache próprio
+    return render_template('relatorios/geral.html', data_inicio=inicio, data_fim=fim,
+                           recebiveis=painel_recebiveis(), **dados)
+
+
+def _dados_comparativo(inicio, fim):
+    """Totais por mês de cada ano e produtos mais vendidos por ano, de inicio (1º de janeiro) a fim"""
+    anos = list(range(inicio.year, fim.year + 1))
+    mensais = totais_por_mes(inicio, fim)
+
+    def valores(totais):
+        return {
+            'vendas': totais['total_vista'] + totais['total_prazo'],
+            'quantidade': totais['quantidade_vista'] + totais['quantidade_prazo'],
+            'recebimentos': totais['total_recebimentos'],
+            'despesas': totais['total_despesas'],
+        }
+
+    meses = []
+    for mes in range(1, 13):
+        meses.append({'mes': mes, 'anos': [
+            valores(mensais.get(date(ano, mes, 1)) or dict.fromkeys(CAMPOS_RESUMO, 0))
+            if date(ano, mes, 1) <= fim else None
+            for ano in anos
+        ]})
+
+    totais_ano = []
+    for posicao, ano in enumerate(anos):
+        totais = {campo: sum(m['anos'][posicao][campo] for m in meses if m['anos'][posicao])
+                  for campo in ('vendas', 'quantidade', 'recebimentos', 'despesas')}
+        anterior = totais_ano[-1]['vendas'] if totais_ano else None
+        totais['variacao'] = (float((totais['vendas'] - anterior) / anterior * 100) if anterior else None)
+        totais_ano.append(dict(totais, ano=ano))
+
+    produtos_ano = [
+        {'ano': ano, 'itens': produtos_mais_vendidos(max(inicio, date(ano, 1, 1)), min(fim, date(ano, 12, 31)),
+                                                     PRODUTOS_COMPARATIVO)}
+        for ano in anos
+    ]
+    ids = {item['produto_id'] for produtos in produtos_ano for item in produtos['itens']}
+    nomes = dict(db.session.execute(db.select(Produto.id, Produto.descricao).where(Produto.id.in_(ids))).all()) if ids else {}
+    for produtos in produtos_ano:
+        for item in produtos['itens']:
+            item['descricao'] = nomes.get(item['produto_id'], f"Produto {item['produto_id']}")
+
+    cobertura = cobertura_snapshot()
+    return {
+        'anos': anos,
+        'meses': meses,
+        'totais_ano': totais_ano,
+        'produtos_ano': produtos_ano,
+        'snapshot_ate': cobertura[1] if cobertura else None,
     }
-    print(fluxos_periodo)
-    return render_template('relatorios/geral.html', **context)
+
+
+@bp.route('/comparativo')
+@login_required
+@owner_required
+def comparativo():
+    """
+    Comparativo ano a ano (?anos=N, ano atual incluído): os dias fechados
+    saem do snapshot colunar, sem consultar vendas no banco
+    """
+    anos = max(1, min(request.args.get('anos', ANOS_COMPARATIVO, type=int), ANOS_COMPARATIVO_MAX))
+    fim = date.today()
+    inicio = date(fim.year - anos + 1, 1, 1)
+    dados = cache_relatorios.obter('comparativo', None, inicio, fim, lambda: _dados_comparativo(inicio, fim))
+    if request.args.get('formato') == 'json':
+        return jsonify(dados)
+    return render_template('relatorios/comparativo.html', quantidade_anos=anos, **dados)
+
+
+@bp.route('/envelhecimento')
+@login_required
+@owner_required
+def envelhecimento():
+    """Contas a receber por cliente e idade da venda (0-30, 31-60, 61-90, 90+ dias)"""
+    hoje = date.today()
+    dados = envelhecimento_recebiveis(hoje)
+    if request.args.get('formato') == 'json':
+        return jsonify(dados)
+    return render_template('relatorios/envelhecimento.html', hoje=hoje, **dados)
+
+
+@bp.route('/recebiveis')
+@login_required
+@owner_required
+def recebiveis():
+    """
+    Contas a receber: resumo, maiores devedores (em cache) e as vendas em
+    aberto das mais antigas para as mais recentes, paginadas por cursor
+    (?cliente_id= filtra um cliente)
+    """
+    cliente_id = request.args.get('cliente_id', type=int)
+    vendas = paginar_cursor(vendas_em_aberto(cliente_id), [Venda.data_venda, Venda.id],
+                            lambda v: (v.data_venda, v.id), POR_PAGINA_RECEBIVEIS)
+    cliente = db.session.get(Cliente, cliente_id) if cliente_id else None
+    return render_template('relatorios/recebiveis.html', vendas=vendas, cliente=cliente,
+                           hoje=date.today(), **painel_recebiveis())
+
+
+@bp.route('/api/recebiveis')
+@login_required
+@owner_required
+def api_recebiveis():
+    """Vendas em aberto, mais antigas primeiro, paginadas por cursor (?apos=/?antes=, ?cliente_id=)"""
+    hoje = date.today()
+    vendas = paginar_cursor(vendas_em_aberto(request.args.get('cliente_id', type=int)),
+                            [Venda.data_venda, Venda.id], lambda v: (v.data_venda, v.id), POR_PAGINA_RECEBIVEIS)
+    return jsonify(dados_pagina(vendas, lambda v: {
+        'id': v.id,
+        'data_venda': v.data_venda.isoformat(),
+        'idade_dias': (hoje - v.data_venda.date()).days,
+        'cliente_id': v.cliente_id,
+        'cliente': v.cliente.nome if v.cliente else None,
+        'caixa': v.caixa_local.nome if v.caixa_local else None,
+        'valor_total': v.valor_total,
+        'valor_pago': v.valor_pago or 0,
+        'em_aberto': v.valor_total - (v.valor_pago or 0),
+        'status': v.status
+    }))
+
+
+@bp.route('/exportar/<string:tipo>')
+@login_required
+@owner_required
+def exportar(tipo):
+    """
+    Exporta vendas (com itens), pagamentos ou despesas de um período em CSV
+    ou JSON Lines (?formato=csv|jsonl, ?data_inicio=, ?data_fim=, ?caixa_id=).
+    A resposta é gerada enquanto as linhas são lidas do banco.
+    """
+    if tipo not in EXPORTACOES:
+        abort(404)
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'jsonl'):
+        abort(400)
+
+    try:
+        data_inicio = datetime.strptime(
+            request.args.get('data_inicio', date.today().replace(day=1).strftime('%Y-%m-%d')), '%Y-%m-%d'
+        ).date()
+        data_fim = datetime.strptime(request.args.get('data_fim', date.today().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+    except ValueError:
+        abort(400)
+    caixa_id = request.args.get('caixa_id', type=int)
+
+    registros, colunas, achatar = EXPORTACOES[tipo]
+    linhas = registros(data_inicio, data_fim, caixa_id=caixa_id)
+    if formato == 'csv':
+        corpo, mimetype = gerar_csv(linhas, colunas, achatar), 'text/csv'
+    else:
+        corpo, mimetype = gerar_jsonl(linhas), 'application/x-ndjson'
+
+    nome_arquivo = f'{tipo}_{data_inicio:%Y%m%d}_{data_fim:%Y%m%d}.{formato}'
+    resposta = Response(stream_with_context(corpo), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
 
 
 @bp.route('/fluxo-tempo-real')
@@ -177,21 +457,73 @@ def fluxo_tempo_real():
     """API para atualização em tempo real do dashboard"""
     hoje = date.today()
     
-    # Vendas do dia
-    vendas_hoje = Venda.query.filter(
-        db.func.date(Venda.data_venda) == hoje
-    ).all()
+    # Se for operador de caixa, filtrar por seu caixa (no próprio SQL)
+    caixa_id = None
+    if not current_user.is_owner and current_user.caixa_id:
+        caixa_id = current_user.caixa_id
+    
+    dados = cache_relatorios.obter(
+        'fluxo_tempo_real', caixa_id, hoje, hoje,
+        lambda: resumo_vendas_dia(hoje, caixa_id=caixa_id)
+    )
     
-    # Se for operador de caixa, filtrar por seu caixa
+    return jsonify(dados)
+
+
+@bp.route('/fluxo-stream')
+@login_required
+def fluxo_stream():
+    """
+    Server-Sent Events com os totais do dia, enviados quando uma venda,
+    pagamento ou despesa é confirmada (substitui o polling de fluxo_tempo_real)
+    """
+    caixa_id = None
     if not current_user.is_owner and current_user.caixa_id:
-        vendas_hoje = [v for v in vendas_hoje if v.caixa_id == current_user.caixa_id]
-    
-    dados = {
-        'total_vendas': sum(v.valor_total for v in vendas_hoje),
-        'total_recebido': sum(v.valor_pago for v in vendas_hoje),
-        'quantidade_vendas': len(vendas_hoje),
-        'vendas_prazo': len([v for v in vendas_hoje if v.tipo_pagamento == 'prazo']),
-        'vendas_vista': len([v for v in vendas_hoje if v.tipo_pagamento == 'vista'])
-    }
+        caixa_id = current_user.caixa_id
+    cliente_id = request.args.get('cliente_id', type=int)
+    
+    duracao = current_app.config.get('TEMPO_REAL_DURACAO_CONEXAO', 300)
+    keepalive = current_app.config.get('TEMPO_REAL_KEEPALIVE', 15)
+    
+    # Estado inicial: uma consulta por conexão, não por intervalo. Calculado antes de
+    # reservar a vaga, para que uma falha aqui não deixe a vaga presa até o restart
+    desde = tempo_real.seq
+    inicial = resumo_vendas_dia(date.today(), caixa_id=caixa_id)
+    inicial['total_despesas'] = total_despesas_dia(date.today(), caixa_id=caixa_id)
+    
+    # Processo no limite de streams: 204 faz o EventSource desistir e a página cai no polling
+    if not tempo_real.reservar_conexao():
+        return Response(status=204)
+    
+    def eventos():
+        nonlocal desde
+        # O navegador reconecta sozinho quando a conexão é encerrada
+        yield 'retry: 3000\n\n'
+        yield formatar_evento(inicial, 'fluxo')
+        
+        fim = time.monotonic() + duracao
+        while time.monotonic() < fim:
+            novos, desde = tempo_real.esperar(desde, timeout=keepalive)
+            if not novos:
+                yield ': keepalive\n\n'
+                continue
+            
+            # Só o último total interessa; eventos intermediários são descartados
+            fluxo = None
+            for dados in novos:
+                if dados.get('tipo') == 'caixa':
+                    if caixa_id is None:
+                        fluxo = dados['geral']
+                    elif dados.get('caixa_id') == caixa_id:
+                        fluxo = dados['caixa']
+                elif dados.get('tipo') == 'cliente' and dados.get('cliente_id') == cliente_id:
+                    yield formatar_evento(dados, 'cliente')
+            if fluxo is not None:
+                yield formatar_evento(fluxo, 'fluxo')
     
-    return jsonify(dados)
\ No newline at end of file
+    resposta = Response(eventos(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    resposta.call_on_close(tempo_real.liberar_conexao)
+    return resposta
@@ -0,0 +1,77 @@
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+# Bind configurado em SQLALCHEMY_BINDS (DATABASE_URL_LEITURA)
+BIND_LEITURA = 'leitura'
+
+
+class SessaoRoteada(Session):
+    """
+    Sessão que manda os SELECTs para a réplica quando a requisição foi
+    marcada como somente leitura (g.banco_leitura). Flush, INSERT/UPDATE/
+    DELETE, SELECT ... FOR UPDATE e session.connection() (savepoints)
+    continuam no primário. Depois da primeira escrita a requisição inteira
+    fica no primário: a réplica ainda não tem a linha recém-gravada (ex.: o
+    refresh da Tarefa enfileirada por um GET de relatório).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.escrita_no_primario = True
+            elif (g.get('banco_leitura') and not g.get('escrita_no_primario')
+                  and getattr(clause, 'is_select', False)
+                  and getattr(clause, '_for_update_arg', None) is None):
+                engine = self._db.engines.get(BIND_LEITURA)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class RoteadorLeitura:
+    """
+    Decide por requisição se as leituras podem ir para a réplica: só GET/HEAD
+    dos endpoints em LEITURA_ROTAS ('blueprint.*' vale para o blueprint todo),
+    e nunca logo depois de uma escrita do mesmo usuário - quem acabou de
+    registrar uma venda vê a listagem pelo primário durante
+    LEITURA_JANELA_POS_ESCRITA segundos, mesmo com a réplica atrasada.
+
+    Sem o bind 'leitura' configurado não faz nada.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if BIND_LEITURA not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            return
+        rotas = app.config.get('LEITURA_ROTAS', ())
+        self._endpoints = {rota for rota in rotas if not rota.endswith('.*')}
+        self._blueprints = {rota[:-2] for rota in rotas if rota.endswith('.*')}
+
+        app.before_request(self._escolher_banco)
+        app.after_request(self._lembrar_escrita)
+        app.extensions['roteador_leitura'] = self
+
+    def roteado(self, endpoint):
+        if not endpoint:
+            return False
+        return endpoint in self._endpoints or endpoint.split('.', 1)[0] in self._blueprints
+
+    def _escolher_banco(self):
+        from flask import current_app
+
+        if request.method not in ('GET', 'HEAD') or not self.roteado(request.endpoint):
+            return
+        janela = current_app.config.get('LEITURA_JANELA_POS_ESCRITA', 10)
+        if time.time() - session.get('ultima_escrita', 0) < janela:
+            return
+        g.banco_leitura = True
+
+    def _lembrar_escrita(self, response):
+        if g.get('escrita_no_primario'):
+            session['ultima_escrita'] = time.time()
+        return response
@@ -0,0 +1,54 @@
+from caixa.carregamento import perfil
+from caixa.extensoes import db
+from caixa.models import Venda, Despesa
+from caixa.periodos import filtro_dia
+
+
+def resumo_vendas_dia(data, caixa_id=None):
+    """
+    Totais de vendas de um dia calculados no banco com uma única consulta
+    (SUM/COUNT ... GROUP BY tipo_pagamento), sem carregar as vendas.
+    """
+    query = db.session.query(
+        Venda.tipo_pagamento,
+        db.func.count(Venda.id),
+        db.func.sum(Venda.valor_total),
+        db.func.sum(Venda.valor_pago)
+    ).filter(filtro_dia(Venda.data_venda, data))
+
+    if caixa_id:
+        query = query.filter(Venda.caixa_id == caixa_id)
+
+    resumo = {
+        'total_vendas': 0,
+        'total_recebido': 0,
+        'quantidade_vendas': 0,
+        'vendas_prazo': 0,
+        'vendas_vista': 0
+    }
+    for tipo_pagamento, quantidade, total, recebido in query.group_by(Venda.tipo_pagamento):
+        resumo['total_vendas'] += total or 0
+        resumo['total_recebido'] += recebido or 0
+        resumo['quantidade_vendas'] += quantidade
+        if tipo_pagamento == 'prazo':
+            resumo['vendas_prazo'] = quantidade
+        elif tipo_pagamento == 'vista':
+            resumo['vendas_vista'] = quantidade
+
+    return resumo
+
+
+def ultimas_vendas_dia(data, limite=5, caixa_id=None):
+    """Vendas mais recentes do dia (apenas as que serão exibidas)"""
+    query = Venda.query.options(*perfil('venda_lista')).filter(filtro_dia(Venda.data_venda, data))
+    if caixa_id:
+        query = query.filter_by(caixa_id=caixa_id)
+    return query.order_by(Venda.data_venda.desc(), Venda.id.desc()).limit(limite).all()
+
+
+def total_despesas_dia(data, caixa_id=None):
+    """Soma das despesas de um dia (SUM no banco)"""
+    query = db.session.query(db.func.sum(Despesa.valor)).filter(Despesa.data_despesa == data)
+    if caixa_id:
+        query = query.filter(Despesa.caixa_id == caixa_id)
+    return query.scalar() or 0
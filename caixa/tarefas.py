@@ -0,0 +1,350 @@
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app, jsonify, url_for
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+from sqlalchemy import delete, update
+
+from caixa.dinheiro import para_json
+from caixa.extensoes import db
+from caixa.models import Tarefa, agora_brasil
+from caixa.paralelo import dividir_processos
+from caixa.registro import Registro
+
+log = logging.getLogger(__name__)
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+ERRO = 'erro'
+
+# Tipos registrados com @tipo_tarefa: {nome: (função, reaproveitar)}
+TIPOS = {}
+
+# Limpeza de tarefas antigas e liberação das abandonadas, no máximo uma vez por intervalo
+INTERVALO_MANUTENCAO = 60
+
+
+# ========== SERIALIZAÇÃO ==========
+
+class _TagDecimal(JSONTag):
+    __slots__ = ()
+    key = ' dec'
+
+    def check(self, value):
+        return isinstance(value, Decimal)
+
+    def to_json(self, value):
+        return str(value)
+
+    def to_python(self, value):
+        return Decimal(value)
+
+
+class _TagData(JSONTag):
+    __slots__ = ()
+    key = ' data'
+
+    def check(self, value):
+        return isinstance(value, date) and not isinstance(value, datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return date.fromisoformat(value)
+
+
+class _TagDataHora(JSONTag):
+    # Antes do TagDateTime do Flask, que usa http_date e perde os microssegundos
+    __slots__ = ()
+    key = ' dh'
+
+    def check(self, value):
+        return isinstance(value, datetime)
+
+    def to_json(self, value):
+        return value.isoformat()
+
+    def to_python(self, value):
+        return datetime.fromisoformat(value)
+
+
+class SerializadorTarefas(TaggedJSONSerializer):
+    """JSON dos parâmetros e resultados: datas e dinheiro voltam com o tipo original"""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__()
+        self.register(_TagDataHora, index=0)
+        self.register(_TagData)
+        self.register(_TagDecimal)
+
+
+serializador = SerializadorTarefas()
+
+
+def _chave(tipo, parametros):
+    return f'{tipo}:' + json.dumps(parametros, sort_keys=True, separators=(',', ':'), default=para_json)
+
+
+# ========== REGISTRO E ENFILEIRAMENTO ==========
+
+def tipo_tarefa(nome, reaproveitar=False):
+    """
+    Registra funcao(progresso=None, **parametros) como um tipo de tarefa.
+
+    A função roda com contexto de app no worker e devolve o resultado
+    (dados simples, datas e Decimal). progresso(processados, total) pode ser
+    chamado entre transações: grava o andamento com um commit. Com
+    reaproveitar=True, uma tarefa igual concluída há menos de
+    TAREFAS_RESULTADO_TTL segundos é devolvida em vez de uma nova.
+    """
+    def registrar(funcao):
+        TIPOS[nome] = (funcao, reaproveitar)
+        return funcao
+    return registrar
+
+
+def tarefas_assincronas():
+    return current_app.config.get('TAREFAS_ASSINCRONAS', True)
+
+
+def enfileirar(tipo, usuario_id=None, **parametros):
+    """
+    Cria a tarefa (ou devolve uma igual pendente, em execução ou, se o tipo
+    reaproveita resultados, concluída recentemente). Com
+    TAREFAS_ASSINCRONAS=False a tarefa é executada aqui mesmo.
+    """
+    _, reaproveitar = TIPOS[tipo]
+    chave = _chave(tipo, parametros)
+
+    abertas = Tarefa.status.in_((PENDENTE, EXECUTANDO))
+    ttl = current_app.config.get('TAREFAS_RESULTADO_TTL', 300)
+    if reaproveitar and ttl:
+        abertas = db.or_(abertas, db.and_(Tarefa.status == CONCLUIDA,
+                                          Tarefa.concluida_em >= agora_brasil() - timedelta(seconds=ttl)))
+    existente = Tarefa.query.filter(Tarefa.chave == chave, abertas).order_by(Tarefa.id.desc()).first()
+    if existente:
+        return existente
+
+    tarefa = Tarefa(tipo=tipo, chave=chave, parametros=serializador.dumps(parametros),
+                    status=PENDENTE, usuario_id=usuario_id, criada_em=agora_brasil())
+    db.session.add(tarefa)
+    db.session.commit()
+    log.info('Tarefa %s (%s) enfileirada', tarefa.id, tipo, extra={'tarefa_id': tarefa.id, 'tipo': tipo})
+
+    if not tarefas_assincronas():
+        executar(tarefa)
+    return tarefa
+
+
+def resultado_tarefa(tarefa):
+    return serializador.loads(tarefa.resultado) if tarefa.resultado else None
+
+
+def dados_tarefa(tarefa, incluir_resultado=False):
+    """Situação da tarefa para as respostas JSON"""
+    dados = {
+        'id': tarefa.id,
+        'tipo': tarefa.tipo,
+        'status': tarefa.status,
+        'concluido': tarefa.status == CONCLUIDA,
+        'processados': tarefa.processados,
+        'total': tarefa.total,
+        'percentual': round(100 * tarefa.processados / tarefa.total, 1) if tarefa.total else None,
+        'erro': tarefa.erro,
+        'tentativas': tarefa.tentativas,
+        'criada_em': tarefa.criada_em.isoformat() if tarefa.criada_em else None,
+        'iniciada_em': tarefa.iniciada_em.isoformat() if tarefa.iniciada_em else None,
+        'concluida_em': tarefa.concluida_em.isoformat() if tarefa.concluida_em else None,
+        'acompanhar': url_for('main.status_tarefa', id=tarefa.id),
+    }
+    if incluir_resultado and tarefa.status == CONCLUIDA:
+        dados['resultado'] = resultado_tarefa(tarefa)
+    return dados
+
+
+def resposta_tarefa(tarefa, mensagem, **extras):
+    """Resposta das rotas que enfileiram: 202 enquanto a tarefa não termina"""
+    dados = dados_tarefa(tarefa, incluir_resultado=True)
+    dados.update(sucesso=tarefa.status != ERRO, tarefa_id=tarefa.id, mensagem=mensagem, **extras)
+    return jsonify(dados), 200 if tarefa.status in (CONCLUIDA, ERRO) else 202
+
+
+# ========== EXECUÇÃO ==========
+
+def reservar(trabalhador):
+    """
+    Marca a próxima tarefa pendente como em execução e a devolve (None se a
+    fila estiver vazia). O UPDATE condicionado ao status garante que dois
+    trabalhadores não peguem a mesma; no PostgreSQL o SKIP LOCKED evita que
+    esperem um pelo outro.
+    """
+    proxima = db.select(Tarefa.id).where(Tarefa.status == PENDENTE).order_by(Tarefa.id).limit(1) \
+        .with_for_update(skip_locked=True).scalar_subquery()
+    agora = agora_brasil()
+    tarefa_id = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == proxima, Tarefa.status == PENDENTE)
+        .values(status=EXECUTANDO, trabalhador=trabalhador, iniciada_em=agora, atualizada_em=agora,
+                tentativas=Tarefa.tentativas + 1)
+        .returning(Tarefa.id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    db.session.commit()
+    return db.session.get(Tarefa, tarefa_id) if tarefa_id else None
+
+
+def executar(tarefa):
+    """Executa a tarefa e grava o resultado ou o erro"""
+    funcao, _ = TIPOS[tarefa.tipo]
+    if tarefa.status == PENDENTE:
+        tarefa.status, tarefa.tentativas = EXECUTANDO, tarefa.tentativas + 1
+        tarefa.iniciada_em = tarefa.atualizada_em = agora_brasil()
+        db.session.commit()
+
+    def progresso(processados, total):
+        tarefa.processados, tarefa.total = processados, total
+        tarefa.atualizada_em = agora_brasil()
+        db.session.commit()
+
+    inicio = time.monotonic()
+    try:
+        resultado = funcao(progresso=progresso, **serializador.loads(tarefa.parametros))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.exception('Tarefa %s (%s) falhou', tarefa.id, tarefa.tipo,
+                      extra={'tarefa_id': tarefa.id, 'tipo': tarefa.tipo})
+        tarefa.status, tarefa.erro = ERRO, f'{type(e).__name__}: {e}'
+    else:
+        tarefa.status, tarefa.erro = CONCLUIDA, None
+        tarefa.resultado = serializador.dumps(resultado)
+        if tarefa.total:
+            tarefa.processados = tarefa.total
+        log.info('Tarefa %s (%s) concluída', tarefa.id, tarefa.tipo, extra={
+            'tarefa_id': tarefa.id, 'tipo': tarefa.tipo, 'duracao_ms': round((time.monotonic() - inicio) * 1000, 1),
+        })
+    tarefa.concluida_em = tarefa.atualizada_em = agora_brasil()
+    db.session.commit()
+
+
+def liberar_abandonadas():
+    """
+    Tarefas em execução sem sinal de vida há TAREFAS_TEMPO_LIMITE segundos
+    (worker derrubado no meio) voltam para a fila, até TAREFAS_MAX_TENTATIVAS.
+    """
+    limite = agora_brasil() - timedelta(seconds=current_app.config.get('TAREFAS_TEMPO_LIMITE', 1800))
+    abandonada = db.and_(Tarefa.status == EXECUTANDO, Tarefa.atualizada_em < limite)
+    esgotada = Tarefa.tentativas >= current_app.config.get('TAREFAS_MAX_TENTATIVAS', 3)
+    db.session.execute(
+        update(Tarefa).where(abandonada, esgotada)
+        .values(status=ERRO, erro='Tempo esgotado', concluida_em=agora_brasil())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(Tarefa).where(abandonada, ~esgotada)
+        .values(status=PENDENTE, trabalhador=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def limpar_antigas():
+    """Apaga as tarefas terminadas há mais de TAREFAS_RETENCAO_DIAS dias"""
+    limite = agora_brasil() - timedelta(days=current_app.config.get('TAREFAS_RETENCAO_DIAS', 7))
+    db.session.execute(delete(Tarefa).where(Tarefa.status.in_((CONCLUIDA, ERRO)), Tarefa.concluida_em < limite))
+    db.session.commit()
+
+
+# ========== WORKER ==========
+
+def trabalhar(intervalo=1.0, uma_vez=False, parar=None):
+    """
+    Laço de um processo trabalhador (com contexto de app): pega uma tarefa
+    por vez; com a fila vazia espera `intervalo` segundos (ou sai, com
+    uma_vez). parar: threading.Event para encerrar depois da tarefa atual.
+    """
+    parar = parar or threading.Event()
+    nome = f'{socket.gethostname()}:{os.getpid()}'
+    ultima_manutencao = 0
+    executadas = 0
+    while not parar.is_set():
+        if time.monotonic() - ultima_manutencao > INTERVALO_MANUTENCAO:
+            liberar_abandonadas()
+            limpar_antigas()
+            ultima_manutencao = time.monotonic()
+
+        tarefa = reservar(nome)
+        if tarefa is None:
+            if uma_vez:
+                break
+            parar.wait(intervalo)
+            continue
+        executar(tarefa)
+        executadas += 1
+        db.session.remove()
+    return executadas
+
+
+def _ao_sinal(parar):
+    def encerrar(signum, frame):
+        parar.set()
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+
+def _processo_trabalhador(app, intervalo, uma_vez, trabalhadores):
+    parar = threading.Event()
+    _ao_sinal(parar)
+    dividir_processos(trabalhadores)
+    with app.app_context():
+        # Conexões herdadas do pai não podem ser usadas pelo filho
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        try:
+            trabalhar(intervalo=intervalo, uma_vez=uma_vez, parar=parar)
+        finally:
+            Registro.encerrar()
+
+
+def executar_trabalhadores(app, processos=1, intervalo=1.0, uma_vez=False):
+    """
+    Sobe `processos` trabalhadores (fork), cada um com suas conexões, e
+    espera todos terminarem. SIGTERM/SIGINT encerram depois da tarefa atual.
+    Com um processo, ou sem fork disponível, trabalha no processo atual.
+    Os trabalhadores repartem entre si os processos de RELATORIOS_PROCESSOS.
+    """
+    if processos <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        parar = threading.Event()
+        _ao_sinal(parar)
+        return trabalhar(intervalo=intervalo, uma_vez=uma_vez, parar=parar)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    contexto = multiprocessing.get_context('fork')
+    filhos = [contexto.Process(target=_processo_trabalhador, args=(app, intervalo, uma_vez, processos),
+                               name=f'caixa-worker-{i + 1}') for i in range(processos)]
+    for filho in filhos:
+        filho.start()
+
+    def repassar(signum, frame):
+        for filho in filhos:
+            if filho.is_alive():
+                os.kill(filho.pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, repassar)
+    signal.signal(signal.SIGINT, repassar)
+
+    for filho in filhos:
+        filho.join()
@@ -0,0 +1,220 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import has_request_context, request
+
+from caixa.dinheiro import para_json
+
+
+class BrokerSQLite:
+    """
+    Canal de eventos compartilhado entre processos (workers do gunicorn)
+    usando um arquivo SQLite local: quem publica insere uma linha, cada
+    processo lê as linhas novas e repassa aos seus assinantes.
+    """
+
+    def __init__(self, caminho, retencao_segundos=300):
+        self.caminho = caminho
+        self.retencao_segundos = retencao_segundos
+        with self._conectar() as conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS eventos ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'criado_em REAL NOT NULL, '
+                'dados TEXT NOT NULL)'
+            )
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=5)
+
+    def publicar(self, dados):
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute(
+                'INSERT INTO eventos (criado_em, dados) VALUES (?, ?)',
+                (agora, json.dumps(dados, default=para_json))
+            )
+            conexao.execute('DELETE FROM eventos WHERE criado_em < ?', (agora - self.retencao_segundos,))
+
+    def ultimo_id(self):
+        with self._conectar() as conexao:
+            return conexao.execute('SELECT COALESCE(MAX(id), 0) FROM eventos').fetchone()[0]
+
+    def ler_desde(self, ultimo_id):
+        with self._conectar() as conexao:
+            linhas = conexao.execute(
+                'SELECT id, dados FROM eventos WHERE id > ? ORDER BY id', (ultimo_id,)
+            ).fetchall()
+        return [(id_evento, json.loads(dados)) for id_evento, dados in linhas]
+
+
+class Publicador:
+    """
+    Distribui eventos de um publicador para muitos assinantes (abas abertas).
+
+    Sem broker, os eventos ficam restritos ao processo atual. Com
+    TEMPO_REAL_BROKER apontando para um arquivo SQLite, uma thread por
+    processo lê os eventos publicados por qualquer worker.
+
+    Cada stream aberto prende uma thread do gunicorn: só as páginas de
+    TEMPO_REAL_ROTAS abrem o stream e cada processo aceita no máximo
+    TEMPO_REAL_MAX_CONEXOES; as demais abas ficam no polling.
+    """
+
+    def __init__(self, app=None):
+        self._condicao = threading.Condition()
+        self._eventos = deque(maxlen=256)
+        self._seq = 0
+        self._broker = None
+        self._intervalo = 0.5
+        self._ouvinte_pid = None
+        self._conexoes = 0
+        self._max_conexoes = 4
+        self._endpoints = set()
+        self._blueprints = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        caminho = app.config.get('TEMPO_REAL_BROKER')
+        if caminho:
+            self._broker = BrokerSQLite(caminho)
+        self._intervalo = app.config.get('TEMPO_REAL_INTERVALO_BROKER', 0.5)
+        self._max_conexoes = app.config.get('TEMPO_REAL_MAX_CONEXOES', 4)
+        rotas = app.config.get('TEMPO_REAL_ROTAS', ())
+        self._endpoints = {rota for rota in rotas if not rota.endswith('.*')}
+        self._blueprints = {rota[:-2] for rota in rotas if rota.endswith('.*')}
+        app.context_processor(self._contexto)
+        app.extensions['tempo_real'] = self
+
+    def _contexto(self):
+        endpoint = request.endpoint if has_request_context() else None
+        return {'stream_tempo_real': self.na_pagina(endpoint)}
+
+    def na_pagina(self, endpoint):
+        """Se a página do endpoint abre o stream (as demais atualizam por polling)"""
+        if not endpoint:
+            return False
+        return endpoint in self._endpoints or endpoint.split('.', 1)[0] in self._blueprints
+
+    def reservar_conexao(self):
+        """Reserva uma thread para um stream; False quando o processo já está no limite"""
+        with self._condicao:
+            if self._conexoes >= self._max_conexoes:
+                return False
+            self._conexoes += 1
+            return True
+
+    def liberar_conexao(self):
+        with self._condicao:
+            self._conexoes -= 1
+
+    @property
+    def seq(self):
+        with self._condicao:
+            return self._seq
+
+    def publicar(self, dados):
+        """Envia um evento a todos os assinantes (de todos os workers, se houver broker)"""
+        if self._broker:
+            self._iniciar_ouvinte()
+            try:
+                self._broker.publicar(dados)
+                return
+            except sqlite3.Error:
+                # Broker indisponível: ao menos os assinantes deste worker recebem
+                pass
+        self._entregar(dados)
+
+    def _entregar(self, dados):
+        with self._condicao:
+            self._seq += 1
+            self._eventos.append((self._seq, dados))
+            self._condicao.notify_all()
+
+    def esperar(self, desde, timeout):
+        """
+        Bloqueia até haver eventos com seq > desde (ou até o timeout).
+        Retorna (eventos, novo_seq).
+        """
+        self._iniciar_ouvinte()
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._seq > desde, timeout=timeout)
+            eventos = [dados for seq, dados in self._eventos if seq > desde]
+            return eventos, self._seq
+
+    def _iniciar_ouvinte(self):
+        # Uma thread por processo; após o fork do gunicorn cada worker cria a sua
+        if not self._broker or self._ouvinte_pid == os.getpid():
+            return
+        with self._condicao:
+            if self._ouvinte_pid == os.getpid():
+                return
+            self._ouvinte_pid = os.getpid()
+        ultimo_id = self._broker.ultimo_id()
+        threading.Thread(target=self._ouvir_broker, args=(ultimo_id,), daemon=True).start()
+
+    def _ouvir_broker(self, ultimo_id):
+        while True:
+            try:
+                for id_evento, dados in self._broker.ler_desde(ultimo_id):
+                    ultimo_id = id_evento
+                    self._entregar(dados)
+            except sqlite3.Error:
+                pass
+            time.sleep(self._intervalo)
+
+
+def formatar_evento(dados, evento=None):
+    """Formata um evento no protocolo Server-Sent Events"""
+    linhas = []
+    if evento:
+        linhas.append(f'event: {evento}')
+    linhas.append(f'data: {json.dumps(dados, default=para_json)}')
+    return '\n'.join(linhas) + '\n\n'
+
+
+def notificar_caixa(caixa_id, cliente_id=None):
+    """
+    Calcula uma única vez os totais do dia (do caixa e geral) e publica para
+    todos os assinantes. Chamado depois do commit de vendas, pagamentos e despesas.
+    """
+    from datetime import date
+    from caixa.extensoes import tempo_real
+    from caixa.resumos import resumo_vendas_dia, total_despesas_dia
+
+    hoje = date.today()
+    geral = resumo_vendas_dia(hoje)
+    geral['total_despesas'] = total_despesas_dia(hoje)
+
+    dados = {'tipo': 'caixa', 'caixa_id': caixa_id, 'geral': geral}
+    if caixa_id:
+        caixa = resumo_vendas_dia(hoje, caixa_id=caixa_id)
+        caixa['total_despesas'] = total_despesas_dia(hoje, caixa_id=caixa_id)
+        dados['caixa'] = caixa
+    tempo_real.publicar(dados)
+
+    if cliente_id:
+        notificar_cliente(cliente_id)
+
+
+def notificar_cliente(cliente_id):
+    """Publica o saldo atualizado de um cliente"""
+    from caixa.extensoes import db, tempo_real
+    from caixa.models import Cliente
+
+    cliente = db.session.get(Cliente, cliente_id)
+    if not cliente:
+        return
+    tempo_real.publicar({
+        'tipo': 'cliente',
+        'cliente_id': cliente.id,
+        'limite': cliente.limite_credito,
+        'saldo': cliente.saldo_devedor,
+        'disponivel': cliente.limite_credito - cliente.saldo_devedor
+    })
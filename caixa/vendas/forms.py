@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
 from flask_wtf import FlaskForm
-from wtforms import IntegerField, SelectField, FloatField, TextAreaField, SubmitField, FieldList, FormField, HiddenField
+from wtforms import IntegerField, SelectField, TextAreaField, SubmitField, FieldList, FormField, HiddenField
 from wtforms.validators import DataRequired, NumberRange, Optional
+from caixa.dinheiro import CENTAVO, CampoDinheiro
 
 class ItemVendaForm(FlaskForm):
     class Meta:
@@ -21,7 +22,7 @@ class VendaForm(FlaskForm):
     submit = SubmitField('Registrar Venda')
 
 class PagamentoForm(FlaskForm):
-    valor = FloatField('Valor do Pagamento', validators=[DataRequired(), NumberRange(min=0.01)])
+    valor = CampoDinheiro('Valor do Pagamento', validators=[DataRequired(), NumberRange(min=CENTAVO)])
     forma_pagamento = SelectField('Forma de Pagamento',
                                  choices=[('dinheiro', 'Dinheiro'), 
                                         ('cartao', 'Cartão'),
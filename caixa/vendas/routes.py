@@ -1,129 +1,106 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from caixa import db
 from caixa.vendas import bp
 from caixa.vendas.forms import VendaForm, PagamentoForm
-from caixa.models import Cliente, Produto, Venda, ItemVenda, Pagamento, FluxoCaixa, Caixa
+from caixa.models import Cliente, Produto, Venda, ItemVenda, Pagamento, Caixa
 from caixa.decoradores import caixa_required
-from datetime import datetime, date
+from caixa.carregamento import perfil
+from caixa.extensoes import cache_relatorios, catalogo
+from caixa.catalogo import opcoes_clientes, opcoes_produtos
+from caixa.paginacao import paginar_cursor, usar_cursor, chave_contagem, dados_pagina
+from caixa.tempo_real import notificar_caixa
+from caixa.fluxo import (atualizar_fluxo_caixa, fluxo_incremental_ativo,
+                         registrar_venda_fluxo, registrar_pagamento_fluxo, verificar_fluxo_dia)
+from caixa.consolidacao import registrar_venda_resumo, registrar_pagamento_resumo
+from caixa.extrato import registrar_venda_extrato, registrar_pagamento_extrato
+from caixa.recebiveis import em_aberto
+from caixa.tarefas import CONCLUIDA, enfileirar, resposta_tarefa, resultado_tarefa, tarefas_assincronas
+from datetime import datetime, date, timedelta
 from caixa.models import agora_brasil
+from sqlalchemy import insert, update
+import logging
 
-# ========== FUNÇÕES AUXILIARES DO FLUXO DE CAIXA ==========
+log = logging.getLogger(__name__)
 
-def atualizar_fluxo_caixa(data, caixa_id=None):
+# ========== FUNÇÕES AUXILIARES ==========
+
+POR_PAGINA_VENDAS = 20
+
+
+def baixar_estoque(quantidades):
     """
-    Atualiza ou cria o registro de fluxo de caixa para uma data específica
+    Baixa o estoque dos produtos {produto_id: quantidade} de forma atômica.
+
+    Cada produto recebe um UPDATE ... SET estoque = estoque - q WHERE estoque >= q;
+    se outro caixa vendeu as últimas unidades no meio tempo, o UPDATE não altera
+    nenhuma linha. Os produtos são atualizados em ordem de id para que duas
+    vendas concorrentes travem as linhas na mesma ordem (sem deadlock no Postgres).
+
+    Retorna o id do primeiro produto sem estoque suficiente, ou None se todos
+    foram baixados. O chamador deve desfazer a transação (rollback) em caso de falha.
     """
-    # Se não especificar caixa, usar o caixa do usuário atual
-    if not caixa_id and not current_user.is_owner:
-        caixa_id = current_user.caixa_id
-    
-    # Buscar ou criar fluxo de caixa para esta data
-    fluxo = FluxoCaixa.query.filter_by(
-        data=data,
-        caixa_id=caixa_id
-    ).first()
-    
-    if not fluxo:
-        fluxo = FluxoCaixa(
-            data=data,
-            saldo_inicial=0,
-            total_vendas_vista=0,
-            total_vendas_prazo=0,
-            total_recebimentos=0,
-            saldo_final=0,
-            caixa_id=caixa_id
+    for produto_id in sorted(quantidades):
+        quantidade = quantidades[produto_id]
+        resultado = db.session.execute(
+            update(Produto)
+            .where(Produto.id == produto_id, Produto.estoque >= quantidade)
+            .values(estoque=Produto.estoque - quantidade)
+            .execution_options(synchronize_session=False)
         )
-        db.session.add(fluxo)
-    
-    # Recalcular todos os valores do dia
-    vendas_dia = Venda.query.filter(
-        db.func.date(Venda.data_venda) == data
-    )
-    if caixa_id:
-        vendas_dia = vendas_dia.filter_by(caixa_id=caixa_id)
-    vendas_dia = vendas_dia.all()
-    
-    # Calcular totais de vendas
-    total_vista = sum(v.valor_total for v in vendas_dia if v.tipo_pagamento == 'vista')
-    total_prazo = sum(v.valor_total for v in vendas_dia if v.tipo_pagamento == 'prazo')
-    
-    # Calcular recebimentos do dia (pagamentos)
-    pagamentos_dia = Pagamento.query.join(Venda).filter(
-        db.func.date(Pagamento.data_pagamento) == data
-    )
-    if caixa_id:
-        pagamentos_dia = pagamentos_dia.filter(Venda.caixa_id == caixa_id)
-    pagamentos_dia = pagamentos_dia.all()
-    
-    total_recebimentos = sum(p.valor for p in pagamentos_dia)
-    
-    # Atualizar fluxo
-    fluxo.total_vendas_vista = total_vista
-    fluxo.total_vendas_prazo = total_prazo
-    fluxo.total_recebimentos = total_recebimentos
-    
-    # Calcular saldo final (saldo_inicial + recebimentos)
-    # Nota: saldo_inicial pode ser ajustado manualmente ou vir do dia anterior
-    fluxo.saldo_final = fluxo.saldo_inicial + total_recebimentos
-    
-    return fluxo
+        if resultado.rowcount != 1:
+            return produto_id
+    return None
 
 
-def atualizar_fluxo_mes(data_inicio, data_fim, caixa_id=None):
-    """
-    Atualiza o fluxo de caixa para um período
-    """
-    from datetime import timedelta
-    
-    data_atual = data_inicio
-    while data_atual <= data_fim:
-        atualizar_fluxo_caixa(data_atual, caixa_id)
-        data_atual += timedelta(days=1)
-    
-    db.session.commit()
+def paginar_vendas(query, contagem):
+    """Mais recentes primeiro: por cursor (data_venda, id) ou, com ?page=, numerada"""
+    if usar_cursor():
+        return paginar_cursor(query, [Venda.data_venda, Venda.id], lambda v: (v.data_venda, v.id),
+                              POR_PAGINA_VENDAS, descendente=True, contagem=contagem)
+    page = request.args.get('page', 1, type=int)
+    return query.order_by(Venda.data_venda.desc(), Venda.id.desc()).paginate(
+        page=page, per_page=POR_PAGINA_VENDAS, error_out=False
+    )
 
 
 @bp.route('/nova', methods=['GET', 'POST'])
 @login_required
 @caixa_required
 def nova_venda():
-    print("="*50)
-    print("ENTROU NA ROTA NOVA VENDA")
-    print(f"Método: {request.method}")
-    print(f"Form data: {request.form}")
-    print("="*50)
-    
     form = VendaForm()
     
     # Carregar opções para selects
-    form.cliente_id.choices = [(c.id, c.nome) for c in Cliente.query.order_by('nome').all()]
+    form.cliente_id.choices = opcoes_clientes()
     
-    # Carregar produtos para os itens
-    produtos = Produto.query.all()
+    # Carregar produtos para os itens (mesma lista em cache para todas as linhas)
+    opcoes = opcoes_produtos()
     for item in form.itens:
-        item.produto_id.choices = [(p.id, f"{p.descricao} - R$ {p.preco:.2f}") for p in produtos]
+        item.produto_id.choices = opcoes
     
     # SE FOR POST - FINALIZAR A VENDA
     if request.method == 'POST':
-        print("🔍 PROCESSANDO POST")
-        print(f"Form validate: {form.validate()}")
-        print(f"Errors: {form.errors}")
-        
         if form.validate_on_submit():
-            print("✅ FORMULÁRIO VÁLIDO")
             try:
                 # Calcular valor total
                 valor_total = 0
                 itens_venda = []
                 
-                print(f"Dados do form: {form.data}")
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('Nova venda: %s', form.data)
+                
+                # Buscar todos os produtos do carrinho em uma única consulta (IN)
+                ids_produtos = {item['produto_id'] for item in form.itens.data}
+                produtos_carrinho = {
+                    p.id: p for p in Produto.query.filter(Produto.id.in_(ids_produtos)).all()
+                }
                 
                 # Processar itens do formulário
-                for idx, item in enumerate(form.itens.data):
-                    print(f"Item {idx}: {item}")
-                    produto = Produto.query.get(item['produto_id'])
+                quantidades = {}
+                for item in form.itens.data:
+                    produto = produtos_carrinho.get(item['produto_id'])
                     if produto:
+                        quantidades[produto.id] = quantidades.get(produto.id, 0) + item['quantidade']
                         subtotal = produto.preco * item['quantidade']
                         valor_total += subtotal
                         itens_venda.append({
@@ -132,31 +109,35 @@ def nova_venda():
                             'preco': produto.preco,
                             'subtotal': subtotal
                         })
-                        print(f"Produto: {produto.descricao}, Qtd: {item['quantidade']}, Preço: {produto.preco}")
-                
-                print(f"Valor total calculado: {valor_total}")
                 
-                # Verificar estoque
-                for item in itens_venda:
-                    if item['produto'].estoque < item['quantidade']:
-                        print(f"⚠️ Estoque insuficiente para {item['produto'].descricao}")
-                        flash(f'Estoque insuficiente para {item["produto"].descricao}', 'danger')
+                # Verificar estoque (soma das linhas do mesmo produto)
+                for produto_id, quantidade in quantidades.items():
+                    produto = produtos_carrinho[produto_id]
+                    if (produto.estoque or 0) < quantidade:
+                        log.info('Venda recusada: estoque insuficiente', extra={'produto_id': produto.id})
+                        flash(f'Estoque insuficiente para {produto.descricao}', 'danger')
                         return render_template('vendas/nova.html', form=form)
                 
                 # Verificar limite de crédito
-                cliente = Cliente.query.get(form.cliente_id.data)
-                print(f"Cliente: {cliente.nome if cliente else 'None'}")
-                
                 if form.tipo_pagamento.data == 'prazo':
+                    cliente = Cliente.query.get(form.cliente_id.data)
                     if cliente.saldo_devedor + valor_total > cliente.limite_credito:
-                        print("⚠️ Limite de crédito excedido")
+                        log.info('Venda recusada: limite de crédito excedido', extra={'cliente_id': cliente.id})
                         flash('Cliente excedeu o limite de crédito!', 'danger')
                         return render_template('vendas/nova.html', form=form)
                 
+                # Baixar estoque atomicamente; a verificação acima pode ter ficado
+                # desatualizada se outro caixa vendeu o mesmo produto agora
+                sem_estoque = baixar_estoque(quantidades)
+                if sem_estoque:
+                    db.session.rollback()
+                    produto = produtos_carrinho[sem_estoque]
+                    log.info('Venda recusada: estoque esgotado durante a venda', extra={'produto_id': produto.id})
+                    flash(f'Estoque insuficiente para {produto.descricao}', 'danger')
+                    return render_template('vendas/nova.html', form=form)
+                
                 # CRIAR A VENDA
-                print("📝 Criando venda...")
                 data_venda = agora_brasil()
-                print(data_venda)
                 venda = Venda(
                     data_venda=data_venda,
                     valor_total=valor_total,
@@ -174,22 +155,16 @@ def nova_venda():
                 
                 db.session.add(venda)
                 db.session.flush()
-                print(f"Venda ID: {venda.id}")
                 
-                # Adicionar itens
-                for item in itens_venda:
-                    item_venda = ItemVenda(
-                        venda_id=venda.id,
-                        produto_id=item['produto'].id,
-                        quantidade=item['quantidade'],
-                        preco_unitario=item['preco'],
-                        subtotal=item['subtotal']
-                    )
-                    db.session.add(item_venda)
-                    print(f"Item adicionado: {item['produto'].descricao}")
-                    
-                    # Atualizar estoque
-                    item['produto'].estoque -= item['quantidade']
+                # Adicionar itens (um único INSERT com todos os itens)
+                if itens_venda:
+                    db.session.execute(insert(ItemVenda), [{
+                        'venda_id': venda.id,
+                        'produto_id': item['produto'].id,
+                        'quantidade': item['quantidade'],
+                        'preco_unitario': item['preco'],
+                        'subtotal': item['subtotal']
+                    } for item in itens_venda])
                 
                 # Registrar pagamento se à vista
                 if form.tipo_pagamento.data == 'vista':
@@ -201,41 +176,53 @@ def nova_venda():
                         data_pagamento=data_venda
                     )
                     db.session.add(pagamento)
-                    print("Pagamento registrado")
                 
-                # Atualizar saldo do cliente se a prazo
-                if form.tipo_pagamento.data == 'prazo':
-                    cliente.saldo_devedor += valor_total
-                    print(f"Saldo do cliente atualizado: {cliente.saldo_devedor}")
+                # Extrato do cliente (débito da venda e, à vista, o crédito do pagamento);
+                # atualiza saldo_devedor e os totais de compras do cliente
+                registrar_venda_extrato(venda, pagamento if form.tipo_pagamento.data == 'vista' else None)
                 
                 # ===== ATUALIZAR FLUXO DE CAIXA =====
                 data_hoje = data_venda.date()
-                atualizar_fluxo_caixa(data_hoje, current_user.id)
-                print(f"✅ Fluxo de caixa atualizado para {data_hoje}")
+                if fluxo_incremental_ativo():
+                    registrar_venda_fluxo(venda)
+                    if form.tipo_pagamento.data == 'vista':
+                        registrar_pagamento_fluxo(pagamento, venda)
+                else:
+                    atualizar_fluxo_caixa(data_hoje, venda.caixa_id)
+                
+                # Resumos diário/mensal usados no relatório geral
+                registrar_venda_resumo(venda, recebido=pagamento.valor if form.tipo_pagamento.data == 'vista' else 0)
                 
                 # Commit final
                 db.session.commit()
-                print("✅ COMMIT REALIZADO COM SUCESSO!")
-                
-                # Verificar se a venda foi realmente salva
-                venda_verificacao = Venda.query.get(venda.id)
-                if venda_verificacao:
-                    print(f"✅ Venda {venda.id} encontrada no banco!")
-                else:
-                    print("❌ Venda NÃO encontrada no banco após commit!")
-                
-                flash(f'Venda finalizada com sucesso! Valor: R$ {valor_total:.2f}', 'success')
-                return redirect(url_for('vendas.detalhe_venda', id=venda.id))
+                log.info('Venda %s registrada', venda.id, extra={
+                    'venda_id': venda.id, 'caixa_id': venda.caixa_id, 'tipo_pagamento': venda.tipo_pagamento,
+                    'valor_total': float(valor_total), 'itens': len(itens_venda),
+                })
                 
             except Exception as e:
                 db.session.rollback()
-                print(f"❌ ERRO: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                log.exception('Erro ao finalizar venda')
                 flash(f'Erro ao finalizar venda: {str(e)}', 'danger')
                 return render_template('vendas/nova.html', form=form)
+            
+            # A venda já está gravada: uma falha daqui em diante não pode aparecer como erro
+            # (o operador repetiria a venda e o estoque seria baixado duas vezes)
+            try:
+                # Descartar relatórios em cache e enviar os novos totais para os painéis abertos
+                cache_relatorios.invalidar(data=data_hoje, caixa_id=venda.caixa_id)
+                if venda.tipo_pagamento == 'prazo':
+                    cache_relatorios.invalidar(rotas={'relatorio_geral'})
+                # O catálogo JSON traz o estoque; as opções dos selects não mudam
+                catalogo.invalidar('produtos_json')
+                notificar_caixa(venda.caixa_id, cliente_id=venda.cliente_id)
+            except Exception:
+                log.exception('Venda %s registrada, mas falhou a atualização de caches e painéis', venda.id)
+            
+            flash(f'Venda finalizada com sucesso! Valor: R$ {valor_total:.2f}', 'success')
+            return redirect(url_for('vendas.detalhe_venda', id=venda.id))
         else:
-            print(f"❌ Formulário inválido: {form.errors}")
+            log.debug('Formulário de venda inválido: %s', form.errors)
             for field, errors in form.errors.items():
                 for error in errors:
                     flash(f'{field}: {error}', 'danger')
@@ -248,7 +235,7 @@ def nova_venda():
 @login_required
 @caixa_required
 def detalhe_venda(id):
-    venda = Venda.query.get_or_404(id)
+    venda = Venda.query.options(*perfil('venda_detalhe')).get_or_404(id)
     return render_template('vendas/detalhe.html', venda=venda)
 
 
@@ -256,7 +243,7 @@ def detalhe_venda(id):
 @login_required
 @caixa_required
 def registrar_pagamento(id):
-    venda = Venda.query.get_or_404(id)
+    venda = Venda.query.options(*perfil('venda_pagamento')).get_or_404(id)
     form = PagamentoForm()
     
     if form.validate_on_submit():
@@ -280,6 +267,7 @@ def registrar_pagamento(id):
         db.session.add(pagamento)
         
         # Atualizar venda
+        pago_anterior = venda.valor_pago
         venda.valor_pago += form.valor.data
         
         status_anterior = venda.status
@@ -287,17 +275,32 @@ def registrar_pagamento(id):
         if venda.valor_pago >= venda.valor_total:
             venda.status = 'pago'
             venda.valor_pago = venda.valor_total
-            
-            # Atualizar saldo do cliente
-            cliente = Cliente.query.get(venda.cliente_id)
-            cliente.saldo_devedor -= venda.valor_total
+        
+        # Crédito no extrato do cliente (abate o saldo devedor)
+        registrar_pagamento_extrato(pagamento, venda)
         
         # ===== ATUALIZAR FLUXO DE CAIXA =====
         data_hoje = data_pagamento.date()
-        atualizar_fluxo_caixa(data_hoje, current_user.id)
-        print(f"✅ Fluxo de caixa atualizado para {data_hoje}")
+        if fluxo_incremental_ativo():
+            registrar_pagamento_fluxo(pagamento, venda)
+        else:
+            atualizar_fluxo_caixa(data_hoje, venda.caixa_id)
+        registrar_pagamento_resumo(pagamento, venda, acrescimo_pago=venda.valor_pago - pago_anterior)
         
         db.session.commit()
+        log.info('Pagamento registrado na venda %s', venda.id, extra={
+            'venda_id': venda.id, 'valor': float(form.valor.data), 'status': venda.status,
+        })
+        
+        # O pagamento muda os relatórios de hoje, do dia da venda e os saldos dos clientes.
+        # Já está gravado: uma falha aqui só fica no log
+        try:
+            cache_relatorios.invalidar(data=data_hoje, caixa_id=venda.caixa_id)
+            cache_relatorios.invalidar(data=venda.data_venda.date(), caixa_id=venda.caixa_id)
+            cache_relatorios.invalidar(rotas={'relatorio_geral'})
+            notificar_caixa(venda.caixa_id, cliente_id=venda.cliente_id)
+        except Exception:
+            log.exception('Pagamento registrado na venda %s, mas falhou a atualização de caches e painéis', venda.id)
         
         flash('Pagamento registrado com sucesso!', 'success')
         return redirect(url_for('vendas.detalhe_venda', id=venda.id))
@@ -309,7 +312,8 @@ def registrar_pagamento(id):
 @login_required
 @caixa_required
 def vendas_ativas():
-    vendas = Venda.query.filter(Venda.status != 'pago').order_by(Venda.data_venda.desc()).all()
+    query = Venda.query.options(*perfil('venda_lista')).filter(em_aberto())
+    vendas = paginar_vendas(query, chave_contagem('vendas_ativas'))
     return render_template('vendas/lista.html', vendas=vendas, titulo='Vendas Ativas')
 
 
@@ -317,18 +321,42 @@ def vendas_ativas():
 @login_required
 @caixa_required
 def todas_vendas():
-    page = request.args.get('page', 1, type=int)
-    vendas = Venda.query.order_by(Venda.data_venda.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    query = Venda.query.options(*perfil('venda_lista'))
+    vendas = paginar_vendas(query, chave_contagem('vendas'))
     return render_template('vendas/lista.html', vendas=vendas, titulo='Todas as Vendas')
 
 
+@bp.route('/api/listagem')
+@login_required
+@caixa_required
+def api_listagem_vendas():
+    """API paginada por cursor (?apos=/?antes=); ?ativas=1 só as não pagas, ?total=1 inclui o total"""
+    query = Venda.query.options(*perfil('venda_lista'))
+    nome = 'vendas'
+    if request.args.get('ativas', type=int):
+        query = query.filter(em_aberto())
+        nome = 'vendas_ativas'
+    contagem = chave_contagem(nome) if request.args.get('total', type=int) else None
+    vendas = paginar_cursor(query, [Venda.data_venda, Venda.id], lambda v: (v.data_venda, v.id),
+                            POR_PAGINA_VENDAS, descendente=True, contagem=contagem)
+    return jsonify(dados_pagina(vendas, lambda v: {
+        'id': v.id,
+        'data_venda': v.data_venda.isoformat(),
+        'cliente': v.cliente.nome if v.cliente else None,
+        'vendedor': v.vendedor.nome if v.vendedor else None,
+        'caixa': v.caixa_local.nome if v.caixa_local else None,
+        'valor_total': v.valor_total,
+        'valor_pago': v.valor_pago,
+        'status': v.status,
+        'tipo_pagamento': v.tipo_pagamento
+    }))
+
+
 @bp.route('/api/venda/<int:id>/detalhes')
 @login_required
 def venda_detalhes_api(id):
     """API para retornar detalhes da venda em JSON"""
-    venda = Venda.query.get_or_404(id)
+    venda = Venda.query.options(*perfil('venda_api')).get_or_404(id)
     
     status_cores = {
         'pago': 'success',
@@ -355,37 +383,40 @@ def venda_detalhes_api(id):
 @bp.route('/recalcular-fluxo/<string:data>')
 @login_required
 def recalcular_fluxo_data(data):
-    """Recalcular fluxo de caixa para uma data específica (apenas owner)"""
+    """Recalcular fluxo de caixa para uma data específica (apenas owner), pela fila de tarefas"""
     if not current_user.is_owner:
         return jsonify({'erro': 'Acesso negado'}), 403
     
     try:
         data_obj = datetime.strptime(data, '%Y-%m-%d').date()
-        
-        # Recalcular para todos os caixas
-        caixas = Caixa.query.all()
-        for caixa in caixas:
-            atualizar_fluxo_caixa(data_obj, caixa.id)
-        
-        db.session.commit()
-        
-        return jsonify({
-            'sucesso': True,
-            'mensagem': f'Fluxo de caixa recalculado para {data_obj.strftime("%d/%m/%Y")}'
-        })
-    except Exception as e:
+    except ValueError as e:
         return jsonify({'erro': str(e)}), 400
+    
+    # Recalcular para todos os caixas (consultas agregadas, um único dia)
+    tarefa = enfileirar('recalcular_fluxo', usuario_id=current_user.id, inicio=data_obj, fim=data_obj)
+    cache_relatorios.invalidar(data=data_obj, rotas={'relatorio_geral'})
+    
+    if tarefa.status == CONCLUIDA:
+        mensagem = f'Fluxo de caixa recalculado para {data_obj.strftime("%d/%m/%Y")}'
+    else:
+        mensagem = f'Recálculo do fluxo de {data_obj.strftime("%d/%m/%Y")} agendado'
+    return resposta_tarefa(tarefa, mensagem)
 
 
 @bp.route('/recalcular-fluxo-periodo')
 @login_required
 def recalcular_fluxo_periodo():
-    """Recalcular fluxo de caixa para um período (apenas owner)"""
+    """
+    Recalcular fluxo de caixa para um período (apenas owner). A resposta traz
+    a tarefa criada (202) e o endereço para acompanhar o andamento; o worker
+    não tem o limite de tempo da requisição.
+    """
     if not current_user.is_owner:
         return jsonify({'erro': 'Acesso negado'}), 403
     
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
+    caixa_id = request.args.get('caixa_id', type=int)
     
     if not data_inicio or not data_fim:
         return jsonify({'erro': 'Datas não fornecidas'}), 400
@@ -393,14 +424,53 @@ def recalcular_fluxo_periodo():
     try:
         inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
         fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    
+    # Executando na própria requisição, parar antes do timeout do gunicorn
+    # e devolver de onde continuar
+    limite = None if tarefas_assincronas() else current_app.config.get('FLUXO_RECALCULO_LIMITE_SEGUNDOS')
+    tarefa = enfileirar('recalcular_fluxo', usuario_id=current_user.id, inicio=inicio, fim=fim,
+                        caixa_id=caixa_id, limite_segundos=limite)
+    cache_relatorios.invalidar(rotas={'relatorio_geral'})
+    
+    periodo = f'{inicio.strftime("%d/%m/%Y")} a {fim.strftime("%d/%m/%Y")}'
+    if tarefa.status != CONCLUIDA:
+        return resposta_tarefa(tarefa, f'Recálculo do fluxo de {periodo} agendado')
+    
+    resultado = resultado_tarefa(tarefa)
+    dias = {'dias_processados': resultado['dias_processados'], 'total_dias': resultado['total_dias']}
+    if not resultado['concluido']:
+        proximo = resultado['proximo_inicio']
+        return resposta_tarefa(
+            tarefa,
+            f'Fluxo recalculado até {(proximo - timedelta(days=1)).strftime("%d/%m/%Y")}; continue a partir de {proximo.strftime("%d/%m/%Y")}',
+            concluido=False,
+            proximo_inicio=proximo.strftime('%Y-%m-%d'),
+            continuar=url_for('vendas.recalcular_fluxo_periodo', data_inicio=proximo.strftime('%Y-%m-%d'),
+                              data_fim=data_fim, caixa_id=caixa_id),
+            **dias
+        )
+    return resposta_tarefa(tarefa, f'Fluxo de caixa recalculado de {periodo}',
+                           registros=resultado['registros'], **dias)
+
+
+@bp.route('/verificar-fluxo/<string:data>')
+@login_required
+def verificar_fluxo_data(data):
+    """Comparar o fluxo incremental com um recálculo completo (apenas owner)"""
+    if not current_user.is_owner:
+        return jsonify({'erro': 'Acesso negado'}), 403
+    
+    try:
+        data_obj = datetime.strptime(data, '%Y-%m-%d').date()
         
-        caixas = Caixa.query.all()
-        for caixa in caixas:
-            atualizar_fluxo_mes(inicio, fim, caixa.id)
+        divergencias = verificar_fluxo_dia(data_obj, [caixa_id for caixa_id, in db.session.query(Caixa.id)])
         
         return jsonify({
-            'sucesso': True,
-            'mensagem': f'Fluxo de caixa recalculado de {inicio.strftime("%d/%m/%Y")} a {fim.strftime("%d/%m/%Y")}'
+            'consistente': not divergencias,
+            'data': data_obj.strftime('%d/%m/%Y'),
+            'divergencias': divergencias
         })
     except Exception as e:
-        return jsonify({'erro': str(e)}), 400
\ No newline at end of file
+        return jsonify({'erro': str(e)}), 400
@@ -0,0 +1,26 @@
+"""indice por nome de cliente para a paginacao por cursor
+
+Revision ID: 3f9a6c2e8b51
+Revises: 8d4b2f6e1a37
+Create Date: 2026-10-17 12:31:47.215903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6c2e8b51'
+down_revision = '8d4b2f6e1a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clientes', schema=None) as batch_op:
+        batch_op.create_index('ix_clientes_nome', ['nome'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('clientes', schema=None) as batch_op:
+        batch_op.drop_index('ix_clientes_nome')
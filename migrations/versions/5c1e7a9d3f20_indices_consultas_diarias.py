@@ -0,0 +1,65 @@
+"""indices para consultas por dia
+
+Revision ID: 5c1e7a9d3f20
+Revises: 2bad234deba1
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e7a9d3f20'
+down_revision = '2bad234deba1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remover registros de fluxo duplicados (mesmo caixa e dia) antes do índice único;
+    # rode /vendas/recalcular-fluxo-periodo depois para corrigir os totais mantidos
+    op.execute(
+        'DELETE FROM fluxo_caixa WHERE id NOT IN '
+        '(SELECT MIN(id) FROM fluxo_caixa GROUP BY caixa_id, data)'
+    )
+
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.create_index('ix_vendas_data_venda', ['data_venda'], unique=False)
+        batch_op.create_index('ix_vendas_caixa_id_data_venda', ['caixa_id', 'data_venda'], unique=False)
+        batch_op.create_index('ix_vendas_status_data_venda', ['status', 'data_venda'], unique=False)
+        batch_op.create_index('ix_vendas_cliente_id', ['cliente_id'], unique=False)
+
+    with op.batch_alter_table('itens_venda', schema=None) as batch_op:
+        batch_op.create_index('ix_itens_venda_venda_id', ['venda_id'], unique=False)
+
+    with op.batch_alter_table('pagamentos', schema=None) as batch_op:
+        batch_op.create_index('ix_pagamentos_data_pagamento', ['data_pagamento'], unique=False)
+        batch_op.create_index('ix_pagamentos_venda_id', ['venda_id'], unique=False)
+
+    with op.batch_alter_table('despesas', schema=None) as batch_op:
+        batch_op.create_index('ix_despesas_data_despesa_caixa_id', ['data_despesa', 'caixa_id'], unique=False)
+
+    with op.batch_alter_table('fluxo_caixa', schema=None) as batch_op:
+        batch_op.create_index('ux_fluxo_caixa_caixa_id_data', ['caixa_id', 'data'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('fluxo_caixa', schema=None) as batch_op:
+        batch_op.drop_index('ux_fluxo_caixa_caixa_id_data')
+
+    with op.batch_alter_table('despesas', schema=None) as batch_op:
+        batch_op.drop_index('ix_despesas_data_despesa_caixa_id')
+
+    with op.batch_alter_table('pagamentos', schema=None) as batch_op:
+        batch_op.drop_index('ix_pagamentos_venda_id')
+        batch_op.drop_index('ix_pagamentos_data_pagamento')
+
+    with op.batch_alter_table('itens_venda', schema=None) as batch_op:
+        batch_op.drop_index('ix_itens_venda_venda_id')
+
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.drop_index('ix_vendas_cliente_id')
+        batch_op.drop_index('ix_vendas_status_data_venda')
+        batch_op.drop_index('ix_vendas_caixa_id_data_venda')
+        batch_op.drop_index('ix_vendas_data_venda')
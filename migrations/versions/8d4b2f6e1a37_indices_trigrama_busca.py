@@ -0,0 +1,49 @@
+"""indices de trigrama para busca de clientes e produtos
+
+Revision ID: 8d4b2f6e1a37
+Revises: 5c1e7a9d3f20
+Create Date: 2026-10-17 11:52:08.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b2f6e1a37'
+down_revision = '5c1e7a9d3f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Só no PostgreSQL; nos outros bancos a busca usa o índice em memória (caixa/busca.py)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    # unaccent() não é IMMUTABLE e por isso não pode ser usada num índice;
+    # a versão com dicionário explícito pode ser declarada como tal
+    op.execute(
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+        "$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$ "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+    )
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_clientes_nome_trgm ON clientes '
+        'USING gin (f_unaccent(lower(nome)) gin_trgm_ops)'
+    )
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_produtos_descricao_trgm ON produtos '
+        'USING gin (f_unaccent(lower(descricao)) gin_trgm_ops)'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('DROP INDEX IF EXISTS ix_produtos_descricao_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_clientes_nome_trgm')
+    op.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
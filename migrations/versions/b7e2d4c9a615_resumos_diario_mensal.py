@@ -0,0 +1,96 @@
+"""tabelas de resumo diario e mensal para os relatorios
+
+Revision ID: b7e2d4c9a615
+Revises: 3f9a6c2e8b51
+Create Date: 2026-10-17 15:04:22.671390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4c9a615'
+down_revision = '3f9a6c2e8b51'
+branch_labels = None
+depends_on = None
+
+COLUNAS_TOTAIS = ('quantidade_vista', 'quantidade_prazo', 'total_vista', 'total_prazo',
+                  'total_pago_vendas', 'total_recebimentos', 'total_despesas')
+
+# Movimentos de cada dia: vendas, pagamentos (no caixa da venda) e despesas (0 = sem caixa)
+MOVIMENTOS = """
+    SELECT COALESCE(caixa_id, 0) AS caixa_id, DATE(data_venda) AS data,
+           CASE WHEN tipo_pagamento = 'vista' THEN 1 ELSE 0 END AS quantidade_vista,
+           CASE WHEN tipo_pagamento = 'prazo' THEN 1 ELSE 0 END AS quantidade_prazo,
+           CASE WHEN tipo_pagamento = 'vista' THEN valor_total ELSE 0 END AS total_vista,
+           CASE WHEN tipo_pagamento = 'prazo' THEN valor_total ELSE 0 END AS total_prazo,
+           COALESCE(valor_pago, 0) AS total_pago_vendas, 0 AS total_recebimentos, 0 AS total_despesas
+    FROM vendas WHERE data_venda IS NOT NULL
+    UNION ALL
+    SELECT COALESCE(v.caixa_id, 0), DATE(p.data_pagamento), 0, 0, 0, 0, 0, p.valor, 0
+    FROM pagamentos p JOIN vendas v ON v.id = p.venda_id WHERE p.data_pagamento IS NOT NULL
+    UNION ALL
+    SELECT COALESCE(caixa_id, 0), DATE(data_despesa), 0, 0, 0, 0, 0, 0, valor
+    FROM despesas
+"""
+
+
+def _colunas_resumo(coluna_data):
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('caixa_id', sa.Integer(), nullable=False),
+        sa.Column(coluna_data, sa.Date(), nullable=False),
+        sa.Column('quantidade_vista', sa.Integer(), nullable=False),
+        sa.Column('quantidade_prazo', sa.Integer(), nullable=False),
+        sa.Column('total_vista', sa.Float(), nullable=False),
+        sa.Column('total_prazo', sa.Float(), nullable=False),
+        sa.Column('total_pago_vendas', sa.Float(), nullable=False),
+        sa.Column('total_recebimentos', sa.Float(), nullable=False),
+        sa.Column('total_despesas', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    ]
+
+
+def upgrade():
+    op.create_table('resumo_diario', *_colunas_resumo('data'))
+    with op.batch_alter_table('resumo_diario', schema=None) as batch_op:
+        batch_op.create_index('ux_resumo_diario_caixa_id_data', ['caixa_id', 'data'], unique=True)
+        batch_op.create_index('ix_resumo_diario_data', ['data'], unique=False)
+
+    op.create_table('resumo_mensal', *_colunas_resumo('mes'))
+    with op.batch_alter_table('resumo_mensal', schema=None) as batch_op:
+        batch_op.create_index('ux_resumo_mensal_caixa_id_mes', ['caixa_id', 'mes'], unique=True)
+        batch_op.create_index('ix_resumo_mensal_mes', ['mes'], unique=False)
+
+    # Preencher com o histórico existente; em outros bancos rode `flask caixa reconstruir-resumos`
+    dialeto = op.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        inicio_mes = "CAST(date_trunc('month', data) AS DATE)"
+    elif dialeto == 'sqlite':
+        inicio_mes = "DATE(data, 'start of month')"
+    else:
+        return
+
+    colunas = ', '.join(COLUNAS_TOTAIS)
+    somas = ', '.join(f'SUM({c})' for c in COLUNAS_TOTAIS)
+    op.execute(
+        f'INSERT INTO resumo_diario (caixa_id, data, {colunas}) '
+        f'SELECT caixa_id, data, {somas} FROM ({MOVIMENTOS}) movimentos GROUP BY caixa_id, data'
+    )
+    op.execute(
+        f'INSERT INTO resumo_mensal (caixa_id, mes, {colunas}) '
+        f'SELECT caixa_id, {inicio_mes}, {somas} FROM resumo_diario GROUP BY caixa_id, {inicio_mes}'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('resumo_mensal', schema=None) as batch_op:
+        batch_op.drop_index('ix_resumo_mensal_mes')
+        batch_op.drop_index('ux_resumo_mensal_caixa_id_mes')
+    op.drop_table('resumo_mensal')
+
+    with op.batch_alter_table('resumo_diario', schema=None) as batch_op:
+        batch_op.drop_index('ix_resumo_diario_data')
+        batch_op.drop_index('ux_resumo_diario_caixa_id_data')
+    op.drop_table('resumo_diario')
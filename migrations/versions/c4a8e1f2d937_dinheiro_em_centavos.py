@@ -0,0 +1,87 @@
+"""valores em dinheiro como centavos inteiros
+
+Revision ID: c4a8e1f2d937
+Revises: b7e2d4c9a615
+Create Date: 2026-10-17 19:02:37.114802
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e1f2d937'
+down_revision = 'b7e2d4c9a615'
+branch_labels = None
+depends_on = None
+
+# (tabela, [(coluna, nullable)]) de todas as colunas de dinheiro
+COLUNAS_DINHEIRO = [
+    ('clientes', [('limite_credito', True), ('saldo_devedor', True)]),
+    ('produtos', [('preco', False)]),
+    ('vendas', [('valor_total', False), ('valor_pago', True)]),
+    ('itens_venda', [('preco_unitario', False), ('subtotal', False)]),
+    ('pagamentos', [('valor', False)]),
+    ('fluxo_caixa', [('saldo_inicial', True), ('total_vendas_vista', True), ('total_vendas_prazo', True),
+                     ('total_recebimentos', True), ('saldo_final', True)]),
+    ('resumo_diario', [('total_vista', False), ('total_prazo', False), ('total_pago_vendas', False),
+                       ('total_recebimentos', False), ('total_despesas', False)]),
+    ('resumo_mensal', [('total_vista', False), ('total_prazo', False), ('total_pago_vendas', False),
+                       ('total_recebimentos', False), ('total_despesas', False)]),
+    ('despesas', [('valor', False)]),
+]
+
+# Linhas convertidas por UPDATE no SQLite (faixas de id), para não montar um
+# journal gigante de uma vez em tabelas grandes
+TAMANHO_LOTE = 20000
+
+
+def _converter_em_lotes(tabela, colunas, expressao):
+    """UPDATE tabela SET coluna = expressao(coluna) em faixas de TAMANHO_LOTE ids"""
+    conexao = op.get_bind()
+    menor, maior = conexao.execute(sa.text(f'SELECT MIN(id), MAX(id) FROM {tabela}')).one()
+    if menor is None:
+        return
+    atribuicoes = ', '.join(f'{coluna} = {expressao.format(coluna=coluna)}' for coluna, _ in colunas)
+    for inicio in range(menor, maior + 1, TAMANHO_LOTE):
+        conexao.execute(
+            sa.text(f'UPDATE {tabela} SET {atribuicoes} WHERE id >= :inicio AND id < :fim'),
+            {'inicio': inicio, 'fim': inicio + TAMANHO_LOTE}
+        )
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Uma reescrita por tabela, convertendo todas as colunas no mesmo ALTER
+        for tabela, colunas in COLUNAS_DINHEIRO:
+            op.execute(f'ALTER TABLE {tabela} ' + ', '.join(
+                f'ALTER COLUMN {coluna} TYPE BIGINT USING ROUND({coluna}::numeric * 100)::bigint'
+                for coluna, _ in colunas
+            ))
+        return
+
+    # SQLite: multiplicar por 100 em lotes e depois trocar o tipo
+    # (a cópia da tabela feita pelo batch converte com CAST)
+    for tabela, colunas in COLUNAS_DINHEIRO:
+        _converter_em_lotes(tabela, colunas, 'ROUND({coluna} * 100)')
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            for coluna, nullable in colunas:
+                batch_op.alter_column(coluna, existing_type=sa.Float(), type_=sa.BigInteger(),
+                                      existing_nullable=nullable)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for tabela, colunas in COLUNAS_DINHEIRO:
+            op.execute(f'ALTER TABLE {tabela} ' + ', '.join(
+                f'ALTER COLUMN {coluna} TYPE DOUBLE PRECISION USING {coluna} / 100.0'
+                for coluna, _ in colunas
+            ))
+        return
+
+    for tabela, colunas in COLUNAS_DINHEIRO:
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            for coluna, nullable in colunas:
+                batch_op.alter_column(coluna, existing_type=sa.BigInteger(), type_=sa.Float(),
+                                      existing_nullable=nullable)
+        _converter_em_lotes(tabela, colunas, '{coluna} / 100.0')
@@ -0,0 +1,96 @@
+"""extrato dos clientes e totais de compras mantidos
+
+Revision ID: d5f3b8a2c614
+Revises: c4a8e1f2d937
+Create Date: 2026-10-17 20:11:05.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f3b8a2c614'
+down_revision = 'c4a8e1f2d937'
+branch_labels = None
+depends_on = None
+
+# Lançamentos do histórico (valores já em centavos): saldo anterior dos
+# clientes sem vendas, um débito por venda e um crédito por pagamento
+MOVIMENTOS = """
+    SELECT c.id AS cliente_id, COALESCE(c.created_at, CURRENT_TIMESTAMP) AS data, 0 AS ordem, c.id AS origem,
+           CASE WHEN c.saldo_devedor > 0 THEN 'debito' ELSE 'credito' END AS tipo,
+           ABS(c.saldo_devedor) AS valor, c.saldo_devedor AS delta,
+           NULL AS venda_id, NULL AS pagamento_id, 'Saldo anterior' AS descricao
+    FROM clientes c
+    WHERE COALESCE(c.saldo_devedor, 0) <> 0 AND NOT EXISTS (SELECT 1 FROM vendas v WHERE v.cliente_id = c.id)
+    UNION ALL
+    SELECT v.cliente_id, COALESCE(v.data_venda, CURRENT_TIMESTAMP), 1, v.id, 'debito',
+           v.valor_total, v.valor_total, v.id, NULL, 'Venda #' || v.id
+    FROM vendas v
+    UNION ALL
+    SELECT v.cliente_id, COALESCE(p.data_pagamento, CURRENT_TIMESTAMP), 2, p.id, 'credito',
+           p.valor, -p.valor, v.id, p.id, 'Pagamento da venda #' || v.id
+    FROM pagamentos p JOIN vendas v ON v.id = p.venda_id
+"""
+
+
+def upgrade():
+    op.create_table('lancamentos_cliente',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cliente_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.DateTime(), nullable=False),
+    sa.Column('tipo', sa.String(length=10), nullable=False),
+    sa.Column('valor', sa.BigInteger(), nullable=False),
+    sa.Column('saldo', sa.BigInteger(), nullable=False),
+    sa.Column('venda_id', sa.Integer(), nullable=True),
+    sa.Column('pagamento_id', sa.Integer(), nullable=True),
+    sa.Column('descricao', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ),
+    sa.ForeignKeyConstraint(['pagamento_id'], ['pagamentos.id'], ),
+    sa.ForeignKeyConstraint(['venda_id'], ['vendas.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('lancamentos_cliente', schema=None) as batch_op:
+        batch_op.create_index('ix_lancamentos_cliente_cliente_id_id', ['cliente_id', 'id'], unique=False)
+
+    with op.batch_alter_table('clientes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_compras', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_pago', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('quantidade_compras', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('ultima_compra', sa.DateTime(), nullable=True))
+
+    # Extrato do histórico com o saldo acumulado por cliente (função de janela)
+    op.execute(
+        'INSERT INTO lancamentos_cliente (cliente_id, data, tipo, valor, saldo, venda_id, pagamento_id, descricao) '
+        'SELECT cliente_id, data, tipo, valor, '
+        'SUM(delta) OVER (PARTITION BY cliente_id ORDER BY data, ordem, origem ROWS UNBOUNDED PRECEDING), '
+        f'venda_id, pagamento_id, descricao FROM ({MOVIMENTOS}) movimentos '
+        'ORDER BY cliente_id, data, ordem, origem'
+    )
+
+    # Totais e saldo devedor a partir do extrato: o saldo passa a ser o valor
+    # em aberto (pagamentos parciais também abatem)
+    op.execute("""
+        UPDATE clientes SET
+            total_compras = COALESCE((SELECT SUM(v.valor_total) FROM vendas v WHERE v.cliente_id = clientes.id), 0),
+            total_pago = COALESCE((SELECT SUM(p.valor) FROM pagamentos p JOIN vendas v ON v.id = p.venda_id
+                                   WHERE v.cliente_id = clientes.id), 0),
+            quantidade_compras = (SELECT COUNT(*) FROM vendas v WHERE v.cliente_id = clientes.id),
+            ultima_compra = (SELECT MAX(v.data_venda) FROM vendas v WHERE v.cliente_id = clientes.id),
+            saldo_devedor = COALESCE((SELECT l.saldo FROM lancamentos_cliente l WHERE l.cliente_id = clientes.id
+                                      ORDER BY l.id DESC LIMIT 1), 0)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('clientes', schema=None) as batch_op:
+        batch_op.drop_column('ultima_compra')
+        batch_op.drop_column('quantidade_compras')
+        batch_op.drop_column('total_pago')
+        batch_op.drop_column('total_compras')
+
+    with op.batch_alter_table('lancamentos_cliente', schema=None) as batch_op:
+        batch_op.drop_index('ix_lancamentos_cliente_cliente_id_id')
+
+    op.drop_table('lancamentos_cliente')
@@ -0,0 +1,32 @@
+"""indices parciais das vendas em aberto (contas a receber)
+
+Revision ID: e6a9c3d7b148
+Revises: d5f3b8a2c614
+Create Date: 2026-10-17 21:34:52.270631
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a9c3d7b148'
+down_revision = 'd5f3b8a2c614'
+branch_labels = None
+depends_on = None
+
+EM_ABERTO = "status <> 'pago'"
+
+
+def upgrade():
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.create_index('ix_vendas_em_aberto_data_venda', ['data_venda', 'id'], unique=False,
+                              postgresql_where=sa.text(EM_ABERTO), sqlite_where=sa.text(EM_ABERTO))
+        batch_op.create_index('ix_vendas_em_aberto_cliente_id', ['cliente_id'], unique=False,
+                              postgresql_where=sa.text(EM_ABERTO), sqlite_where=sa.text(EM_ABERTO))
+
+
+def downgrade():
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.drop_index('ix_vendas_em_aberto_cliente_id')
+        batch_op.drop_index('ix_vendas_em_aberto_data_venda')
@@ -0,0 +1,50 @@
+"""fila de tarefas em segundo plano
+
+Revision ID: f1b7d2e8c359
+Revises: e6a9c3d7b148
+Create Date: 2026-10-17 22:48:16.903527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7d2e8c359'
+down_revision = 'e6a9c3d7b148'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tarefas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('chave', sa.String(length=255), nullable=False),
+    sa.Column('parametros', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('processados', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('resultado', sa.Text(), nullable=True),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('trabalhador', sa.String(length=100), nullable=True),
+    sa.Column('usuario_id', sa.Integer(), nullable=True),
+    sa.Column('criada_em', sa.DateTime(), nullable=False),
+    sa.Column('iniciada_em', sa.DateTime(), nullable=True),
+    sa.Column('atualizada_em', sa.DateTime(), nullable=True),
+    sa.Column('concluida_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tarefas', schema=None) as batch_op:
+        batch_op.create_index('ix_tarefas_status_id', ['status', 'id'], unique=False)
+        batch_op.create_index('ix_tarefas_chave_id', ['chave', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas', schema=None) as batch_op:
+        batch_op.drop_index('ix_tarefas_chave_id')
+        batch_op.drop_index('ix_tarefas_status_id')
+
+    op.drop_table('tarefas')